@@ -0,0 +1,371 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from src.analysis import correlation_analysis_with_test, summary_statistics
+from src.data_processing import (DATASETS, KEY_DTYPES, aggregated_values, clean_data, field_name, load_columns, load_data,
+                                 load_dtypes, merge_data)
+from src.engines import run_engine
+from src.instrumentation import current_rss
+from src.visulisations import FIGURES
+
+# Raw column headers of each dataset, as published by OWID/WDI, after Entity, Code and Year
+RAW_COLUMNS = {
+    'infant_mortality': [
+        'Observation value - Indicator: Infant mortality rate - Sex: Female - Wealth quintile: Total - Unit of measure: Deaths per 100 live births',
+        'Observation value - Indicator: Infant mortality rate - Sex: Male - Wealth quintile: Total - Unit of measure: Deaths per 100 live births',
+    ],
+    'life_expectancy': ['Period life expectancy - Sex: female - Age: 0', 'Period life expectancy - Sex: male - Age: 0'],
+    'gdp': [
+        'Period life expectancy at birth - Sex: total - Age: 0', 'GDP per capita', '900793-annotations',
+        'Population (historical)', 'World regions according to OWID',
+    ],
+    'healthcare': [
+        'Life expectancy - Sex: all - Age: 0 - Variant: estimates', 'Health expenditure per capita - Total',
+        'Population (historical)', 'World regions according to OWID',
+    ],
+}
+
+# Synthetic value ranges per indicator (low, high); unlisted columns are left empty
+VALUE_RANGES = {
+    'Observation value': (0.2, 25.0),
+    'Period life expectancy': (30.0, 85.0),
+    'Life expectancy': (30.0, 85.0),
+    'GDP per capita': (500.0, 100_000.0),
+    'Health expenditure per capita': (20.0, 10_000.0),
+    'Population (historical)': (1e4, 1e9),
+}
+
+REGIONS = ['Africa', 'Asia', 'Europe', 'North America', 'Oceania', 'South America']
+
+# Named sizes: entities x years rows per raw file
+SCALES = {
+    'small': (200, 100),
+    'medium': (2_000, 500),
+    'large': (20_000, 500),
+    'xlarge': (50_000, 1_000),
+}
+
+# Entities written per block, which bounds the generator's memory use
+GENERATOR_BLOCK = 1_000
+
+RESULTS_PATH = os.path.join(REPO_ROOT, 'benchmarks', 'results.jsonl')
+
+def value_range(column):
+    """
+    Synthetic value range of a raw column, or None to leave it empty.
+    """
+    for prefix, bounds in VALUE_RANGES.items():
+        if column.startswith(prefix):
+            return bounds
+    return None
+
+def synthetic_columns(name, indicators):
+    """
+    Raw headers of a dataset's extra indicator columns, distinct per dataset
+    so they are all kept side by side in the merged data.
+    """
+    return [f'Synthetic {name} indicator {i}' for i in range(indicators)]
+
+def synthetic_block(name, entities, years, indicators, missing_rate, duplicate_rate, rng):
+    """
+    Rows of one raw dataset for a block of entity ids over years, in the raw
+    column layout, with missing values and duplicated rows mixed in.
+    """
+    n_entities, n_years = len(entities), len(years)
+    entity_ids = np.repeat(entities, n_years)
+    block = {
+        'Entity': np.char.add('Entity ', entity_ids.astype(str)),
+        'Code': np.char.add('E', entity_ids.astype(str)),
+        'Year': np.tile(years, n_entities),
+    }
+    columns = RAW_COLUMNS[name] + synthetic_columns(name, indicators)
+    for column in columns:
+        if column == 'World regions according to OWID':
+            # Like OWID, only the latest year carries the region
+            regions = np.asarray(REGIONS, dtype=object)[entity_ids % len(REGIONS)]
+            block[column] = np.where(block['Year'] == years[-1], regions, None)
+            continue
+        bounds = value_range(column) or ((0.0, 1.0) if column.startswith('Synthetic') else None)
+        if bounds is None:
+            block[column] = np.full(len(entity_ids), np.nan)
+            continue
+        values = rng.uniform(*bounds, size=len(entity_ids)).round(4)
+        values[rng.random(len(values)) < missing_rate] = np.nan
+        block[column] = values
+
+    df = pd.DataFrame(block)
+    if duplicate_rate:
+        df = pd.concat([df, df.sample(frac=duplicate_rate, random_state=rng)]).sort_index(kind='stable')
+    return df
+
+def generate_raw_datasets(output_dir, entities, years, indicators=0, missing_rate=0.05, duplicate_rate=0.01, seed=0):
+    """
+    Write synthetic raw CSVs with the schema of every dataset in DATASETS into
+    output_dir: entities x years rows each (plus duplicates), with indicators
+    extra indicator columns. Files are written a block of entities at a time,
+    so tens of millions of rows can be generated in bounded memory.
+
+    Returns the dataset specs pointing at the synthetic files. The extra
+    indicators are retained as float32 columns, so they are loaded, cleaned
+    and merged along with the real ones.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    year_values = np.arange(2023 - years + 1, 2024, dtype=np.int64)
+    specs = []
+    for spec in DATASETS:
+        raw_path = os.path.join(output_dir, os.path.basename(spec['raw_path']))
+        for start in range(0, entities, GENERATOR_BLOCK):
+            block = synthetic_block(spec['name'], np.arange(start, min(start + GENERATOR_BLOCK, entities)),
+                                    year_values, indicators, missing_rate, duplicate_rate, rng)
+            block.to_csv(raw_path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+        extra_columns = [field_name(column) for column in synthetic_columns(spec['name'], indicators)]
+        specs.append(dict(spec, raw_path=raw_path, cleaned_path=os.path.join(output_dir, os.path.basename(spec['cleaned_path'])),
+                          essential_columns=spec['essential_columns'] + extra_columns,
+                          dtypes={column: 'float32' for column in extra_columns}))
+    return specs
+
+def peak_rss():
+    """
+    Peak resident set size of this process in bytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class RssSampler:
+    """
+    Track the peak RSS while a stage runs by polling it from a background thread.
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+def measure(stage, rows, function, *args, **kwargs):
+    """
+    Run one stage, returning its result and its wall time, peak RSS, RSS growth
+    and throughput over rows input rows (by default the rows of the result).
+    """
+    rss_before = current_rss()
+    with RssSampler() as sampler:
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        seconds = time.perf_counter() - start
+    if rows is None:
+        rows = len(result)
+    return result, {
+        'stage': stage,
+        'rows': int(rows),
+        'seconds': seconds,
+        'rows_per_second': rows / seconds if seconds > 0 else None,
+        'peak_rss_mb': sampler.peak / 2**20,
+        'rss_delta_mb': (current_rss() - rss_before) / 2**20,
+    }
+
+def run_stages(specs, figures_dir, skip_figures=False, engines=()):
+    """
+    Run every pipeline stage on the synthetic datasets, one measurement each.
+    Each of engines (e.g. 'polars') is then timed loading, cleaning, merging
+    and aggregating every dataset as a single stage.
+    """
+    records = []
+    cleaned = []
+    for spec in specs:
+        raw_df, record = measure(f"load:{spec['name']}", None, load_data, spec['raw_path'],
+                                 columns=load_columns(spec), dtype=load_dtypes(spec))
+        records.append(record)
+        cleaned_df, record = measure(f"clean:{spec['name']}", len(raw_df), clean_data, raw_df, spec['columns_to_check'],
+                                     essential_columns=spec['essential_columns'])
+        records.append(record)
+        cleaned.append(cleaned_df)
+        del raw_df
+
+    merged_df, record = measure('merge', sum(map(len, cleaned)), merge_data, *cleaned)
+    records.append(record)
+    del cleaned
+    merged_df, record = measure('aggregate', len(merged_df), lambda df: aggregated_values(df.astype(KEY_DTYPES)), merged_df)
+    records.append(record)
+
+    columns = ['aggregated_infant_mortality', 'aggregated_life_expectancy']
+    _, record = measure('summary_statistics', len(merged_df), summary_statistics, merged_df, columns)
+    records.append(record)
+    _, record = measure('correlation_analysis_with_test', len(merged_df), correlation_analysis_with_test, merged_df, *columns)
+    records.append(record)
+
+    if not skip_figures:
+        for name, plot_function, file_name, _ in FIGURES:
+            _, record = measure(f'figure:{name}', len(merged_df), plot_function, merged_df, os.path.join(figures_dir, file_name))
+            records.append(record)
+
+    for engine in engines:
+        _, record = measure(f'engine:{engine}', None, lambda: run_engine(engine, specs)[1])
+        records.append(record)
+    return records
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmark(entities, years, indicators=0, seed=0, skip_figures=False, work_dir=None, engines=()):
+    """
+    Generate a synthetic dataset of the given size, run every stage on it and
+    return a results record: the configuration and environment of the run
+    followed by one measurement per stage.
+    """
+    tmp_dir = tempfile.mkdtemp(dir=work_dir)
+    try:
+        generate_start = time.perf_counter()
+        specs = generate_raw_datasets(tmp_dir, entities, years, indicators=indicators, seed=seed)
+        generate_seconds = time.perf_counter() - generate_start
+        stages = run_stages(specs, os.path.join(tmp_dir, 'figures'), skip_figures=skip_figures, engines=engines)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'config': {'entities': entities, 'years': years, 'indicators': indicators, 'seed': seed,
+                   'rows_per_dataset': entities * years},
+        'environment': {'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+                        'machine': platform.machine(), 'cpus': os.cpu_count()},
+        'generate_seconds': generate_seconds,
+        'peak_rss_mb': peak_rss() / 2**20,
+        'stages': stages,
+    }
+
+def save_results(result, results_path=RESULTS_PATH):
+    """
+    Append a results record to the JSON lines results file.
+    """
+    with open(results_path, 'a') as f:
+        f.write(json.dumps(result) + '\n')
+
+def load_results(results_path=RESULTS_PATH):
+    """
+    Read every results record from a JSON lines results file.
+    """
+    with open(results_path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def latest_baseline(results_path, config):
+    """
+    The latest record in a results file run with the same configuration, or
+    None if there is none (or no file yet).
+    """
+    if not os.path.exists(results_path):
+        return None
+    matching = [record for record in load_results(results_path) if record['config'] == config]
+    return matching[-1] if matching else None
+
+def compare_results(result, baseline, tolerance=0.2):
+    """
+    Compare each stage's wall time and peak RSS with a baseline record of the
+    same configuration. Returns one row per stage, flagging stages more than
+    tolerance (a fraction) slower or larger than the baseline.
+    """
+    baseline_stages = {stage['stage']: stage for stage in baseline['stages']}
+    rows = []
+    for stage in result['stages']:
+        before = baseline_stages.get(stage['stage'])
+        if before is None:
+            continue
+        time_ratio = stage['seconds'] / before['seconds'] if before['seconds'] else None
+        rss_ratio = stage['peak_rss_mb'] / before['peak_rss_mb'] if before['peak_rss_mb'] else None
+        rows.append({
+            'stage': stage['stage'],
+            'time_ratio': time_ratio,
+            'rss_ratio': rss_ratio,
+            'regressed': any(ratio is not None and ratio > 1 + tolerance for ratio in (time_ratio, rss_ratio)),
+        })
+    return rows
+
+def format_ratio(ratio):
+    """
+    A ratio to the baseline as x1.23, or x- when the baseline measured zero.
+    """
+    return 'x-' if ratio is None else f"x{ratio:.2f}"
+
+def print_result(result):
+    config = result['config']
+    print(f"{config['entities']} entities x {config['years']} years ({config['rows_per_dataset']:,} rows per dataset), "
+          f"{config['indicators']} extra indicators, commit {result['commit']}")
+    print(f"{'stage':<46} {'rows':>12} {'seconds':>9} {'rows/s':>12} {'peak MB':>9} {'delta MB':>9}")
+    for stage in result['stages']:
+        throughput = f"{stage['rows_per_second']:,.0f}" if stage['rows_per_second'] else '-'
+        print(f"{stage['stage']:<46} {stage['rows']:>12,} {stage['seconds']:>9.3f} {throughput:>12} "
+              f"{stage['peak_rss_mb']:>9.1f} {stage['rss_delta_mb']:>9.1f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on synthetic data.")
+    parser.add_argument('--scale', choices=SCALES, default='small', help="named entities x years size")
+    parser.add_argument('--entities', type=int, help="number of entities (overrides --scale)")
+    parser.add_argument('--years', type=int, help="number of years per entity (overrides --scale)")
+    parser.add_argument('--indicators', type=int, default=0, help="extra indicator columns per raw file")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skip-figures', action='store_true', help="do not time the plotting functions")
+    parser.add_argument('--engines', nargs='*', default=[], help="dataframe engines to time processing with (e.g. polars duckdb)")
+    parser.add_argument('--work-dir', help="directory for the synthetic files (default: system temp dir)")
+    parser.add_argument('--results', default=RESULTS_PATH, help="JSON lines file the results are appended to")
+    parser.add_argument('--baseline', help="results file whose latest run of the same size is compared against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown before a stage is flagged")
+    args = parser.parse_args(argv)
+
+    entities, years = SCALES[args.scale]
+    entities = args.entities or entities
+    years = args.years or years
+
+    result = run_benchmark(entities, years, indicators=args.indicators, seed=args.seed,
+                           skip_figures=args.skip_figures, work_dir=args.work_dir, engines=args.engines)
+    print_result(result)
+    # Pick the baseline before this run is appended, which may be to the same file
+    baseline = latest_baseline(args.baseline, result['config']) if args.baseline else None
+    save_results(result, args.results)
+    print(f"Results appended to {args.results}")
+
+    if args.baseline:
+        if baseline is None:
+            print("No baseline run with the same configuration.")
+            return
+        rows = compare_results(result, baseline, args.tolerance)
+        for row in rows:
+            flag = 'REGRESSED' if row['regressed'] else ''
+            print(f"{row['stage']:<46} time {format_ratio(row['time_ratio'])}  rss {format_ratio(row['rss_ratio'])}  {flag}")
+        if any(row['regressed'] for row in rows):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Modules imported by data-only, analysis-only and plotting jobs
+MODULES = ['src', 'src.storage', 'src.data_processing', 'src.analysis', 'src.regression', 'src.cache', 'src.visulisations', 'src.instrumentation', 'src.pipeline', 'src.schema', 'src.cube', 'src.reports', 'src.service', 'src.engines']
+
+# Libraries that should only load once a function actually needs them (also
+# checked by tests/test_startup.py)
+HEAVY_LIBRARIES = ['matplotlib', 'seaborn', 'sklearn', 'scipy', 'statsmodels', 'polars', 'duckdb']
+
+# Run in a fresh interpreter: time the import and list the heavy libraries it loaded
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+loaded = sorted({{name.split('.')[0] for name in sys.modules}} & set({heavy!r}))
+print(json.dumps({{'seconds': elapsed, 'heavy_imports': loaded}}))
+"""
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def measure_import(module, repeat=5):
+    """
+    Import module in repeat fresh interpreters and return the fastest import
+    time with the heavy libraries it loaded.
+    """
+    results = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY_LIBRARIES)],
+            cwd=REPO_ROOT, check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    best = min(results, key=lambda result: result['seconds'])
+    return {'module': module, 'seconds': best['seconds'], 'heavy_imports': best['heavy_imports']}
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time of each pipeline module.")
+    parser.add_argument('--repeat', type=int, default=5, help="fresh interpreters per module (fastest is reported)")
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    args = parser.parse_args()
+
+    results = [measure_import(module, args.repeat) for module in MODULES]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        heavy = ', '.join(result['heavy_imports']) or '-'
+        print(f"{result['module']:<22} {result['seconds'] * 1000:8.1f} ms   heavy imports: {heavy}")
+
+if __name__ == '__main__':
+    main()
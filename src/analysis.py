@@ -1,27 +1,191 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from scipy.stats import pearsonr
-from matplotlib.backends.backend_pdf import PdfPages
+from src.cache import ArtifactCache, cache_key
+from src.instrumentation import instrumented
+from src.regression import regression_fit
+from src.storage import read_frame
+
+class QuantileSketch:
+    """
+    Bounded-size, mergeable sketch of a column's distribution for approximate
+    quantiles. Values are kept exactly until the sketch holds twice its size,
+    then compressed into size weighted centroids of equal weight.
+    """
+    def __init__(self, size=2048):
+        self.size = size
+        self.values = np.empty(0)
+        self.weights = np.empty(0)
+
+    def add(self, values):
+        """
+        Add an array of values (missing values are ignored).
+        """
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        self.values = np.concatenate([self.values, values])
+        self.weights = np.concatenate([self.weights, np.ones(len(values))])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """
+        Fold another sketch into this one.
+        """
+        self.values = np.concatenate([self.values, other.values])
+        self.weights = np.concatenate([self.weights, other.weights])
+        self._compress()
+        return self
+
+    def _compress(self):
+        if len(self.values) <= 2 * self.size:
+            return
+        order = np.argsort(self.values, kind='stable')
+        values, weights = self.values[order], self.weights[order]
+
+        # Assign each point to one of size buckets of equal cumulative weight
+        cumulative = np.cumsum(weights)
+        buckets = np.minimum((cumulative - weights / 2) / cumulative[-1] * self.size, self.size - 1).astype(int)
+        bucket_weights = np.bincount(buckets, weights=weights, minlength=self.size)
+        bucket_sums = np.bincount(buckets, weights=values * weights, minlength=self.size)
+        filled = bucket_weights > 0
+        self.values = bucket_sums[filled] / bucket_weights[filled]
+        self.weights = bucket_weights[filled]
+
+    def quantile(self, q):
+        """
+        Estimate the q-th quantile. Exact (linear interpolation, as in pandas)
+        while no compression has happened.
+        """
+        if len(self.values) == 0:
+            return np.nan
+        if np.all(self.weights == 1):
+            return float(np.quantile(self.values, q))
+        order = np.argsort(self.values)
+        values, weights = self.values[order], self.weights[order]
+        positions = np.cumsum(weights) - weights / 2
+        return float(np.interp(q * weights.sum(), positions, values))
+
+class SummaryAccumulator:
+    """
+    Single-pass summary statistics for a set of columns: count, mean and
+    variance (Welford-style updates), min, max and approximate quantiles.
+
+    Accumulators can be updated chunk by chunk and merged across chunks,
+    workers or partitions. Count, mean, variance, min and max do not depend on
+    how the data was split (up to rounding). The quartiles are approximate
+    once a sketch compresses: they can vary with the split, within about
+    1/sketch_size of the exact quantile's rank.
+    """
+    def __init__(self, columns, sketch_size=2048):
+        self.columns = list(columns)
+        self.count = np.zeros(len(self.columns))
+        self.mean = np.zeros(len(self.columns))
+        self.m2 = np.zeros(len(self.columns))
+        self.min = np.full(len(self.columns), np.inf)
+        self.max = np.full(len(self.columns), -np.inf)
+        self.sketches = [QuantileSketch(sketch_size) for _ in self.columns]
+
+    def _combine(self, count, mean, m2, minimum, maximum):
+        # Chan et al. parallel update of count, mean and sum of squared deviations
+        total = self.count + count
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta = mean - self.mean
+            self.mean = np.where(total > 0, self.mean + delta * count / total, 0.0)
+            self.m2 = np.where(total > 0, self.m2 + m2 + delta ** 2 * self.count * count / total, 0.0)
+        self.count = total
+        self.min = np.minimum(self.min, minimum)
+        self.max = np.maximum(self.max, maximum)
+
+    def update(self, df):
+        """
+        Add a chunk of rows.
+        """
+        values = df[self.columns].to_numpy(dtype=float)
+        present = ~np.isnan(values)
+        count = present.sum(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.where(count > 0, np.where(present, values, 0.0).sum(axis=0) / count, 0.0)
+        m2 = np.where(present, (values - mean) ** 2, 0.0).sum(axis=0)
+        minimum = np.where(present, values, np.inf).min(axis=0, initial=np.inf)
+        maximum = np.where(present, values, -np.inf).max(axis=0, initial=-np.inf)
+        self._combine(count, mean, m2, minimum, maximum)
+        for sketch, column_values in zip(self.sketches, values.T):
+            sketch.add(column_values)
+        return self
+
+    def merge(self, other):
+        """
+        Fold another accumulator over the same columns into this one.
+        """
+        if other.columns != self.columns:
+            raise ValueError("Cannot merge accumulators over different columns.")
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+        for sketch, other_sketch in zip(self.sketches, other.sketches):
+            sketch.merge(other_sketch)
+        return self
+
+    def result(self):
+        """
+        Return the summary table: the describe() columns plus variance.
+        """
+        empty = self.count == 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = np.where(self.count > 1, self.m2 / (self.count - 1), np.nan)
+        summary = pd.DataFrame({
+            'count': self.count,
+            'mean': np.where(empty, np.nan, self.mean),
+            'std': np.sqrt(variance),
+            'min': np.where(empty, np.nan, self.min),
+            '25%': [sketch.quantile(0.25) for sketch in self.sketches],
+            '50%': [sketch.quantile(0.50) for sketch in self.sketches],
+            '75%': [sketch.quantile(0.75) for sketch in self.sketches],
+            'max': np.where(empty, np.nan, self.max),
+            'variance': variance,
+        }, index=self.columns)
+        return summary
 
 # create summary statistics
-def summary_statistics(df, columns):
+@instrumented
+def summary_statistics(df, columns, sketch_size=2048):
     """
     Calculate summary statistics for specified columns.
+
+    df may be a DataFrame or an iterable of DataFrame chunks (e.g.
+    pd.read_csv(..., chunksize=...)); either way the data is read once.
+    Quantiles are exact up to 2 * sketch_size values per column.
     """
-    summary = df[columns].describe().transpose()
-    summary['variance'] = df[columns].var()
-    return summary
+    accumulator = SummaryAccumulator(columns, sketch_size=sketch_size)
+    chunks = [df] if isinstance(df, pd.DataFrame) else df
+    for chunk in chunks:
+        accumulator.update(chunk)
+    return accumulator.result()
 
 # carry out hypothesis test 
-def correlation_analysis_with_test(df, mortality_column, life_expectancy_column, alpha=0.05):
+@instrumented
+def correlation_analysis_with_test(df, mortality_column, life_expectancy_column, alpha=0.05,
+                                   test='pearson', n_resamples=10000, workers=None, seed=None):
     """
     Compute the correlation between infant mortality and life expectancy
     and perform a hypothesis test.
     
     H0: There is no correlation between infant mortality and life expectancy.
     H1: There is a significant correlation between infant mortality and life expectancy.
+
+    test='pearson' uses the parametric pearsonr p-value; test='permutation'
+    uses a permutation p-value from n_resamples shuffles instead.
     """
-    correlation, p_value = pearsonr(df[mortality_column], df[life_expectancy_column])
+    from scipy.stats import pearsonr
+
+    # Upcast float32 storage so the test runs in float64
+    correlation, p_value = pearsonr(df[mortality_column].to_numpy(dtype=float),
+                                    df[life_expectancy_column].to_numpy(dtype=float))
+    if test == 'permutation':
+        _, p_value = permutation_test_correlation(df, mortality_column, life_expectancy_column,
+                                                  n_resamples=n_resamples, workers=workers, seed=seed)
+    elif test != 'pearson':
+        raise ValueError(f"Unknown test '{test}'. Expected 'pearson' or 'permutation'.")
     
     if p_value < alpha:
         result = "Reject the null hypothesis (H0): Significant correlation exists."
@@ -30,10 +194,397 @@ def correlation_analysis_with_test(df, mortality_column, life_expectancy_column,
 
     return correlation, p_value, result
 
-def save_summary_to_pdf(summary_df, output_path, caption):
+def correlation_p_values(correlation, n):
+    """
+    Two-sided p-values for correlation coefficients under H0 of no correlation,
+    using the t distribution with n - 2 degrees of freedom.
+    """
+    from scipy.stats import t as t_distribution
+
+    correlation = np.asarray(correlation, dtype=float)
+    n = np.asarray(n, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df = n - 2
+        t_stat = correlation * np.sqrt(df / (1.0 - correlation ** 2))
+        p_values = 2 * t_distribution.sf(np.abs(t_stat), df)
+    return np.where(df > 0, p_values, np.nan)
+
+# compute and test every pairwise correlation at once
+@instrumented
+def correlation_matrix_with_test(df, columns, method='pearson', alpha=0.05, correction='holm'):
+    """
+    Compute the Pearson or Spearman correlation between every pair of columns
+    and test each one, correcting the p-values for multiple testing.
+
+    Missing values are handled pairwise: each pair uses the rows where both
+    columns are present (for Spearman, both are ranked within those rows, as
+    DataFrame.corr does). correction is any statsmodels multipletests method,
+    e.g. 'bonferroni', 'holm' or 'fdr_bh'.
+
+    Returns DataFrames of correlations, corrected p-values, the number of rows
+    used per pair and the reject decisions for H0 of no correlation.
+    """
+    from statsmodels.stats.multitest import multipletests
+
+    if method == 'pearson':
+        values = df[columns].to_numpy(dtype=float)
+    elif method == 'spearman':
+        values = df[columns].rank().to_numpy(dtype=float)
+    else:
+        raise ValueError(f"Unknown method '{method}'. Expected 'pearson' or 'spearman'.")
+
+    # Center each column and zero out missing values so they drop out of the sums
+    present = ~np.isnan(values)
+    mask = present.astype(float)
+    centered = np.where(present, values - np.nanmean(values, axis=0), 0.0)
+
+    # Pairwise-complete sums for every pair in a few matrix products
+    n = mask.T @ mask
+    sum_x = centered.T @ mask
+    sum_xx = (centered ** 2).T @ mask
+    sum_xy = centered.T @ centered
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covariance = sum_xy - sum_x * sum_x.T / n
+        variance = sum_xx - sum_x ** 2 / n
+        correlation = np.clip(covariance / np.sqrt(variance * variance.T), -1.0, 1.0)
+
+    if method == 'spearman':
+        # Ranks over each column's own values only hold for pairs missing the same rows;
+        # rank the others again within the rows where both are present
+        mismatched = mask.T @ (1.0 - mask)
+        for i, j in zip(*np.nonzero(np.triu(mismatched + mismatched.T, k=1))):
+            complete = df[[columns[i], columns[j]]].dropna().rank().to_numpy(dtype=float)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                correlation[i, j] = correlation[j, i] = np.corrcoef(complete, rowvar=False)[0, 1] if len(complete) > 1 else np.nan
+    np.fill_diagonal(correlation, 1.0)
+
+    # Test each distinct pair once and correct across all of them
+    p_values = np.full(correlation.shape, np.nan)
+    reject = np.zeros(correlation.shape, dtype=bool)
+    upper = np.triu_indices(len(columns), k=1)
+    raw_p = correlation_p_values(correlation[upper], n[upper])
+    tested = ~np.isnan(raw_p)
+    if tested.any():
+        pair_reject, corrected_p, _, _ = multipletests(raw_p[tested], alpha=alpha, method=correction)
+        rows, cols = upper[0][tested], upper[1][tested]
+        p_values[rows, cols] = p_values[cols, rows] = corrected_p
+        reject[rows, cols] = reject[cols, rows] = pair_reject
+
+    def as_frame(matrix):
+        return pd.DataFrame(matrix, index=columns, columns=columns)
+
+    return as_frame(correlation), as_frame(p_values), as_frame(n.astype(int)), as_frame(reject)
+
+def grouped_sufficient_statistics(df, x_column, y_column, by):
+    """
+    Compute n, Σx, Σy, Σxy, Σx² and Σy² for every group in one groupby pass,
+    over the rows where both columns are present.
+
+    x and y are shifted by their overall means first to keep the sums well
+    conditioned; the shifts are returned alongside the per-group sums.
+    """
+    pairs = df[[x_column, y_column]].notna().all(axis=1)
+    keys = df.loc[pairs, by]
+    x = df.loc[pairs, x_column].to_numpy(dtype=float)
+    y = df.loc[pairs, y_column].to_numpy(dtype=float)
+    x_shift, y_shift = x.mean() if len(x) else 0.0, y.mean() if len(y) else 0.0
+    x, y = x - x_shift, y - y_shift
+
+    terms = pd.DataFrame({'n': 1.0, 'sum_x': x, 'sum_y': y, 'sum_xy': x * y, 'sum_xx': x * x, 'sum_yy': y * y}, index=keys.index)
+    group_keys = [keys[column] for column in by] if isinstance(by, list) else keys
+    sums = terms.groupby(group_keys, observed=True, sort=True).sum()
+    sums['n'] = sums['n'].astype(int)
+    return sums, x_shift, y_shift
+
+# correlate within every group at once
+@instrumented
+def grouped_correlation(df, x_column, y_column, by='entity', alpha=0.05):
+    """
+    Compute the Pearson correlation between two columns within every group,
+    e.g. for each entity over time (by='entity') or across entities in each
+    year (by='year'), and test each one.
+
+    All groups are computed from one groupby aggregation of their sufficient
+    statistics rather than one pearsonr call per group. Groups with fewer than
+    three rows get a NaN p-value; groups where a column is constant get a NaN
+    correlation.
+
+    Returns a DataFrame indexed by group with n, correlation, p_value and reject.
+    """
+    sums, _, _ = grouped_sufficient_statistics(df, x_column, y_column, by)
+    n = sums['n'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covariance = sums['sum_xy'] - sums['sum_x'] * sums['sum_y'] / n
+        variance_x = sums['sum_xx'] - sums['sum_x'] ** 2 / n
+        variance_y = sums['sum_yy'] - sums['sum_y'] ** 2 / n
+        correlation = (covariance / np.sqrt(variance_x * variance_y)).clip(-1.0, 1.0)
+
+    # A constant column has no correlation, even if rounding leaves a tiny variance
+    scale = np.maximum(np.abs(sums['sum_xx']), np.abs(sums['sum_yy'])) + 1.0
+    correlation[(variance_x <= 1e-12 * scale) | (variance_y <= 1e-12 * scale)] = np.nan
+
+    p_values = correlation_p_values(correlation, n)
+    return pd.DataFrame({
+        'n': sums['n'],
+        'correlation': correlation,
+        'p_value': p_values,
+        'reject': p_values < alpha,
+    })
+
+# Trend columns returned for each group by grouped_trends
+TREND_COLUMNS = ['n', 'slope', 'slope_se', 'intercept', 'intercept_se', 'r_squared', 'p_value']
+
+def trend_from_sums(n, sum_x, sum_y, sum_xy, sum_xx, sum_yy, x_shift, y_shift):
+    """
+    Ordinary least squares fit of y on x for every group at once from its
+    (shifted) sufficient statistics. Groups with fewer than three points or a
+    constant x get NaN estimates.
+    """
+    n = np.asarray(n, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sxx = sum_xx - sum_x ** 2 / n
+        sxy = sum_xy - sum_x * sum_y / n
+        syy = sum_yy - sum_y ** 2 / n
+        slope = sxy / sxx
+        x_mean = x_shift + sum_x / n
+        y_mean = y_shift + sum_y / n
+        intercept = y_mean - slope * x_mean
+
+        residual_ss = np.maximum(syy - slope * sxy, 0.0)
+        residual_std = np.sqrt(residual_ss / (n - 2))
+        slope_se = residual_std / np.sqrt(sxx)
+        intercept_se = residual_std * np.sqrt(1.0 / n + x_mean ** 2 / sxx)
+        r_squared = np.where(syy > 0, 1.0 - residual_ss / syy, np.nan)
+
+    # The slope's t-test is the correlation's t-test
+    correlation = np.sign(slope) * np.sqrt(np.clip(r_squared, 0.0, 1.0))
+    p_value = correlation_p_values(correlation, n)
+
+    # Too few points, or every x equal within rounding, leaves the fit undefined
+    undefined = (n < 3) | ~(sxx > 1e-12 * (np.abs(sum_xx) + 1.0))
+    trend = {
+        'n': n.astype(int), 'slope': slope, 'slope_se': slope_se, 'intercept': intercept,
+        'intercept_se': intercept_se, 'r_squared': r_squared, 'p_value': p_value,
+    }
+    for name in TREND_COLUMNS[1:]:
+        trend[name] = np.where(undefined, np.nan, trend[name])
+    return trend
+
+def rolling_sums(sums, by, x_column, window):
+    """
+    Sum the per-(group, x) sufficient statistics over a trailing window of x
+    values (e.g. the last 10 years, gaps included) ending at every row, using
+    cumulative sums within each group.
+    """
+    if sums.empty:
+        # No rows (e.g. a filter matched nothing), so no windows
+        return sums
+    keys = sums.index.to_frame(index=False)
+    codes = pd.factorize(keys[by], sort=True)[0].astype(np.int64)
+    x = keys[x_column].to_numpy(dtype=np.int64)
+    span = int(x.max() - x.min()) + int(window) + 1
+    position = codes * span + (x - x.min())
+
+    # Rows are sorted by group then x, so each window is a contiguous run
+    cumulative = np.vstack([np.zeros(sums.shape[1]), np.cumsum(sums.to_numpy(dtype=float), axis=0)])
+    start = np.searchsorted(position, position - int(window) + 1, side='left')
+    windowed = cumulative[1:] - cumulative[start]
+    return pd.DataFrame(windowed, index=sums.index, columns=sums.columns)
+
+# slopes and intercepts of every group over time at once
+@instrumented
+def grouped_trends(df, y_columns, x_column='year', by='entity', window=None):
+    """
+    Fit a linear trend of each y column on x_column (by default the annual
+    rate of change) for every group, e.g. every entity, with standard errors,
+    R² and the slope's two-sided p-value.
+
+    Every group's fit is solved at once from one groupby aggregation of its
+    sufficient statistics rather than one regression per group. With a window
+    (in x units, e.g. 10 years) a trailing rolling-window fit is returned for
+    every group and x value instead, computed from cumulative sums.
+
+    Returns a tidy DataFrame with one row per group and indicator (and window
+    end when rolling) and the columns in TREND_COLUMNS.
+    """
+    if isinstance(y_columns, str):
+        y_columns = [y_columns]
+    frames = []
+    for y_column in y_columns:
+        if window is None:
+            sums, x_shift, y_shift = grouped_sufficient_statistics(df, x_column, y_column, by)
+        else:
+            sums, x_shift, y_shift = grouped_sufficient_statistics(df, x_column, y_column, [by, x_column])
+            sums = rolling_sums(sums, by, x_column, window)
+        trend = trend_from_sums(sums['n'].to_numpy(), sums['sum_x'].to_numpy(), sums['sum_y'].to_numpy(),
+                                sums['sum_xy'].to_numpy(), sums['sum_xx'].to_numpy(), sums['sum_yy'].to_numpy(),
+                                x_shift, y_shift)
+        frame = pd.DataFrame(trend, index=sums.index).reset_index()
+        frame.insert(1, 'indicator', y_column)
+        frames.append(frame)
+
+    trends = pd.concat(frames, ignore_index=True)
+    if window is not None:
+        trends = trends.rename(columns={x_column: 'window_end'})
+    return trends
+
+def correlation_from_sums(sums):
+    """
+    Pearson correlation from stacked sufficient statistics, with the last axis
+    holding n, Σx, Σy, Σxy, Σx² and Σy².
+    """
+    n, sum_x, sum_y, sum_xy, sum_xx, sum_yy = np.moveaxis(np.asarray(sums, dtype=float), -1, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covariance = sum_xy - sum_x * sum_y / n
+        variance_x = sum_xx - sum_x ** 2 / n
+        variance_y = sum_yy - sum_y ** 2 / n
+        return np.clip(covariance / np.sqrt(variance_x * variance_y), -1.0, 1.0)
+
+def resampling_statistics(df, x_column, y_column, cluster=None):
+    """
+    Sufficient statistics for each resampling unit: one row per observation,
+    or one row per cluster (e.g. entity) when cluster is given.
+    """
+    if cluster is not None:
+        sums, _, _ = grouped_sufficient_statistics(df, x_column, y_column, cluster)
+        return sums.to_numpy(dtype=float)
+
+    pairs = df[[x_column, y_column]].dropna()
+    x = pairs[x_column].to_numpy(dtype=float)
+    y = pairs[y_column].to_numpy(dtype=float)
+    x, y = x - x.mean(), y - y.mean()
+    return np.column_stack([np.ones_like(x), x, y, x * y, x * x, y * y])
+
+def resample_batches(n_resamples, batch_size, seed):
+    """
+    Split n_resamples into batches, each with its own independent random seed.
+    The seeds depend only on seed, so results do not depend on the worker count.
+    """
+    sizes = [batch_size] * (n_resamples // batch_size)
+    if n_resamples % batch_size:
+        sizes.append(n_resamples % batch_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    return sizes, seeds
+
+def run_batches(function, statistics, sizes, seeds, workers):
+    """
+    Run function(statistics, seed, size) for every batch, in a process pool
+    when workers > 1, and concatenate the results in batch order.
+    """
+    if workers is not None and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(function, [statistics] * len(sizes), seeds, sizes))
+    else:
+        results = [function(statistics, seed, size) for seed, size in zip(seeds, sizes)]
+    return np.concatenate(results) if results else np.empty(0)
+
+def bootstrap_batch(statistics, seed, size):
+    """
+    Correlations for a batch of bootstrap resamples. Each resample draws the
+    units with replacement, expressed as counts per unit, so its sufficient
+    statistics are a single matrix product.
+    """
+    rng = np.random.default_rng(seed)
+    units = len(statistics)
+    draws = rng.integers(0, units, size=(size, units)) + np.arange(size)[:, None] * units
+    counts = np.bincount(draws.ravel(), minlength=size * units).reshape(size, units)
+    return correlation_from_sums(counts @ statistics)
+
+def permutation_batch(statistics, seed, size):
+    """
+    Correlations for a batch of permutations of y against x.
+    """
+    rng = np.random.default_rng(seed)
+    x, y = statistics
+    shuffled = rng.permuted(np.broadcast_to(y, (size, len(y))), axis=1)
+    return (shuffled @ x) / np.sqrt((x @ x) * (y @ y))
+
+# bootstrap confidence interval for the correlation
+@instrumented
+def bootstrap_correlation(df, x_column, y_column, n_resamples=10000, cluster=None, confidence=0.95,
+                          batch_size=1000, workers=None, seed=None):
+    """
+    Bootstrap a percentile confidence interval for the Pearson correlation.
+
+    With cluster (e.g. 'entity') whole clusters are resampled, which keeps
+    the dependence between rows from the same country. Resamples are drawn in
+    seeded batches, optionally spread over worker processes; the same seed
+    gives the same interval for any number of workers.
+
+    Returns the correlation and the lower and upper bounds of the interval.
+    """
+    statistics = resampling_statistics(df, x_column, y_column, cluster)
+    correlation = float(correlation_from_sums(statistics.sum(axis=0)))
+    sizes, seeds = resample_batches(n_resamples, batch_size, seed)
+    resampled = run_batches(bootstrap_batch, statistics, sizes, seeds, workers)
+
+    tail = (1 - confidence) / 2
+    ci_low, ci_high = np.nanquantile(resampled, [tail, 1 - tail])
+    return correlation, float(ci_low), float(ci_high)
+
+# permutation test for the correlation
+@instrumented
+def permutation_test_correlation(df, x_column, y_column, n_resamples=10000, batch_size=1000, workers=None, seed=None):
+    """
+    Two-sided permutation test of H0 of no correlation: y is shuffled against
+    x n_resamples times in seeded batches, optionally over worker processes.
+
+    Returns the correlation and the permutation p-value.
+    """
+    statistics = resampling_statistics(df, x_column, y_column)
+    x, y = statistics[:, 1], statistics[:, 2]
+    correlation = float(correlation_from_sums(statistics.sum(axis=0)))
+    sizes, seeds = resample_batches(n_resamples, batch_size, seed)
+    permuted = run_batches(permutation_batch, (x, y), sizes, seeds, workers)
+
+    # Count the observed statistic as one of the permutations so p is never 0
+    extreme = np.count_nonzero(np.abs(permuted) >= abs(correlation) - 1e-12)
+    p_value = (extreme + 1) / (len(permuted) + 1)
+    return correlation, float(p_value)
+
+# linear regression summaries from the shared regression fits
+@instrumented
+def regression_analysis(df, pairs, confidence=0.95):
+    """
+    Fit each (x_column, y_column) pair by ordinary least squares and return a
+    table of slope, intercept, their standard errors and R². The fits are the
+    same cached ones the scatter plots draw.
+    """
+    rows = []
+    for x_column, y_column in pairs:
+        fit = regression_fit(df, x_column, y_column, confidence)
+        rows.append({
+            'x': x_column,
+            'y': y_column,
+            'n': fit.n,
+            'slope': fit.slope,
+            'intercept': fit.intercept,
+            'slope_se': fit.slope_se,
+            'intercept_se': fit.intercept_se,
+            'r_squared': fit.r_squared,
+            'residual_std': fit.residual_std,
+        })
+    return pd.DataFrame(rows).set_index(['x', 'y'])
+
+@instrumented
+def save_summary_to_pdf(summary_df, output_path, caption, cache=None):
     """
     Save summary statistics to a PDF with a table and caption.
+
+    With an ArtifactCache, the PDF is only rewritten when the table, caption
+    or this code changed since it was last saved. Returns True if it was written.
     """
+    if cache is not None:
+        table_df = summary_df.reset_index()
+        table_df.columns = table_df.columns.astype(str)
+        key = cache_key(table_df, table_df.columns, {'caption': caption}, save_summary_to_pdf)
+        if cache.is_fresh(output_path, key, output_path):
+            print(f"{output_path} is up to date, skipping.")
+            return False
+
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+
     fig, ax = plt.subplots(figsize=(10, 4))
     ax.axis('tight')
     ax.axis('off')
@@ -53,12 +604,17 @@ def save_summary_to_pdf(summary_df, output_path, caption):
         pdf.savefig(fig, bbox_inches='tight')
         plt.close()
 
+    if cache is not None:
+        cache.record(output_path, key, output_path)
+        cache.save()
+    return True
+
 if __name__ == '__main__':
-    merged_data_path = '/Users/Tasmin/Final-Project/data/processed/merged_data.csv'
-    pdf_output_path = '/Users/Tasmin/Final-Project/data/processed/summary_statistics.pdf'
+    merged_data_path = './data/processed/merged_data.csv'
+    pdf_output_path = './data/processed/summary_statistics.pdf'
     
     print("Loading Processed Data...")
-    merged_data = pd.read_csv(merged_data_path)
+    merged_data = read_frame(merged_data_path)
     
     aggregated_infant_mortality_column = 'aggregated_infant_mortality'
     aggregated_life_expectancy_column = 'aggregated_life_expectancy'
@@ -68,7 +624,8 @@ if __name__ == '__main__':
     print(summary_stats)
     
     caption_text = "Table 1: Summary Statistics for Aggregated Infant Mortality and Life Expectancy."
-    save_summary_to_pdf(summary_stats, pdf_output_path, caption_text)
+    report_cache = ArtifactCache(os.path.join(os.path.dirname(pdf_output_path), '.report_cache.json'))
+    save_summary_to_pdf(summary_stats, pdf_output_path, caption_text, cache=report_cache)
     
     print("Performing Correlation Analysis with Hypothesis Test...")
     correlation, p_value, test_result = correlation_analysis_with_test(
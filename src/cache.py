@@ -0,0 +1,134 @@
+import ast
+import functools
+import hashlib
+import importlib.util
+import json
+import os
+import sys
+import pandas as pd
+from src.data_processing import file_hash, save_manifest
+
+def module_name(function):
+    """
+    Name of the module defining function. A module run with python -m is
+    named by its import name rather than '__main__', and a script run by
+    path by its file path, so both resolve to the code they were loaded from.
+    """
+    name = function.__module__
+    if name != '__main__':
+        return name
+    main = sys.modules['__main__']
+    if getattr(main, '__spec__', None) is not None:
+        return main.__spec__.name
+    return os.path.abspath(main.__file__)
+
+def module_source(name):
+    """
+    Source code of a module, given by import name or file path, read without importing it.
+    """
+    path = name if name.endswith('.py') else importlib.util.find_spec(name).origin
+    with open(path) as f:
+        return f.read()
+
+@functools.lru_cache(maxsize=None)
+def code_modules(name):
+    """
+    The module and every module of the same package it imports, directly or
+    through the others (including imports inside functions), sorted by name.
+    """
+    if name.endswith('.py'):
+        # A script inside the package directory
+        package = os.path.basename(os.path.dirname(name)) + '.'
+    else:
+        package = name.split('.')[0] + '.'
+    modules = set()
+    pending = [name]
+    while pending:
+        module = pending.pop()
+        if module in modules:
+            continue
+        modules.add(module)
+        for node in ast.walk(ast.parse(module_source(module))):
+            if isinstance(node, ast.Import):
+                imported = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                imported = [node.module]
+            else:
+                continue
+            pending += [name for name in imported if name.startswith(package)]
+    return tuple(sorted(modules))
+
+def code_version(function):
+    """
+    Hash the source of the module defining function and of the package modules
+    it depends on (e.g. regression, cube and schema for the figures), so any
+    change to the code an artifact is rendered with invalidates it.
+    """
+    digest = hashlib.sha256()
+    for name in code_modules(module_name(function)):
+        digest.update(name.encode())
+        digest.update(module_source(name).encode())
+    return digest.hexdigest()
+
+def cache_key(df, columns, params=None, function=None):
+    """
+    Content address of an artifact: a hash of the values in the columns it
+    uses, its parameters and the version of the code that renders it.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(list(columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df[list(columns)], index=False).to_numpy().tobytes())
+    digest.update(json.dumps(params or {}, sort_keys=True, default=str).encode())
+    if function is not None:
+        digest.update(code_version(function).encode())
+    return digest.hexdigest()
+
+class ArtifactCache:
+    """
+    Record of the content key each figure or report was last rendered from.
+    An artifact is only re-rendered when its key changes or its output file
+    is missing or modified; hits and misses are counted for reporting.
+    """
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self.entries = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.entries = json.load(f)
+        self.hits = []
+        self.misses = []
+
+    def is_fresh(self, name, key, output_path):
+        """
+        Check whether the artifact on disk was rendered from this key, counting
+        the lookup as a hit or a miss.
+        """
+        entry = self.entries.get(name)
+        fresh = (
+            entry is not None
+            and entry.get('key') == key
+            and entry.get('output') == output_path
+            and os.path.exists(output_path)
+            and entry.get('output_hash') == file_hash(output_path)
+        )
+        (self.hits if fresh else self.misses).append(name)
+        return fresh
+
+    def record(self, name, key, output_path):
+        """
+        Record that the artifact at output_path was rendered from key.
+        """
+        self.entries[name] = {'key': key, 'output': output_path, 'output_hash': file_hash(output_path)}
+
+    def save(self):
+        """
+        Write the cache manifest.
+        """
+        os.makedirs(os.path.dirname(self.manifest_path) or '.', exist_ok=True)
+        save_manifest(self.entries, self.manifest_path)
+
+    def report(self):
+        """
+        Return the cache hits and misses recorded so far.
+        """
+        return {'hits': list(self.hits), 'misses': list(self.misses)}
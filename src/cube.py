@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+from src.instrumentation import instrumented
+from src.schema import DERIVED_FIELDS, FIELDS
+from src.storage import read_frame, write_frame
+
+# Rollup levels held by the cube and the key columns of each
+LEVELS = {
+    'year': ['year'],
+    'entity': ['entity'],
+    'region_year': ['region', 'year'],
+}
+
+# Indicator fields aggregated by default
+CUBE_COLUMNS = [field.name for field in FIELDS if field.dtype.startswith('float')] + [field.name for field in DERIVED_FIELDS]
+
+STATISTICS = ['count', 'sum', 'sumsq']
+
+class AggregateCube:
+    """
+    Materialized count, sum and sum of squares of each column per year, per
+    entity and per (region, year), from which means and variances are read
+    without rescanning the data.
+
+    Sums are taken of each column minus a fixed shift (its mean when the cube
+    was built) so the variances stay well conditioned; the shift never changes,
+    which keeps the sums additive across updates.
+    """
+    def __init__(self, tables, shifts):
+        self.tables = tables
+        self.shifts = shifts
+
+    @property
+    def columns(self):
+        return list(self.shifts.index)
+
+    @classmethod
+    def from_frame(cls, df, columns=None, regions=None, levels=None):
+        """
+        Build the cube from merged data. regions maps each entity to its world
+        region (see data_processing.load_regions); without it the
+        (region, year) level is left out.
+        """
+        if columns is None:
+            columns = [column for column in CUBE_COLUMNS if column in df.columns]
+        if levels is None:
+            levels = [level for level in LEVELS if regions is not None or 'region' not in LEVELS[level]]
+        shifts = df[columns].astype('float64').mean().fillna(0.0)
+        cube = cls({}, shifts)
+        cube.tables = cube.aggregate(df, regions, levels)
+        return cube
+
+    def aggregate(self, df, regions=None, levels=None):
+        """
+        Count, shifted sum and shifted sum of squares of df per key of each level.
+        """
+        if levels is None:
+            levels = list(self.tables)
+        values = df[self.columns].astype('float64') - self.shifts
+        terms = pd.concat({'count': values.notna().astype('int64'), 'sum': values, 'sumsq': values ** 2}, axis=1)
+
+        keys = {'year': df['year'], 'entity': df['entity']}
+        if regions is not None:
+            keys['region'] = df['entity'].map(regions)
+
+        tables = {}
+        for level in levels:
+            missing = [key for key in LEVELS[level] if key not in keys]
+            if missing:
+                raise ValueError(f"Level '{level}' needs {missing}; pass regions to include it.")
+            table = terms.groupby([keys[key] for key in LEVELS[level]], observed=True, sort=True).sum()
+            table.index.names = LEVELS[level]
+            tables[level] = table
+        return tables
+
+    def update(self, df, regions=None):
+        """
+        Add rows for years not yet in the cube, e.g. a newly published year.
+        Rows for years already aggregated are rejected, since adding them again
+        would count them twice; rebuild the cube to revise past years.
+        """
+        if 'year' in self.tables:
+            overlap = np.intersect1d(df['year'].unique(), self.tables['year'].index)
+            if len(overlap):
+                raise ValueError(f"Years {overlap.tolist()} are already in the cube.")
+        for level, table in self.aggregate(df, regions).items():
+            updated = self.tables[level].add(table, fill_value=0)
+            updated['count'] = updated['count'].astype('int64')
+            self.tables[level] = updated
+        return self
+
+    def statistics(self, level, columns=None, by=None):
+        """
+        Return the count, sum and sumsq tables of a level, optionally rolled up
+        further by grouping its index with by (e.g. years into decades).
+        """
+        if level not in self.tables:
+            raise KeyError(f"Level '{level}' is not in the cube. Available: {sorted(self.tables)}")
+        if columns is None:
+            columns = self.columns
+        table = self.tables[level]
+        if by is not None:
+            table = table.groupby(by).sum()
+        return table['count'][columns], table['sum'][columns], table['sumsq'][columns]
+
+    def count(self, level, columns=None, by=None):
+        """
+        Number of present values of each column per key of level.
+        """
+        return self.statistics(level, columns, by)[0]
+
+    def mean(self, level, columns=None, by=None):
+        """
+        Mean of each column per key of level, NaN where a key has no values.
+        """
+        count, total, _ = self.statistics(level, columns, by)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return total / count.where(count > 0) + self.shifts[count.columns]
+
+    def variance(self, level, columns=None, by=None, ddof=1):
+        """
+        Variance of each column per key of level, NaN where a key has ddof
+        values or fewer.
+        """
+        count, total, sumsq = self.statistics(level, columns, by)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = (sumsq - total ** 2 / count) / (count - ddof).where(count > ddof)
+        return variance.clip(lower=0.0)
+
+    def save(self, file_path, compression=None):
+        """
+        Write the cube as one long table (level, keys, column, shift and the
+        statistics) in the format given by the file extension.
+        """
+        parts = []
+        for level, table in self.tables.items():
+            long = table.stack(level=1, future_stack=True).reset_index()
+            long = long.rename(columns={long.columns[len(LEVELS[level])]: 'column'})
+            long.insert(0, 'level', level)
+            parts.append(long)
+        long = pd.concat(parts, ignore_index=True)
+        long['shift'] = long['column'].map(self.shifts)
+        key_columns = list(dict.fromkeys(key for level in self.tables for key in LEVELS[level]))
+        write_frame(long[['level'] + key_columns + ['column', 'shift'] + STATISTICS], file_path, compression=compression)
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        Read a cube written by save.
+        """
+        long = read_frame(file_path)
+        shifts = long.drop_duplicates('column').set_index('column')['shift']
+        shifts = shifts.rename_axis(None).rename(None)
+        tables = {}
+        for level, rows in long.groupby('level', sort=False):
+            keys = LEVELS[level]
+            if 'year' in keys:
+                rows = rows.astype({'year': 'int64'})
+            table = rows.set_index(keys + ['column'])[STATISTICS].unstack('column')
+            table = table.reindex(columns=pd.MultiIndex.from_product([STATISTICS, shifts.index]))
+            table['count'] = table['count'].astype('int64')
+            tables[level] = table
+        return cls(tables, shifts)
+
+@instrumented
+def build_cube(merged_df, regions=None, columns=None):
+    """
+    Build the aggregate cube of the merged data.
+    """
+    return AggregateCube.from_frame(merged_df, columns=columns, regions=regions)
@@ -1,15 +1,57 @@
-import pandas as pd
+import hashlib
+import json
 import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from src.instrumentation import instrumented, record_dropped
+from src.schema import DERIVED_FIELDS, canonical_name, published_values, storage_dtypes
+from src.storage import ChunkWriter, atomic_output, frame_columns, read_frame, write_frame, with_format
+
+# Storage dtypes for the key columns: entity as a category, year as a small int
+KEY_DTYPES = storage_dtypes(['entity', 'year'])
+
+def normalize_column_name(column):
+    """
+    Normalize a column name: lowercase and replace spaces with underscores.
+    """
+    return column.lower().replace(" ", "_")
 
-def load_data(file_path):
+def field_name(column):
+    """
+    Name a raw or processed column is known by in the pipeline: its compact
+    schema field name if it is registered, otherwise its normalized name.
+    """
+    return canonical_name(normalize_column_name(column))
+
+@instrumented
+def load_data(file_path, columns=None, dtype=None):
     """
     Load raw data from a specified file path.
+
+    CSV, Parquet and Feather files are supported. columns restricts the load to
+    the listed columns and dtype sets their in-memory types; both are given by
+    field name (see field_name) and applied while the file is read, so unused
+    columns are never parsed. Columns not present in the file are ignored.
     """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"File not found: {file_path}")
-    
-    return pd.read_csv(file_path)
 
+    if columns is None and dtype is None:
+        return read_frame(file_path)
+
+    # Map normalized names back to the names stored in the file
+    stored_columns = {field_name(column): column for column in frame_columns(file_path)}
+    if columns is not None:
+        wanted = set(columns)
+        columns = [stored for name, stored in stored_columns.items() if name in wanted]
+    if dtype is not None:
+        dtype = {stored_columns[name]: column_dtype for name, column_dtype in dtype.items() if name in stored_columns}
+
+    return read_frame(file_path, columns=columns, dtype=dtype)
+
+@instrumented
 def clean_data(df, columns_to_check, essential_columns=None):
     """
     Clean the loaded data:
@@ -17,8 +59,8 @@ def clean_data(df, columns_to_check, essential_columns=None):
     - Remove duplicates.
     - Standardize column names.
     """
-    # Normalize column names: lowercase and replace spaces with underscores
-    df.columns = df.columns.str.lower().str.replace(" ", "_")
+    # Normalize column names and map registered source columns to their compact field names
+    df.columns = df.columns.map(field_name)
     
     # Print column names after normalization for better debugging
     print("Normalized Columns in DataFrame:")
@@ -30,10 +72,14 @@ def clean_data(df, columns_to_check, essential_columns=None):
             print(f"Warning: Column '{col}' not found in DataFrame columns.")
     
     # Remove rows with missing values in the specified columns
+    rows = len(df)
     df.dropna(subset=columns_to_check, inplace=True)
+    record_dropped('dropna', rows - len(df))
     
     # Remove duplicates
+    rows = len(df)
     df.drop_duplicates(inplace=True)
+    record_dropped('drop_duplicates', rows - len(df))
 
     # Retain only essential columns if specified
     if essential_columns is not None:
@@ -41,130 +87,496 @@ def clean_data(df, columns_to_check, essential_columns=None):
     
     return df
 
-def save_cleaned_data(df, output_path):
+class SeenKeys:
+    """
+    Set of 64-bit key hashes kept as a few sorted runs of geometrically
+    decreasing size. New keys form a run of their own, which is merged with the
+    runs before it only while they are no larger, so each hash is re-sorted
+    O(log n) times in total rather than once per chunk.
+    """
+    def __init__(self):
+        self.runs = []
+
+    def __len__(self):
+        return sum(len(run) for run in self.runs)
+
+    def contains(self, keys):
+        found = np.zeros(len(keys), dtype=bool)
+        for run in self.runs:
+            positions = np.searchsorted(run, keys).clip(max=len(run) - 1)
+            found |= run[positions] == keys
+        return found
+
+    def add(self, keys):
+        """
+        Add distinct keys that are not in the set yet.
+        """
+        run = np.sort(keys)
+        while self.runs and len(self.runs[-1]) <= len(run):
+            # Disjoint sorted runs; a stable sort merges them in linear time
+            run = np.sort(np.concatenate([self.runs.pop(), run]), kind='stable')
+        if len(run):
+            self.runs.append(run)
+
+@instrumented
+def clean_data_streaming(file_path, output_path, columns_to_check, essential_columns=None, key_columns=None,
+                         chunksize=100_000, dtype=None, compression=None):
+    """
+    Clean a raw CSV that may be larger than memory, reading and writing it in chunks:
+    - Remove rows with missing values in specific columns.
+    - Remove duplicates of the (entity, year) key, keeping the first row.
+    - Standardize column names.
+
+    Duplicates are found through a 64-bit hash of key_columns, so besides the
+    current chunk only 8 bytes per distinct key are kept in memory.
+    dtype is applied while each chunk is parsed. Returns the number of rows written.
+    """
+    if key_columns is None:
+        key_columns = KEY_COLUMNS
+
+    # Only parse the columns that are checked, keyed on or retained
+    stored_columns = {field_name(column): column for column in pd.read_csv(file_path, nrows=0).columns}
+    for col in columns_to_check:
+        if col not in stored_columns:
+            print(f"Warning: Column '{col}' not found in DataFrame columns.")
+    if essential_columns is not None:
+        wanted = set(essential_columns) | set(columns_to_check) | set(key_columns)
+        usecols = [stored for name, stored in stored_columns.items() if name in wanted]
+    else:
+        usecols = None
+    if dtype is not None:
+        dtype = {stored_columns[name]: column_dtype for name, column_dtype in dtype.items() if name in stored_columns}
+    check_columns = [col for col in columns_to_check if col in stored_columns]
+
+    # Hashes of every key written so far
+    seen_keys = SeenKeys()
+
+    with ChunkWriter(output_path, compression=compression) as writer:
+        for chunk in pd.read_csv(file_path, usecols=usecols, dtype=dtype, chunksize=chunksize):
+            chunk.columns = chunk.columns.map(field_name)
+
+            # Remove rows with missing values in the specified columns
+            rows = len(chunk)
+            chunk = chunk.dropna(subset=check_columns)
+            record_dropped('dropna', rows - len(chunk))
+
+            # Remove keys repeated within the chunk or already written
+            keys = pd.util.hash_pandas_object(chunk[key_columns], index=False).to_numpy()
+            keep = ~seen_keys.contains(keys) & ~pd.Series(keys).duplicated().to_numpy()
+            chunk = chunk[keep]
+            record_dropped('drop_duplicates', len(keep) - len(chunk))
+            seen_keys.add(keys[keep])
+
+            # Retain only essential columns if specified
+            if essential_columns is not None:
+                chunk = chunk[essential_columns]
+
+            writer.write(chunk)
+
+    print(f"Cleaned data saved to: {output_path}")
+    return writer.rows_written
+
+@instrumented
+def save_cleaned_data(df, output_path, compression=None):
     """
     Save cleaned data to the specified output path.
+
+    The file extension selects the format (.csv, .parquet or .feather). The
+    file is replaced atomically, so readers such as the query service never
+    load a partially written one.
     """
-    df.to_csv(output_path, index=False)
+    with atomic_output(output_path) as tmp_path:
+        write_frame(df, tmp_path, compression=compression)
     print(f"Cleaned data saved to: {output_path}")
 
-def merge_data(infant_mortality_df, life_expectancy_df, gdp_life_df, healthcare_df):
+def encode_keys(datasets, on):
     """
-    Merge the infant mortality, life expectancy, GDP, and healthcare datasets on 'year' and 'entity'.
+    Encode each dataset's key columns as one int64 code per row, using codes
+    shared by all datasets so equal keys get equal codes.
     """
-    # Merge infant mortality and life expectancy datasets
-    merged_df = pd.merge(infant_mortality_df, life_expectancy_df, on=['year', 'entity'], how='inner')
+    keys = [np.zeros(len(df), dtype=np.int64) for df in datasets]
+    for column in on:
+        # Factorize each dataset on its own, then map its uniques onto shared codes.
+        # Missing values get a code of their own, so like pd.merge they only match each other
+        factorized = [pd.factorize(df[column], use_na_sentinel=False) for df in datasets]
+        shared = pd.Index(np.concatenate([np.asarray(uniques) for _, uniques in factorized])).unique()
+        for dataset_keys, (codes, uniques) in zip(keys, factorized):
+            dataset_keys *= len(shared)
+            dataset_keys += shared.get_indexer(uniques)[codes]
+    return keys
 
-    # Merge the result with the GDP dataset
-    merged_df = pd.merge(merged_df, gdp_life_df, on=['year', 'entity'], how='inner')
+@instrumented
+def merge_data(*datasets, on=None):
+    """
+    Merge any number of datasets (e.g. infant mortality, life expectancy, GDP,
+    and healthcare) on 'year' and 'entity', keeping keys present in all of them.
 
-    # Merge the result with the healthcare dataset
-    merged_df = pd.merge(merged_df, healthcare_df, on=['year', 'entity'], how='inner')
-    
-    return merged_df
+    Every dataset is indexed once on the shared key, the key sets are
+    intersected first, and the output columns are assembled in a single pass
+    in the order of the first dataset's rows.
+    """
+    if on is None:
+        on = ['year', 'entity']
+    if not datasets:
+        raise ValueError("merge_data needs at least one dataset.")
+
+    value_columns = [[column for column in df.columns if column not in on] for df in datasets]
+    all_value_columns = [column for columns in value_columns for column in columns]
+    indexes = [pd.Index(dataset_keys) for dataset_keys in encode_keys(datasets, on)]
 
+    # Repeated keys or clashing column names need pd.merge's many-to-many and suffix handling
+    if len(set(all_value_columns)) != len(all_value_columns) or not all(index.is_unique for index in indexes):
+        merged_df = datasets[0]
+        for df in datasets[1:]:
+            merged_df = pd.merge(merged_df, df, on=on, how='inner')
+        return merged_df
+
+    # Intersect the key sets, keeping the first dataset's row order
+    common = indexes[0]
+    for index in indexes[1:]:
+        common = common[index.get_indexer(common) >= 0]
+
+    # Take the first dataset's columns (including the key) and every other dataset's values
+    columns = {}
+    for i, (df, index) in enumerate(zip(datasets, indexes)):
+        positions = index.get_indexer(common)
+        for column in (df.columns if i == 0 else value_columns[i]):
+            values = df[column].take(positions).reset_index(drop=True)
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.cat.remove_unused_categories()
+            columns[column] = values
+
+    return pd.DataFrame(columns)
+
+@instrumented
 def aggregated_values(merged_df):
     """
     Function to compute aggregated values for infant mortality and life expectancy
     based on both male and female data and add them as new columns in the DataFrame.
-    """
-    merged_df['aggregated_infant_mortality'] = (
-        merged_df['observation_value_-_indicator:_infant_mortality_rate_-_sex:_female_-_wealth_quintile:_total_-_unit_of_measure:_deaths_per_100_live_births'] +
-        merged_df['observation_value_-_indicator:_infant_mortality_rate_-_sex:_male_-_wealth_quintile:_total_-_unit_of_measure:_deaths_per_100_live_births']
-    ) / 2
 
-    merged_df['aggregated_life_expectancy'] = (
-        merged_df['period_life_expectancy_-_sex:_female_-_age:_0'] +
-        merged_df['period_life_expectancy_-_sex:_male_-_age:_0']
-    ) / 2
+    Every derived field in the schema is added as the mean of its components,
+    computed in float64 from their published values.
+    """
+    for derived in DERIVED_FIELDS:
+        components = [published_values(merged_df[component]) for component in derived.components]
+        merged_df[derived.name] = sum(components) / len(derived.components)
 
     return merged_df 
 
 
-def process_data():
+# Columns shared by every dataset and used as the merge key
+KEY_COLUMNS = ['entity', 'year']
+
+# Dataset definitions in merge order: where each raw file lives, where its cleaned
+# copy goes and which columns are checked for missing values / retained
+DATASETS = [
+    {
+        'name': 'infant_mortality',
+        'label': 'Infant Mortality',
+        'raw_path': './data/raw/infant-mortality-rate-wdi.csv',
+        'cleaned_path': './data/processed/infant-mortality-rate-wdi-cleaned.csv',
+        'columns_to_check': ['entity', 'year', 'infant_mortality_female', 'infant_mortality_male'],
+        'essential_columns': ['entity', 'year', 'infant_mortality_female', 'infant_mortality_male'],
+    },
+    {
+        'name': 'life_expectancy',
+        'label': 'Life Expectancy',
+        'raw_path': './data/raw/life-expectation-at-birth-by-sex.csv',
+        'cleaned_path': './data/processed/life-expectation-at-birth-by-sex-cleaned.csv',
+        'columns_to_check': ['entity', 'year', 'life_expectancy_female', 'life_expectancy_male'],
+        'essential_columns': ['entity', 'year', 'life_expectancy_female', 'life_expectancy_male'],
+    },
+    {
+        'name': 'gdp',
+        'label': 'GDP',
+        'raw_path': './data/raw/life-expectancy-vs-gdp-per-capita.csv',
+        'cleaned_path': './data/processed/life-expectancy-vs-gdp-per-capita-cleaned.csv',
+        'columns_to_check': ['year', 'gdp_per_capita'],
+        'essential_columns': ['entity', 'year', 'gdp_per_capita'],
+    },
+    {
+        'name': 'healthcare',
+        'label': 'Healthcare',
+        'raw_path': './data/raw/life-expectancy-vs-health-expenditure.csv',
+        'cleaned_path': './data/processed/life-expectancy-vs-health-expenditure-cleaned.csv',
+        'columns_to_check': ['year', 'health_expenditure_per_capita'],
+        'essential_columns': ['entity', 'year', 'health_expenditure_per_capita'],
+    },
+]
+
+MERGED_DATA_PATH = './data/processed/merged_data.csv'
+
+# Raw file carrying each entity's OWID world region, set on its latest year only
+REGIONS_PATH = './data/raw/life-expectancy-vs-gdp-per-capita.csv'
+
+# Records what each output was built from so unchanged inputs can be skipped
+MANIFEST_PATH = './data/processed/manifest.json'
+
+def load_regions(file_path=REGIONS_PATH):
     """
-    Main function to load, clean, merge, and save data for all datasets.
+    Map each entity to its world region, from the rows of the raw file that
+    carry one. Entities without a region (e.g. aggregates such as 'World')
+    are left out.
+    """
+    regions = load_data(file_path, columns=['entity', 'region'], dtype={'region': 'category'})
+    regions.columns = regions.columns.map(field_name)
+    regions = regions.dropna(subset=['region']).drop_duplicates('entity')
+    return regions.set_index('entity')['region'].cat.remove_unused_categories()
+
+def file_hash(file_path, block_size=1 << 20):
     """
+    Compute the SHA-256 hash of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_manifest(manifest_path):
+    """
+    Load the build manifest, or return an empty one if it does not exist yet.
+    """
+    if not os.path.exists(manifest_path):
+        return {'datasets': {}, 'merged': {}}
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    manifest.setdefault('datasets', {})
+    manifest.setdefault('merged', {})
+    return manifest
+
+def save_manifest(manifest, manifest_path):
+    """
+    Write the build manifest, replacing the previous one atomically.
+    """
+    tmp_path = f'{manifest_path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def load_columns(spec):
+    """
+    Return the columns a dataset needs from its raw file: everything that is
+    checked for missing values or retained after cleaning.
+    """
+    columns = list(spec['essential_columns'])
+    columns += [column for column in spec['columns_to_check'] if column not in columns]
+    return columns
+
+def load_dtypes(spec, float_dtype=None):
+    """
+    Return the dtypes a dataset's columns are parsed into: the storage dtypes
+    declared in the schema, with float_dtype (if given) for every indicator.
+    Columns outside the schema may declare theirs in the spec's 'dtypes'.
+    """
+    dtypes = storage_dtypes(load_columns(spec), float_dtype)
+    for column, dtype in spec.get('dtypes', {}).items():
+        if column not in dtypes:
+            dtypes[column] = float_dtype if float_dtype is not None and dtype.startswith('float') else dtype
+    return dtypes
+
+def cleaning_params(spec, float_dtype=None):
+    """
+    Return the parameters that determine a dataset's cleaned output.
+    """
+    return {
+        'columns_to_check': list(spec['columns_to_check']),
+        'essential_columns': list(spec['essential_columns']),
+        'dtypes': load_dtypes(spec, float_dtype),
+    }
+
+def is_up_to_date(entry, raw_hash, params, output_path):
+    """
+    Check whether a manifest entry still describes the output on disk.
+    """
+    return (
+        bool(entry)
+        and entry.get('raw_hash') == raw_hash
+        and entry.get('params') == params
+        and entry.get('output') == output_path
+        and os.path.exists(output_path)
+        and entry.get('output_hash') == file_hash(output_path)
+    )
+
+@instrumented
+def process_dataset(spec, entry=None, force=False, compression=None, float_dtype=None, chunksize=None, persist=True):
+    """
+    Load, clean and save a single dataset, or reuse its cleaned output if the
+    manifest entry shows nothing has changed. With a chunksize the raw file is
+    cleaned in streaming mode and never loaded whole. With persist=False a
+    rebuilt dataset is not saved (streaming goes through a temporary file).
+
+    Returns the cleaned DataFrame and the manifest entry describing it (None
+    when a rebuilt dataset was not saved).
+    """
+    raw_hash = file_hash(spec['raw_path'])
+    params = dict(cleaning_params(spec, float_dtype), compression=compression, chunksize=chunksize)
+
+    if not force and is_up_to_date(entry, raw_hash, params, spec['cleaned_path']):
+        # Reuse the cached cleaned frame
+        print(f"{spec['label']} Data unchanged, reusing {spec['cleaned_path']}")
+        return load_data(spec['cleaned_path'], dtype=params['dtypes']), entry
+
+    print(f"Processing {spec['label']} Data...")
+    if chunksize is not None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_path = spec['cleaned_path'] if persist else os.path.join(tmp_dir, os.path.basename(spec['cleaned_path']))
+            clean_data_streaming(spec['raw_path'], output_path, spec['columns_to_check'],
+                                 essential_columns=spec['essential_columns'], chunksize=chunksize,
+                                 dtype=params['dtypes'], compression=compression)
+            cleaned_df = load_data(output_path, dtype=params['dtypes'])
+    else:
+        # Load only the needed columns, parsed straight into their storage dtypes
+        raw_df = load_data(spec['raw_path'], columns=load_columns(spec), dtype=params['dtypes'])
+        cleaned_df = clean_data(raw_df, spec['columns_to_check'], essential_columns=spec['essential_columns'])
+        if persist:
+            save_cleaned_data(cleaned_df, spec['cleaned_path'], compression=compression)
+    return cleaned_df, dataset_entry(spec, raw_hash, params) if persist else None
+
+def dataset_entry(spec, raw_hash, params):
+    """
+    Manifest entry describing a dataset's cleaned output on disk.
+    """
+    return {
+        'raw_path': spec['raw_path'],
+        'raw_hash': raw_hash,
+        'params': params,
+        'output': spec['cleaned_path'],
+        'output_hash': file_hash(spec['cleaned_path']),
+    }
+
+def process_datasets_with_engine(datasets, engine, compression=None, float_dtype=None, persist=True):
+    """
+    Load, clean, merge and aggregate every dataset with a dataframe engine (see
+    src.engines) and save the cleaned outputs unless persist=False. Returns
+    each dataset's cleaned DataFrame and manifest entry (None when not saved),
+    and the merged DataFrame.
+    """
+    from src.engines import run_engine
+
+    print(f"Processing Data with the {engine} engine...")
+    cleaned_frames, merged_df = run_engine(engine, datasets, float_dtype)
+    results = []
+    for spec, cleaned_df in zip(datasets, cleaned_frames):
+        if not persist:
+            results.append((cleaned_df, None))
+            continue
+        params = dict(cleaning_params(spec, float_dtype), compression=compression, chunksize=None)
+        save_cleaned_data(cleaned_df, spec['cleaned_path'], compression=compression)
+        results.append((cleaned_df, dataset_entry(spec, file_hash(spec['raw_path']), params)))
+    return results, merged_df
+
+def process_data(datasets=None, merged_data_path=MERGED_DATA_PATH, manifest_path=MANIFEST_PATH, force=False,
+                 storage_format=None, compression=None, workers=None, executor='process',
+                 float_dtype=None, chunksize=None, persist=True, engine='pandas'):
     """
     Main function to load, clean, merge, and save data for all datasets.
+
+    Datasets whose raw file and cleaning parameters are unchanged since the last
+    run are not rebuilt; their cleaned output is reused. The merge only reruns
+    when one of its inputs changed. Pass force=True to rebuild everything.
+
+    storage_format ('csv', 'parquet' or 'feather') overrides the format of every
+    processed artifact; compression is passed on to the writer.
+
+    With workers > 1 the datasets are processed concurrently in a 'process' or
+    'thread' pool and merged once all of them have finished.
+
+    Raw files are read with only the columns each dataset uses, renamed to
+    their compact schema fields and parsed into the schema's storage dtypes
+    (entity as a category, year as int16, indicators as float32). Pass a
+    float_dtype such as 'float64' to override the indicator dtype.
+
+    With a chunksize every raw file is cleaned in streaming mode, chunksize
+    rows at a time, so inputs larger than memory can be processed.
+
+    With persist=False nothing is written: rebuilt datasets and the merged
+    data are kept in memory and returned, and the cleaned outputs, merged data
+    and manifest on disk are left as they were (unchanged cleaned outputs are
+    still reused, but the merged data is never read back).
+
+    engine selects the dataframe library that loads, cleans and merges the
+    data: 'pandas', or 'polars' / 'duckdb' (see src.engines), which scan the
+    raw files in parallel and give the same output. The other engines rebuild
+    every dataset in one run, use every core themselves and do not support
+    workers or chunksize.
     """
-    # Define paths for the raw data files
-    infant_mortality_raw_path = './data/raw/infant-mortality-rate-wdi.csv'  
-    life_expectancy_raw_path = './data/raw/life-expectation-at-birth-by-sex.csv'
-    gdp_life_raw_path = './data/raw/life-expectancy-vs-gdp-per-capita.csv'
-    healthcare_raw_path = './data/raw/life-expectancy-vs-health-expenditure.csv'  
-    
-    # Define paths for the output (cleaned) data files
-    infant_mortality_cleaned_path = './data/processed/infant-mortality-rate-wdi-cleaned.csv'
-    life_expectancy_cleaned_path = './data/processed/life-expectation-at-birth-by-sex-cleaned.csv'  
-    gdp_life_cleaned_path = './data/processed/life-expectancy-vs-gdp-per-capita-cleaned.csv'
-    healthcare_cleaned_path = './data/processed/life-expectancy-vs-health-expenditure-cleaned.csv'
-    merged_data_path = './data/processed/merged_data.csv'
-    
-    # Columns to check for missing values in infant mortality data
-    infant_mortality_columns = [
-        'entity',
-        'year',
-        'observation_value_-_indicator:_infant_mortality_rate_-_sex:_female_-_wealth_quintile:_total_-_unit_of_measure:_deaths_per_100_live_births',
-        'observation_value_-_indicator:_infant_mortality_rate_-_sex:_male_-_wealth_quintile:_total_-_unit_of_measure:_deaths_per_100_live_births'
-    ]
-    
-    # Columns to check for missing values in life expectancy data
-    life_expectancy_columns = [
-        'entity',
-        'year',
-        'period_life_expectancy_-_sex:_female_-_age:_0',
-        'period_life_expectancy_-_sex:_male_-_age:_0'
-    ]
-
-    # Columns to check for missing values in GDP data
-    gdp_life_columns = [
-        'year',
-        'gdp_per_capita'
-    ]
-
-    # Columns to check for missing values in healthcare expenditure data
-    healthcare_columns = [
-        'year',
-        'health_expenditure_per_capita_-_total'
-    ]
-    
-    # Load, clean, and save data for infant mortality
-    print("Processing Infant Mortality Data...")
-    infant_mortality_df = load_data(infant_mortality_raw_path)
-    cleaned_infant_mortality_df = clean_data(infant_mortality_df, infant_mortality_columns, essential_columns=['entity', 'year', 'observation_value_-_indicator:_infant_mortality_rate_-_sex:_female_-_wealth_quintile:_total_-_unit_of_measure:_deaths_per_100_live_births', 'observation_value_-_indicator:_infant_mortality_rate_-_sex:_male_-_wealth_quintile:_total_-_unit_of_measure:_deaths_per_100_live_births'])
-    save_cleaned_data(cleaned_infant_mortality_df, infant_mortality_cleaned_path)
-
-    # Load, clean, and save data for GDP per capita
-    print("Processing GDP Data...")
-    gdp_life_df = load_data(gdp_life_raw_path)
-    cleaned_gdp_life_df = clean_data(gdp_life_df, gdp_life_columns, essential_columns=['entity', 'year', 'gdp_per_capita'])
-    save_cleaned_data(cleaned_gdp_life_df, gdp_life_cleaned_path)
-
-    # Load, clean, and save data for healthcare expenditure
-    print("Processing Healthcare Data...")
-    healthcare_df = load_data(healthcare_raw_path)
-    cleaned_healthcare_df = clean_data(healthcare_df, healthcare_columns, essential_columns=['entity','year', 'health_expenditure_per_capita_-_total'])
-    save_cleaned_data(cleaned_healthcare_df, healthcare_cleaned_path)
-    
-    # Load, clean, and save data for life expectancy
-    print("Processing Life Expectancy Data...")
-    life_expectancy_df = load_data(life_expectancy_raw_path)
-    cleaned_life_expectancy_df = clean_data(life_expectancy_df, life_expectancy_columns, essential_columns=['entity','year', 'period_life_expectancy_-_sex:_female_-_age:_0', 'period_life_expectancy_-_sex:_male_-_age:_0'])
-    save_cleaned_data(cleaned_life_expectancy_df, life_expectancy_cleaned_path)
-    
-    # Merge the cleaned data on 'year' and 'entity'
-    print("Merging Data...")
-    merged_df = merge_data(cleaned_infant_mortality_df, cleaned_life_expectancy_df, cleaned_gdp_life_df, cleaned_healthcare_df)
-    
-    # Apply aggregation
-    print("Applying Aggregation...")
-    merged_df = aggregated_values(merged_df)
-    
-    # Save merged data
-    save_cleaned_data(merged_df, merged_data_path)
+    if datasets is None:
+        datasets = DATASETS
+    if storage_format is not None:
+        datasets = [dict(spec, cleaned_path=with_format(spec['cleaned_path'], storage_format)) for spec in datasets]
+        merged_data_path = with_format(merged_data_path, storage_format)
 
-if __name__ == "__main__":
-    process_data()
+    manifest = load_manifest(manifest_path)
+    entries = [manifest['datasets'].get(spec['name']) for spec in datasets]
 
+    merged_df = None
+    if engine != 'pandas':
+        if chunksize is not None or workers is not None:
+            raise ValueError(f"chunksize and workers are only supported by the pandas engine, not '{engine}'.")
+        results, merged_df = process_datasets_with_engine(datasets, engine, compression, float_dtype, persist)
+    elif workers is not None and workers > 1:
+        if executor == 'process':
+            pool = ProcessPoolExecutor(max_workers=workers)
+        elif executor == 'thread':
+            pool = ThreadPoolExecutor(max_workers=workers)
+        else:
+            raise ValueError(f"Unknown executor '{executor}'. Expected 'process' or 'thread'.")
+        with pool:
+            results = list(pool.map(process_dataset, datasets, entries,
+                                    [force] * len(datasets), [compression] * len(datasets),
+                                    [float_dtype] * len(datasets), [chunksize] * len(datasets),
+                                    [persist] * len(datasets)))
+    else:
+        results = [process_dataset(spec, entry, force, compression, float_dtype, chunksize, persist)
+                   for spec, entry in zip(datasets, entries)]
 
+    cleaned_frames = []
+    input_hashes = {}
+    for spec, (cleaned_df, entry) in zip(datasets, results):
+        cleaned_frames.append(cleaned_df)
+        if entry is not None:
+            manifest['datasets'][spec['name']] = entry
+            input_hashes[spec['name']] = entry['output_hash']
+
+    merged_entry = manifest['merged']
+    if merged_df is not None:
+        # Already merged by the engine
+        rebuilt = True
+    elif (
+        persist
+        and not force
+        and merged_entry.get('inputs') == input_hashes
+        and merged_entry.get('compression') == compression
+        and merged_entry.get('output') == merged_data_path
+        and os.path.exists(merged_data_path)
+        and merged_entry.get('output_hash') == file_hash(merged_data_path)
+    ):
+        print(f"Merged data unchanged, reusing {merged_data_path}")
+        merged_df = load_data(merged_data_path, dtype=storage_dtypes(frame_columns(merged_data_path), float_dtype))
+        rebuilt = False
+    else:
+        # Merge the cleaned data on 'year' and 'entity'
+        print("Merging Data...")
+        merged_df = merge_data(*cleaned_frames)
+
+        # Apply aggregation
+        print("Applying Aggregation...")
+        merged_df = aggregated_values(merged_df.astype(KEY_DTYPES))
+        rebuilt = True
+
+    # Save merged data and the manifest
+    if persist:
+        if rebuilt:
+            save_cleaned_data(merged_df, merged_data_path, compression=compression)
+            manifest['merged'] = {
+                'inputs': input_hashes,
+                'compression': compression,
+                'output': merged_data_path,
+                'output_hash': file_hash(merged_data_path),
+            }
+        save_manifest(manifest, manifest_path)
+    return merged_df
+
+if __name__ == "__main__":
+    process_data()
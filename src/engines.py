@@ -0,0 +1,253 @@
+import importlib
+from collections import namedtuple
+from src.data_processing import (KEY_COLUMNS, aggregated_values, clean_data, field_name, load_columns, load_data,
+                                 load_dtypes, merge_data)
+from src.instrumentation import instrumented
+from src.schema import DERIVED_FIELDS, storage_dtypes
+from src.storage import frame_columns, storage_format
+
+# Strings pandas.read_csv reads as missing values; the other engines are given
+# the same list so they drop exactly the same rows
+NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>',
+             'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+
+def _require(module, engine):
+    """
+    Import the optional library backing an engine.
+    """
+    try:
+        return importlib.import_module(module)
+    except ImportError as e:
+        raise ImportError(f"The {engine} engine requires {module}: pip install {module}") from e
+
+def stored_columns(file_path, columns):
+    """
+    Map each of the wanted field names to the column stored in the file, in
+    the file's column order (the order pandas reads them in).
+    """
+    wanted = set(columns)
+    return {field_name(column): column for column in frame_columns(file_path) if field_name(column) in wanted}
+
+class PandasEngine:
+    """
+    The eager, single-threaded pandas functions of data_processing.
+    """
+    name = 'pandas'
+
+    def scan(self, spec, float_dtype=None):
+        return load_data(spec['raw_path'], columns=load_columns(spec), dtype=load_dtypes(spec, float_dtype))
+
+    def clean(self, frame, spec):
+        return clean_data(frame, spec['columns_to_check'], essential_columns=spec['essential_columns'])
+
+    def merge(self, frames):
+        return merge_data(*frames)
+
+    def aggregate(self, frame):
+        return aggregated_values(frame.astype(storage_dtypes(KEY_COLUMNS)))
+
+    def collect(self, frames, float_dtype=None):
+        return list(frames)
+
+class PolarsEngine:
+    """
+    Lazy Polars query plans. Raw files are scanned in parallel and only the
+    columns and rows a dataset needs are parsed (projection and predicate
+    pushdown); every plan is executed at once by collect, which also shares
+    the cleaned datasets between their own outputs and the merge.
+    """
+    name = 'polars'
+
+    def __init__(self):
+        self.pl = _require('polars', self.name)
+
+    def scan(self, spec, float_dtype=None):
+        pl = self.pl
+        file_path = spec['raw_path']
+        fmt = storage_format(file_path)
+        if fmt == 'csv':
+            # Read every value as text and cast it like pandas does, via float64 for the indicators
+            frame = pl.scan_csv(file_path, infer_schema=False, null_values=NA_VALUES)
+        elif fmt == 'parquet':
+            frame = pl.scan_parquet(file_path)
+        else:
+            frame = pl.scan_ipc(file_path)
+
+        types = {'category': pl.String, 'int16': pl.Int16, 'float32': pl.Float32, 'float64': pl.Float64}
+        dtypes = load_dtypes(spec, float_dtype)
+        columns = []
+        for name, stored in stored_columns(file_path, load_columns(spec)).items():
+            column = pl.col(stored)
+            if dtypes.get(name, '').startswith('float'):
+                column = column.cast(pl.Float64)
+            if name in dtypes:
+                column = column.cast(types[dtypes[name]])
+            columns.append(column.alias(name))
+        return frame.select(columns)
+
+    def clean(self, frame, spec):
+        present = frame.collect_schema().names()
+        subset = [column for column in spec['columns_to_check'] if column in present]
+        frame = frame.drop_nulls(subset=subset).unique(keep='first', maintain_order=True)
+        return frame.select(spec['essential_columns'])
+
+    def merge(self, frames):
+        merged = frames[0]
+        for frame in frames[1:]:
+            # Missing keys match each other, as in pandas.merge
+            merged = merged.join(frame, on=KEY_COLUMNS, how='inner', maintain_order='left', nulls_equal=True)
+        return merged
+
+    def aggregate(self, frame):
+        pl = self.pl
+        # Published values via their shortest decimal, as schema.published_values
+        return frame.with_columns([
+            (sum(pl.col(component).cast(pl.String).cast(pl.Float64) for component in derived.components)
+             / len(derived.components)).alias(derived.name)
+            for derived in DERIVED_FIELDS
+        ])
+
+    def collect(self, frames, float_dtype=None):
+        results = []
+        for frame in self.pl.collect_all(frames):
+            df = frame.to_pandas()
+            results.append(df.astype(storage_dtypes(df.columns, float_dtype)))
+        return results
+
+# A DuckDB query: its SQL, output columns and the row number columns giving its row order
+Query = namedtuple('Query', ['sql', 'columns', 'order'])
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+class DuckDBEngine:
+    """
+    SQL queries on an embedded, multi-threaded DuckDB database. Raw files are
+    read by DuckDB's parallel scanners with only the needed columns and rows,
+    and each cleaned dataset is kept as a temporary table for its output and
+    the merge.
+    Rows keep the order pandas gives them through a row number taken at load time.
+    """
+    name = 'duckdb'
+
+    # SQL types of the storage dtypes
+    TYPES = {'category': 'VARCHAR', 'int16': 'SMALLINT', 'float32': 'FLOAT', 'float64': 'DOUBLE'}
+
+    def __init__(self):
+        self.connection = _require('duckdb', self.name).connect()
+        self.tables = 0
+
+    def materialize(self, sql):
+        """
+        Run sql into a new temporary table and return the table's name.
+        """
+        self.tables += 1
+        table = f'table_{self.tables}'
+        self.connection.execute(f'CREATE TEMP TABLE {table} AS {sql}')
+        return table
+
+    def scan(self, spec, float_dtype=None):
+        file_path = spec['raw_path'].replace("'", "''")
+        fmt = storage_format(spec['raw_path'])
+        if fmt == 'csv':
+            # Read every value as text and cast it like pandas does, via float64 for the indicators
+            nulls = ', '.join("'" + value.replace("'", "''") + "'" for value in NA_VALUES)
+            source = f"read_csv('{file_path}', header=true, all_varchar=true, nullstr=[{nulls}])"
+        elif fmt == 'parquet':
+            source = f"read_parquet('{file_path}')"
+        else:
+            raise ValueError(f"The {self.name} engine cannot read {fmt} files.")
+
+        dtypes = load_dtypes(spec, float_dtype)
+        stored_names = stored_columns(spec['raw_path'], load_columns(spec))
+        columns = []
+        for name, stored in stored_names.items():
+            column = quote(stored)
+            if dtypes.get(name, '').startswith('float'):
+                column = f'CAST({column} AS DOUBLE)'
+            if name in dtypes:
+                column = f'CAST({column} AS {self.TYPES[dtypes[name]]})'
+            columns.append(f'{column} AS {quote(name)}')
+
+        # Rows missing a checked value are dropped by the scan itself, so they are never loaded
+        checked = [quote(stored_names[column]) for column in spec['columns_to_check'] if column in stored_names]
+        not_null = ' AND '.join(f'{column} IS NOT NULL' for column in checked) or 'true'
+
+        # Loading into a table preserves the file's row order, which rowid then records
+        table = self.materialize(f"SELECT {', '.join(columns)} FROM {source} WHERE {not_null}")
+        return Query(f'SELECT rowid AS _row, * FROM {table}', list(stored_names), ['_row'])
+
+    def clean(self, frame, spec):
+        # Rows with missing values were dropped by scan; keep the first of every
+        # set of duplicate rows, as drop_duplicates does
+        partition = ', '.join(quote(column) for column in frame.columns)
+        columns = ', '.join(quote(column) for column in spec['essential_columns'])
+        table = self.materialize(
+            f'SELECT _row, {columns} FROM ({frame.sql}) '
+            f'QUALIFY row_number() OVER (PARTITION BY {partition} ORDER BY _row) = 1'
+        )
+        return Query(f'SELECT * FROM {table}', list(spec['essential_columns']), ['_row'])
+
+    def merge(self, frames):
+        selects = ['d0._row AS _row_0'] + [f'd0.{quote(column)}' for column in frames[0].columns]
+        joins = f'({frames[0].sql}) AS d0'
+        for i, frame in enumerate(frames[1:], start=1):
+            selects.append(f'd{i}._row AS _row_{i}')
+            selects += [f'd{i}.{quote(column)}' for column in frame.columns if column not in KEY_COLUMNS]
+            # Missing keys match each other, as in pandas.merge
+            keys = ' AND '.join(f'd0.{quote(key)} IS NOT DISTINCT FROM d{i}.{quote(key)}' for key in KEY_COLUMNS)
+            joins += f' JOIN ({frame.sql}) AS d{i} ON {keys}'
+        columns = frames[0].columns + [column for frame in frames[1:] for column in frame.columns
+                                       if column not in KEY_COLUMNS]
+        order = [f'_row_{i}' for i in range(len(frames))]
+        return Query(f"SELECT {', '.join(selects)} FROM {joins}", columns, order)
+
+    def aggregate(self, frame):
+        derived_columns = []
+        for derived in DERIVED_FIELDS:
+            # Same operations as aggregated_values: 0 + each component's published value in turn,
+            # read through its shortest decimal as schema.published_values does, then the division
+            total = ' + '.join(['0'] + [f'CAST(CAST({quote(component)} AS VARCHAR) AS DOUBLE)'
+                                        for component in derived.components])
+            derived_columns.append(f'({total}) / {len(derived.components)} AS {quote(derived.name)}')
+        sql = f"SELECT *, {', '.join(derived_columns)} FROM ({frame.sql})"
+        return Query(sql, frame.columns + [derived.name for derived in DERIVED_FIELDS], frame.order)
+
+    def collect(self, frames, float_dtype=None):
+        results = []
+        for frame in frames:
+            columns = ', '.join(quote(column) for column in frame.columns)
+            order = ', '.join(frame.order)
+            df = self.connection.execute(f'SELECT {columns} FROM ({frame.sql}) ORDER BY {order}').df()
+            results.append(df.astype(storage_dtypes(df.columns, float_dtype)))
+        return results
+
+ENGINES = {
+    'pandas': PandasEngine,
+    'polars': PolarsEngine,
+    'duckdb': DuckDBEngine,
+}
+
+def get_engine(name):
+    """
+    Create the dataframe engine called name (one of ENGINES).
+    """
+    if name not in ENGINES:
+        raise ValueError(f"Unknown engine '{name}'. Expected one of {sorted(ENGINES)}.")
+    return ENGINES[name]()
+
+@instrumented
+def run_engine(engine, datasets, float_dtype=None):
+    """
+    Load, clean, merge and aggregate the datasets with engine (a name or an
+    engine object). Polars plans every step before any of it runs.
+
+    Returns the cleaned DataFrames, in dataset order, and the merged
+    DataFrame, all in pandas with the schema's storage dtypes.
+    """
+    if isinstance(engine, str):
+        engine = get_engine(engine)
+    cleaned = [engine.clean(engine.scan(spec, float_dtype), spec) for spec in datasets]
+    merged = engine.aggregate(engine.merge(cleaned))
+    frames = engine.collect(cleaned + [merged], float_dtype)
+    return frames[:-1], frames[-1]
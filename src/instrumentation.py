@@ -0,0 +1,172 @@
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import pandas as pd
+
+# Environment variables that switch instrumentation on: the output file and its
+# format. They are read at import, so worker processes pick up the setting too.
+TRACE_ENV = 'PIPELINE_TRACE'
+TRACE_FORMAT_ENV = 'PIPELINE_TRACE_FORMAT'
+
+# 'json': one JSON record per line. 'trace': Chrome trace events, viewable in
+# chrome://tracing or Perfetto.
+TRACE_FORMATS = ['json', 'trace']
+
+_enabled = False
+_output_path = None
+_trace_format = 'json'
+_records = []
+_lock = threading.Lock()
+_local = threading.local()
+
+def enable(output_path=None, trace_format='json'):
+    """
+    Start recording a span for every instrumented stage. Records are kept in
+    memory (see records) and, with an output_path, appended to that file as
+    each stage finishes, so stages run in worker processes are written too.
+    """
+    global _enabled, _output_path, _trace_format
+    if trace_format not in TRACE_FORMATS:
+        raise ValueError(f"Unknown trace format '{trace_format}'. Expected one of {TRACE_FORMATS}.")
+    _output_path = output_path
+    _trace_format = trace_format
+    if output_path is not None:
+        # Hand the setting on to worker processes started from here
+        os.environ[TRACE_ENV] = output_path
+        os.environ[TRACE_FORMAT_ENV] = trace_format
+        if trace_format == 'trace' and not os.path.exists(output_path):
+            # The trace event array format allows the closing bracket to be left out
+            with open(output_path, 'w') as f:
+                f.write('[\n')
+    _enabled = True
+
+def disable():
+    """
+    Stop recording; instrumented stages run with no bookkeeping at all.
+    """
+    global _enabled, _output_path
+    _enabled = False
+    _output_path = None
+    os.environ.pop(TRACE_ENV, None)
+    os.environ.pop(TRACE_FORMAT_ENV, None)
+
+def is_enabled():
+    return _enabled
+
+def records():
+    """
+    Return the stage records made by this process so far.
+    """
+    with _lock:
+        return list(_records)
+
+def clear():
+    """
+    Forget the stage records kept in memory.
+    """
+    with _lock:
+        _records.clear()
+
+def current_rss():
+    """
+    Resident set size of this process in bytes (the peak RSS where the
+    current value is not available).
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+def frame_rows(value):
+    """
+    Number of rows in a DataFrame, or in the first DataFrame of a tuple result.
+    """
+    if isinstance(value, pd.DataFrame):
+        return len(value)
+    if isinstance(value, tuple):
+        for item in value:
+            if isinstance(item, pd.DataFrame):
+                return len(item)
+    return None
+
+def record_dropped(step, rows):
+    """
+    Count rows dropped by a cleaning step (e.g. 'dropna') in the stage being
+    recorded. Does nothing when instrumentation is disabled.
+    """
+    if not _enabled:
+        return
+    stack = getattr(_local, 'stack', None)
+    if stack:
+        dropped = stack[-1]['dropped']
+        dropped[step] = dropped.get(step, 0) + int(rows)
+
+def write_record(record):
+    line = record
+    if _trace_format == 'trace':
+        line = {
+            'name': record['stage'], 'cat': 'pipeline', 'ph': 'X',
+            'ts': record['start'] * 1e6, 'dur': record['seconds'] * 1e6,
+            'pid': record['pid'], 'tid': record['thread'],
+            'args': {key: record[key] for key in ['rows_in', 'rows_out', 'dropped', 'memory_delta_mb', 'parent']},
+        }
+    with open(_output_path, 'a') as f:
+        f.write(json.dumps(line) + (',\n' if _trace_format == 'trace' else '\n'))
+
+def instrumented(function=None, stage=None):
+    """
+    Decorator recording a stage span for each call when instrumentation is
+    enabled: duration, rows in (DataFrame arguments) and out (DataFrame
+    result), rows dropped by cleaning steps and the change in RSS. stage
+    defaults to the function name. When disabled the call goes straight
+    through.
+    """
+    if function is None:
+        return functools.partial(instrumented, stage=stage)
+    name = stage or function.__name__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return function(*args, **kwargs)
+
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        frames = [arg for arg in args if isinstance(arg, pd.DataFrame)]
+        record = {
+            'stage': name,
+            'parent': stack[-1]['stage'] if stack else None,
+            'pid': os.getpid(),
+            'thread': threading.get_ident(),
+            'start': time.time(),
+            'rows_in': sum(map(len, frames)) if frames else None,
+            'dropped': {},
+        }
+        stack.append(record)
+        rss_before = current_rss()
+        start = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            record['memory_delta_mb'] = (current_rss() - rss_before) / 2**20
+            stack.pop()
+        record['rows_out'] = frame_rows(result)
+
+        with _lock:
+            _records.append(record)
+            if _output_path is not None:
+                write_record(record)
+        return result
+
+    return wrapper
+
+if os.environ.get(TRACE_ENV):
+    enable(os.environ[TRACE_ENV], os.environ.get(TRACE_FORMAT_ENV, 'json'))
@@ -0,0 +1,157 @@
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from src.data_processing import (DATASETS, MANIFEST_PATH, MERGED_DATA_PATH, REGIONS_PATH, load_regions, process_data,
+                                 save_cleaned_data)
+from src.instrumentation import instrumented
+
+# A pipeline step: function(results, options) returns the stage's result, where
+# results holds the results of the stages it depends on. Stages that draw with
+# pyplot are never run at the same time, since pyplot's state is shared.
+Stage = namedtuple('Stage', ['name', 'function', 'depends_on', 'uses_pyplot'])
+
+# Columns the analysis stages summarise and correlate
+ANALYSIS_COLUMNS = ['aggregated_infant_mortality', 'aggregated_life_expectancy']
+
+SUMMARY_CAPTION = "Table 1: Summary Statistics for Aggregated Infant Mortality and Life Expectancy."
+
+# Default options for run_pipeline. Paths are relative to the repository root;
+# the cleaned datasets, merged data and manifest go to processed_dir unless given
+DEFAULT_OPTIONS = {
+    'persist': False,
+    'datasets': None,
+    'merged_data_path': None,
+    'manifest_path': None,
+    'regions_path': REGIONS_PATH,
+    'processed_dir': './data/processed',
+    'figures_dir': './figures',
+    'process_workers': None,
+    'engine': 'pandas',
+    'figure_workers': None,
+}
+
+def process_stage(results, options):
+    """
+    Load, clean and merge the datasets, keeping the merged data in memory.
+    """
+    processed_dir = options['processed_dir']
+    datasets = options['datasets']
+    if datasets is None:
+        datasets = [dict(spec, cleaned_path=os.path.join(processed_dir, os.path.basename(spec['cleaned_path'])))
+                    for spec in DATASETS]
+    merged_data_path = options['merged_data_path'] or os.path.join(processed_dir, os.path.basename(MERGED_DATA_PATH))
+    manifest_path = options['manifest_path'] or os.path.join(processed_dir, os.path.basename(MANIFEST_PATH))
+    return process_data(datasets, merged_data_path=merged_data_path, manifest_path=manifest_path,
+                        workers=options['process_workers'], persist=options['persist'], engine=options['engine'])
+
+def summary_stage(results, options):
+    """
+    Summary statistics of the merged data, saved as a PDF table when persisting.
+    """
+    from src.analysis import save_summary_to_pdf, summary_statistics
+
+    summary = summary_statistics(results['process'], ANALYSIS_COLUMNS)
+    if options['persist']:
+        save_summary_to_pdf(summary, os.path.join(options['processed_dir'], 'summary_statistics.pdf'), SUMMARY_CAPTION)
+        save_cleaned_data(summary.reset_index(names='column'), os.path.join(options['processed_dir'], 'summary_statistics.csv'))
+    return summary
+
+def correlation_stage(results, options):
+    """
+    Correlation between infant mortality and life expectancy with its hypothesis test.
+    """
+    from src.analysis import correlation_analysis_with_test
+
+    return correlation_analysis_with_test(results['process'], *ANALYSIS_COLUMNS)
+
+def cube_stage(results, options):
+    """
+    Aggregate cube of the merged data per year, entity and (region, year),
+    saved as aggregate_cube.csv when persisting.
+    """
+    from src.cube import build_cube
+
+    cube = build_cube(results['process'], load_regions(options['regions_path']))
+    if options['persist']:
+        cube.save(os.path.join(options['processed_dir'], 'aggregate_cube.csv'))
+    return cube
+
+def figures_stage(results, options):
+    """
+    Render every figure from the in-memory merged data and aggregate cube.
+    """
+    from src.visulisations import render_figures
+
+    return render_figures(results['process'], figures_dir=options['figures_dir'], workers=options['figure_workers'],
+                          cube=results['cube'])
+
+# processing -> analysis -> visualisation, as a dependency graph
+PIPELINE = [
+    Stage('process', process_stage, [], False),
+    Stage('summary', summary_stage, ['process'], True),
+    Stage('correlation', correlation_stage, ['process'], False),
+    Stage('cube', cube_stage, ['process'], False),
+    Stage('figures', figures_stage, ['process', 'cube'], True),
+]
+
+def check_graph(stages):
+    """
+    Check that stage names are unique and every dependency is a known stage
+    listed earlier, which also rules out cycles.
+    """
+    seen = set()
+    for stage in stages:
+        if stage.name in seen:
+            raise ValueError(f"Duplicate stage '{stage.name}'.")
+        missing = [name for name in stage.depends_on if name not in seen]
+        if missing:
+            raise ValueError(f"Stage '{stage.name}' depends on {missing}, which must be listed before it.")
+        seen.add(stage.name)
+
+def run_pipeline(stages=None, workers=4, **options):
+    """
+    Run the pipeline stages in dependency order, passing each stage's result
+    (e.g. the merged DataFrame) to the stages that depend on it in memory.
+
+    Stages whose dependencies have finished run concurrently on up to workers
+    threads. Intermediate data is only written to disk with persist=True; see
+    DEFAULT_OPTIONS for the other options. Returns every stage's result by name.
+    """
+    if stages is None:
+        stages = PIPELINE
+    unknown = set(options) - set(DEFAULT_OPTIONS)
+    if unknown:
+        raise TypeError(f"Unknown pipeline options: {sorted(unknown)}")
+    options = {**DEFAULT_OPTIONS, **options}
+    check_graph(stages)
+
+    pyplot_lock = threading.Lock()
+
+    def run_stage(stage):
+        inputs = {name: results[name] for name in stage.depends_on}
+        function = instrumented(stage.function, stage=f'pipeline:{stage.name}')
+        if stage.uses_pyplot:
+            with pyplot_lock:
+                return function(inputs, options)
+        return function(inputs, options)
+
+    results = {}
+    pending = list(stages)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        while pending or running:
+            # Start every stage whose dependencies have finished
+            for stage in [stage for stage in pending if all(name in results for name in stage.depends_on)]:
+                pending.remove(stage)
+                running[pool.submit(run_stage, stage)] = stage
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                results[stage.name] = future.result()
+
+    return results
+
+if __name__ == '__main__':
+    run_pipeline(persist=True)
@@ -0,0 +1,87 @@
+import hashlib
+from collections import OrderedDict, namedtuple
+import numpy as np
+
+# Closed-form ordinary least squares fit of y = intercept + slope * x
+RegressionFit = namedtuple('RegressionFit', [
+    'n', 'slope', 'intercept', 'slope_se', 'intercept_se', 'r_squared',
+    'residual_std', 'x_mean', 'sxx', 't_critical',
+])
+
+# Number of fits kept by regression_fit, least recently used evicted first
+CACHE_SIZE = 128
+
+_fit_cache = OrderedDict()
+
+def fit_linear_regression(x, y, confidence=0.95):
+    """
+    Fit y on x by ordinary least squares in closed form, ignoring pairs with a
+    missing value. The fit stores what is needed for analytic confidence and
+    prediction bands at the given confidence level.
+    """
+    from scipy.stats import t as t_distribution
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    present = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[present], y[present]
+    n = len(x)
+    if n < 3:
+        raise ValueError(f"At least 3 complete (x, y) pairs are needed for a regression, got {n}.")
+
+    x_mean, y_mean = x.mean(), y.mean()
+    dx, dy = x - x_mean, y - y_mean
+    sxx, sxy, syy = dx @ dx, dx @ dy, dy @ dy
+    slope = sxy / sxx
+    intercept = y_mean - slope * x_mean
+
+    residual_ss = max(syy - slope * sxy, 0.0)
+    residual_std = np.sqrt(residual_ss / (n - 2))
+    slope_se = residual_std / np.sqrt(sxx)
+    intercept_se = residual_std * np.sqrt(1.0 / n + x_mean ** 2 / sxx)
+    r_squared = 1.0 - residual_ss / syy if syy > 0 else np.nan
+    t_critical = t_distribution.ppf(0.5 + confidence / 2, n - 2)
+
+    return RegressionFit(n, slope, intercept, slope_se, intercept_se, r_squared,
+                         residual_std, x_mean, sxx, t_critical)
+
+def regression_fit(df, x_column, y_column, confidence=0.95):
+    """
+    Fit y_column on x_column, reusing the cached fit when the same data has
+    already been fitted (e.g. by a plot and by the analysis).
+    """
+    x = df[x_column].to_numpy(dtype=float)
+    y = df[y_column].to_numpy(dtype=float)
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(x).tobytes())
+    digest.update(np.ascontiguousarray(y).tobytes())
+    key = (digest.hexdigest(), confidence)
+
+    if key in _fit_cache:
+        _fit_cache.move_to_end(key)
+        return _fit_cache[key]
+
+    fit = fit_linear_regression(x, y, confidence)
+    _fit_cache[key] = fit
+    if len(_fit_cache) > CACHE_SIZE:
+        _fit_cache.popitem(last=False)
+    return fit
+
+def clear_regression_cache():
+    """
+    Drop every cached fit.
+    """
+    _fit_cache.clear()
+
+def regression_bands(fit, x):
+    """
+    Evaluate a fit at x. Returns the fitted line with its confidence band (for
+    the mean response) and prediction band (for a new observation) as
+    (line, ci_low, ci_high, pi_low, pi_high).
+    """
+    x = np.asarray(x, dtype=float)
+    line = fit.intercept + fit.slope * x
+    leverage = 1.0 / fit.n + (x - fit.x_mean) ** 2 / fit.sxx
+    ci = fit.t_critical * fit.residual_std * np.sqrt(leverage)
+    pi = fit.t_critical * fit.residual_std * np.sqrt(1.0 + leverage)
+    return line, line - ci, line + ci, line - pi, line + pi
@@ -0,0 +1,191 @@
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from src.analysis import grouped_trends
+from src.instrumentation import instrumented
+from src.schema import field
+from src.storage import atomic_output
+from src.visulisations import draw_points, load_merged_data, merged_data_path
+
+# Indicators summarised on every report page, in table order
+REPORT_COLUMNS = ['aggregated_life_expectancy', 'aggregated_infant_mortality', 'gdp_per_capita',
+                  'health_expenditure_per_capita']
+
+# Indicators drawn over time on the trend panel (left and right axis)
+TREND_PANEL = ['aggregated_life_expectancy', 'aggregated_infant_mortality']
+
+# Indicators on the scatter panel (x, y)
+SCATTER_PANEL = ['aggregated_infant_mortality', 'aggregated_life_expectancy']
+
+TABLE_HEADER = ['Years', 'Mean', 'Min', 'Max', 'Latest', 'Trend / year']
+
+# Entities (pages) written to each multi-page PDF
+PAGES_PER_FILE = 25
+
+# Default directory for the country reports
+REPORTS_DIR = './reports'
+
+class ReportTemplate:
+    """
+    One report page (a summary table, a trend panel and a scatter panel) that
+    is built once and then redrawn for each entity by updating the data of its
+    artists, instead of creating and closing a figure per entity.
+
+    The page is a bare matplotlib Figure, not a pyplot figure, so it is not
+    tracked by pyplot's global state and needs no closing.
+    """
+    def __init__(self, merged_df):
+        from matplotlib.figure import Figure
+
+        self.fig = Figure(figsize=(11.69, 8.27))
+        grid = self.fig.add_gridspec(2, 2, height_ratios=[1, 2], left=0.07, right=0.93, bottom=0.08, top=0.9,
+                                     hspace=0.3, wspace=0.3)
+        self.title = self.fig.suptitle('', fontsize=16)
+
+        # Summary table, one row per indicator
+        table_ax = self.fig.add_subplot(grid[0, :])
+        table_ax.axis('off')
+        self.table = table_ax.table(cellText=[[''] * len(TABLE_HEADER) for _ in REPORT_COLUMNS],
+                                    colLabels=TABLE_HEADER,
+                                    rowLabels=[field(column).label for column in REPORT_COLUMNS],
+                                    cellLoc='center', loc='center')
+        self.table.auto_set_font_size(False)
+        self.table.set_fontsize(10)
+        self.table.scale(1.0, 1.4)
+
+        # Trend panel: values over time with their fitted trend lines
+        left_ax = self.fig.add_subplot(grid[1, 0])
+        right_ax = left_ax.twinx()
+        self.trend_axes = [left_ax, right_ax]
+        self.values_lines = []
+        self.trend_lines = []
+        for ax, column, color in zip(self.trend_axes, TREND_PANEL, ['C0', 'C3']):
+            self.values_lines.append(ax.plot([], [], color=color, marker='o', markersize=3, label=field(column).label)[0])
+            self.trend_lines.append(ax.plot([], [], color=color, linestyle='--', linewidth=1)[0])
+            ax.set_ylabel(field(column).label, color=color)
+        left_ax.set_xlabel('Year')
+        left_ax.set_title('Trends')
+
+        # Scatter panel: every entity in grey, drawn once, with this entity on top
+        self.scatter_ax = self.fig.add_subplot(grid[1, 1])
+        x_column, y_column = SCATTER_PANEL
+        draw_points(merged_df[x_column], merged_df[y_column], ax=self.scatter_ax, color='0.8', s=8)
+        self.highlight = self.scatter_ax.scatter([], [], color='C1', s=20, zorder=3)
+        self.scatter_ax.set_xlabel(field(x_column).label)
+        self.scatter_ax.set_ylabel(field(y_column).label)
+        self.scatter_ax.set_title(f"{field(y_column).label} vs {field(x_column).label}")
+
+    def update(self, entity, rows, trends):
+        """
+        Redraw the page for one entity from its rows (sorted by year) and its
+        trends (grouped_trends rows indexed by indicator).
+        """
+        self.title.set_text(f"Country Report: {entity}")
+        years = rows['year'].to_numpy(dtype=float)
+
+        for row, column in enumerate(REPORT_COLUMNS, start=1):
+            values = rows[column].to_numpy(dtype=float)
+            present = np.isfinite(values)
+            slope = trends['slope'].get(column, np.nan)
+            if present.any():
+                cells = [str(int(present.sum())), f"{values[present].mean():.2f}", f"{values[present].min():.2f}",
+                         f"{values[present].max():.2f}", f"{values[present][-1]:.2f}",
+                         f"{slope:+.3f}" if np.isfinite(slope) else '-']
+            else:
+                cells = ['0'] + ['-'] * (len(TABLE_HEADER) - 1)
+            for col, text in enumerate(cells):
+                self.table[row, col].get_text().set_text(text)
+
+        for ax, values_line, trend_line, column in zip(self.trend_axes, self.values_lines, self.trend_lines,
+                                                       TREND_PANEL):
+            values_line.set_data(years, rows[column].to_numpy(dtype=float))
+            slope = trends['slope'].get(column, np.nan)
+            intercept = trends['intercept'].get(column, np.nan)
+            ends = np.array([years.min(), years.max()]) if len(years) else np.empty(0)
+            trend_line.set_data(ends, intercept + slope * ends)
+            ax.relim()
+            ax.autoscale_view()
+
+        x_column, y_column = SCATTER_PANEL
+        self.highlight.set_offsets(np.column_stack([rows[x_column].to_numpy(dtype=float),
+                                                    rows[y_column].to_numpy(dtype=float)]))
+
+def write_reports(template, merged_df, trends, entities, output_path):
+    """
+    Stream one page per entity into a multi-page PDF. The PDF is written to a
+    temporary file and moved into place, so readers never see a partial report.
+    """
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    positions = merged_df.groupby('entity', observed=True, sort=False).indices
+    with atomic_output(output_path) as tmp_path, PdfPages(tmp_path) as pdf:
+        for entity in entities:
+            rows = merged_df.iloc[positions.get(entity, [])].sort_values('year')
+            entity_trends = trends.loc[entity] if entity in trends.index else trends.iloc[:0].droplevel(0)
+            template.update(entity, rows, entity_trends)
+            pdf.savefig(template.fig)
+    return output_path
+
+# Data and page template of a report worker process, set when it starts
+_worker_df = None
+_worker_trends = None
+_worker_template = None
+
+def _init_worker(merged_df, trends):
+    global _worker_df, _worker_trends, _worker_template
+    _worker_df = merged_df
+    _worker_trends = trends
+    _worker_template = None
+
+def _write_reports(entities, output_path):
+    # Each worker builds its page template once and reuses it for every batch
+    global _worker_template
+    if _worker_template is None:
+        _worker_template = ReportTemplate(_worker_df)
+    return write_reports(_worker_template, _worker_df, _worker_trends, entities, output_path)
+
+@instrumented
+def render_country_reports(merged_df, reports_dir=None, entities=None, workers=None, pages_per_file=PAGES_PER_FILE):
+    """
+    Write a one-page report (summary table, trend and scatter panels) for each
+    entity, pages_per_file entities per multi-page PDF in reports_dir.
+
+    Every entity's trends are fitted at once up front. With workers > 1 the
+    PDFs are written in a process pool; the merged data and trends are handed
+    to each worker when it starts. Report files left in reports_dir by an
+    earlier run with more entities are removed. Returns the index of reports
+    (entity, file and page number), also saved as report_index.csv in reports_dir.
+    """
+    if reports_dir is None:
+        reports_dir = REPORTS_DIR
+    if entities is None:
+        entities = sorted(merged_df['entity'].astype(str).unique())
+    os.makedirs(reports_dir, exist_ok=True)
+
+    trends = grouped_trends(merged_df, REPORT_COLUMNS).set_index(['entity', 'indicator'])
+    batches = [entities[start:start + pages_per_file] for start in range(0, len(entities), pages_per_file)]
+    paths = [os.path.join(reports_dir, f'country_reports_{number:03d}.pdf') for number in range(1, len(batches) + 1)]
+
+    if workers is not None and workers > 1 and len(batches) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(merged_df, trends)) as pool:
+            list(pool.map(_write_reports, batches, paths))
+    else:
+        template = ReportTemplate(merged_df)
+        for batch, path in zip(batches, paths):
+            write_reports(template, merged_df, trends, batch, path)
+
+    index = pd.DataFrame([(entity, os.path.basename(path), page)
+                          for batch, path in zip(batches, paths)
+                          for page, entity in enumerate(batch, start=1)],
+                         columns=['entity', 'file', 'page'])
+    index.to_csv(os.path.join(reports_dir, 'report_index.csv'), index=False)
+
+    # Remove the reports of an earlier run that no entity is in any more
+    for stale in set(glob.glob(os.path.join(reports_dir, 'country_reports_*.pdf'))) - set(paths):
+        os.remove(stale)
+    return index
+
+if __name__ == '__main__':
+    render_country_reports(load_merged_data(merged_data_path), workers=os.cpu_count())
@@ -0,0 +1,106 @@
+from collections import namedtuple
+import numpy as np
+
+# A column of the processed data: its compact name, the normalized raw column
+# it is read from (None for derived fields), its storage dtype and a label
+Field = namedtuple('Field', ['name', 'source', 'dtype', 'label'])
+
+# A field computed from others as the mean of its components
+DerivedField = namedtuple('DerivedField', ['name', 'components', 'dtype', 'label'])
+
+# Every source indicator round-trips exactly through float32 at its published
+# precision (at most 9 significant digits, mostly far fewer), so indicators are
+# stored as float32
+FIELDS = [
+    Field('entity', 'entity', 'category', 'Entity'),
+    Field('year', 'year', 'int16', 'Year'),
+    Field('infant_mortality_female',
+          'observation_value_-_indicator:_infant_mortality_rate_-_sex:_female_-_wealth_quintile:_total_-_unit_of_measure:_deaths_per_100_live_births',
+          'float32', 'Female Infant Mortality'),
+    Field('infant_mortality_male',
+          'observation_value_-_indicator:_infant_mortality_rate_-_sex:_male_-_wealth_quintile:_total_-_unit_of_measure:_deaths_per_100_live_births',
+          'float32', 'Male Infant Mortality'),
+    Field('life_expectancy_female', 'period_life_expectancy_-_sex:_female_-_age:_0', 'float32', 'Female Life Expectancy'),
+    Field('life_expectancy_male', 'period_life_expectancy_-_sex:_male_-_age:_0', 'float32', 'Male Life Expectancy'),
+    Field('gdp_per_capita', 'gdp_per_capita', 'float32', 'GDP per Capita'),
+    Field('health_expenditure_per_capita', 'health_expenditure_per_capita_-_total', 'float32', 'Health Expenditure per Capita'),
+    Field('region', 'world_regions_according_to_owid', 'category', 'World Region'),
+]
+
+# Means of published values have more digits than float32 holds, so derived
+# fields are computed and stored as float64
+DERIVED_FIELDS = [
+    DerivedField('aggregated_infant_mortality', ['infant_mortality_female', 'infant_mortality_male'], 'float64',
+                 'Aggregated Infant Mortality'),
+    DerivedField('aggregated_life_expectancy', ['life_expectancy_female', 'life_expectancy_male'], 'float64',
+                 'Aggregated Life Expectancy'),
+]
+
+_fields = {field.name: field for field in FIELDS + DERIVED_FIELDS}
+_source_names = {field.source: field.name for field in FIELDS}
+
+def field(name):
+    """
+    Look up a field (source or derived) by its compact name.
+    """
+    if name not in _fields:
+        raise KeyError(f"Unknown field '{name}'.")
+    return _fields[name]
+
+def canonical_name(column):
+    """
+    Compact name of a normalized raw column, or the column itself if it is
+    not registered.
+    """
+    return _source_names.get(column, column)
+
+def storage_dtypes(columns, float_dtype=None):
+    """
+    Declared storage dtypes of the registered columns among columns. A
+    float_dtype overrides the dtype of every floating point field.
+    """
+    dtypes = {}
+    for column in columns:
+        if column in _fields:
+            dtype = _fields[column].dtype
+            dtypes[column] = float_dtype if float_dtype is not None and dtype.startswith('float') else dtype
+    return dtypes
+
+def published_values(values):
+    """
+    float64 copy of float32 values as published: the shortest decimal that
+    rounds to each float32 (e.g. 75.521 rather than 75.52099609375), which is
+    the float64 the source value parses to. Other dtypes are cast to float64.
+    """
+    values = np.asarray(values)
+    result = values.astype(np.float64)
+    if values.dtype != np.float32:
+        return result
+
+    # Round to 1, 2, ... significant digits until the float32 is reproduced,
+    # while the power of ten scaling each value is exact in float64
+    with np.errstate(divide='ignore', invalid='ignore'):
+        exponent = np.floor(np.log10(np.abs(result)))
+    pending = np.isfinite(exponent)
+    fallback = np.zeros(len(result), dtype=bool)
+    for digits in range(1, 10):
+        positions = np.flatnonzero(pending)
+        if not len(positions):
+            break
+        shift = digits - 1 - exponent[positions]
+        exact = np.abs(shift) <= 22
+        fallback[positions[~exact]] = True
+        pending[positions[~exact]] = False
+        positions, shift = positions[exact], shift[exact]
+        scale = 10.0 ** np.abs(shift)
+        candidate = np.where(shift >= 0, np.round(result[positions] * scale) / scale,
+                             np.round(result[positions] / scale) * scale)
+        found = candidate.astype(np.float32) == values[positions]
+        result[positions[found]] = candidate[found]
+        pending[positions[found]] = False
+
+    # Values out of that range go through their shortest decimal string
+    fallback |= pending
+    if fallback.any():
+        result[fallback] = values[fallback].astype(str).astype(np.float64)
+    return result
@@ -0,0 +1,243 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from src.data_processing import MERGED_DATA_PATH, REGIONS_PATH, load_data, load_regions
+from src.schema import storage_dtypes
+from src.storage import frame_columns
+
+# Results kept by the query cache
+CACHE_SIZE = 1024
+
+# Default address of the query service (local connections only)
+HOST = '127.0.0.1'
+PORT = 8050
+
+class LRUCache:
+    """
+    Bounded, thread-safe cache that evicts the least recently used entry once
+    it holds maxsize entries.
+    """
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        return {'size': len(self.entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+def file_version(file_path):
+    """
+    Cheap fingerprint of a file that changes whenever it is rewritten.
+    """
+    stat = os.stat(file_path)
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+def filter_values(params, name):
+    """
+    Values of a query parameter, given repeated or comma separated.
+    """
+    return [value for values in params.get(name, []) for value in values.split(',') if value]
+
+class QueryStore:
+    """
+    The merged data held in memory, indexed by (entity, year), with the results
+    of repeated queries kept in an LRU cache.
+
+    The merged data file is checked before every query and reloaded when it has
+    been rebuilt (e.g. by process_data), which also empties the cache.
+    """
+    def __init__(self, merged_data_path=MERGED_DATA_PATH, regions_path=REGIONS_PATH, cache_size=CACHE_SIZE):
+        self.merged_data_path = merged_data_path
+        self.regions_path = regions_path
+        self.cache = LRUCache(cache_size)
+        self.version = None
+        self.reloads = 0
+        self.lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        """
+        Reload the merged data if its file changed since it was loaded.
+        """
+        version = file_version(self.merged_data_path)
+        if version == self.version:
+            return False
+        with self.lock:
+            if version == self.version:
+                return False
+            df = load_data(self.merged_data_path, dtype=storage_dtypes(frame_columns(self.merged_data_path)))
+            if self.regions_path is not None:
+                regions = load_regions(self.regions_path)
+                df['region'] = df['entity'].map(regions).astype('category')
+            self.df = df.set_index(['entity', 'year']).sort_index()
+            self.columns = [column for column in self.df.columns if column != 'region']
+            self.version = version
+            self.reloads += 1
+            self.cache.clear()
+        return True
+
+    def select(self, params):
+        """
+        Rows matching the entity, region and start/end year filters in params.
+        """
+        df = self.df
+        entities = filter_values(params, 'entity')
+        start = int(params['start'][0]) if 'start' in params else None
+        end = int(params['end'][0]) if 'end' in params else None
+        if entities:
+            unknown = [entity for entity in entities if entity not in df.index.levels[0]]
+            if unknown:
+                raise KeyError(f"Unknown entities: {unknown}")
+            df = df.loc[(entities, slice(start, end)), :]
+        elif start is not None or end is not None:
+            df = df.loc[(slice(None), slice(start, end)), :]
+        regions = filter_values(params, 'region')
+        if regions:
+            if 'region' not in df.columns:
+                raise KeyError("Region filters need the regions file.")
+            df = df[df['region'].isin(regions)]
+        return df
+
+    def requested_columns(self, params):
+        columns = filter_values(params, 'columns') or self.columns
+        unknown = [column for column in columns if column not in self.columns]
+        if unknown:
+            raise KeyError(f"Unknown columns: {unknown}")
+        return columns
+
+    def rows(self, params):
+        """
+        The filtered rows, as records with their entity and year.
+        """
+        df = self.select(params)[self.requested_columns(params)].reset_index()
+        return {'rows': json.loads(df.to_json(orient='records'))}
+
+    def summary(self, params):
+        """
+        summary_statistics of the filtered rows, per column.
+        """
+        from src.analysis import summary_statistics
+
+        columns = self.requested_columns(params)
+        summary = summary_statistics(self.select(params), columns)
+        return {'summary': json.loads(summary.to_json(orient='index'))}
+
+    def correlation(self, params):
+        """
+        correlation_analysis_with_test between columns x and y of the filtered rows.
+        """
+        from src.analysis import correlation_analysis_with_test
+
+        axes = {axis: filter_values(params, axis) for axis in ['x', 'y']}
+        if any(len(columns) != 1 for columns in axes.values()):
+            raise ValueError(f"Correlation needs exactly one x and one y column, got {axes}.")
+        x, y = self.requested_columns({'columns': axes['x'] + axes['y']})
+        df = self.select(params)[[x, y]].dropna()
+        if len(df) < 3:
+            raise ValueError("Correlation needs at least three rows with both values.")
+        correlation, p_value, result = correlation_analysis_with_test(df, x, y)
+        return {'x': x, 'y': y, 'n': len(df), 'correlation': float(correlation), 'p_value': float(p_value),
+                'result': result}
+
+    def entities(self, params):
+        return {'entities': self.df.index.levels[0].astype(str).tolist()}
+
+    def health(self, params):
+        return {'rows': len(self.df), 'reloads': self.reloads, 'cache': self.cache.stats()}
+
+    # Query paths and the methods answering them; health is never cached
+    QUERIES = {
+        '/rows': 'rows',
+        '/summary': 'summary',
+        '/correlation': 'correlation',
+        '/entities': 'entities',
+    }
+
+    def query(self, path, params):
+        """
+        Answer a query as a JSON encoded body, from the cache when the same
+        query was answered since the data was last loaded.
+        """
+        self.refresh()
+        if path == '/health':
+            return json.dumps(self.health(params)).encode()
+        if path not in self.QUERIES:
+            raise LookupError(f"Unknown query '{path}'. Expected one of {sorted(self.QUERIES) + ['/health']}.")
+        # Keyed by data version too, so a result computed during a reload is never served afterwards
+        key = (self.version, path, tuple(sorted((name, tuple(values)) for name, values in params.items())))
+        body = self.cache.get(key)
+        if body is None:
+            body = json.dumps(getattr(self, self.QUERIES[path])(params)).encode()
+            self.cache.put(key, body)
+        return body
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    Answers GET requests such as /rows?entity=Japan&start=2000&end=2010 from
+    the server's QueryStore as JSON.
+    """
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; don't hold the body back on keep-alive connections
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        try:
+            status, body = 200, self.server.store.query(url.path, parse_qs(url.query))
+        except LookupError as e:
+            # KeyError (unknown entity or column) is a bad request; other lookups an unknown path
+            status = 400 if isinstance(e, KeyError) else 404
+            body = json.dumps({'error': e.args[0] if e.args else str(e)}).encode()
+        except ValueError as e:
+            status, body = 400, json.dumps({'error': str(e)}).encode()
+        except Exception as e:
+            # Any other failure is the server's; answer it rather than dropping the connection
+            status, body = 500, json.dumps({'error': f"{type(e).__name__}: {e}"}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def make_server(store=None, host=HOST, port=PORT):
+    """
+    Create (but do not start) a threaded HTTP server answering queries from
+    store, by default the merged data at MERGED_DATA_PATH. Port 0 picks a free port.
+    """
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    server.daemon_threads = True
+    server.store = store if store is not None else QueryStore()
+    return server
+
+if __name__ == '__main__':
+    server = make_server()
+    print(f"Serving queries on http://{server.server_address[0]}:{server.server_address[1]}")
+    server.serve_forever()
@@ -0,0 +1,197 @@
+import os
+import tempfile
+from contextlib import contextmanager
+import pandas as pd
+
+# File extensions and the storage format they are read and written with
+FORMATS = {
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.feather': 'feather',
+    '.arrow': 'feather',
+}
+
+# Default file extension for each storage format
+EXTENSIONS = {
+    'csv': '.csv',
+    'parquet': '.parquet',
+    'feather': '.feather',
+}
+
+def storage_format(file_path):
+    """
+    Return the storage format implied by a file's extension.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unsupported file extension '{extension}' for {file_path}. Expected one of {sorted(FORMATS)}.")
+    return FORMATS[extension]
+
+def with_format(file_path, fmt):
+    """
+    Return file_path with its extension replaced by the one for the given format.
+    """
+    if fmt not in EXTENSIONS:
+        raise ValueError(f"Unsupported storage format '{fmt}'. Expected one of {sorted(EXTENSIONS)}.")
+    return os.path.splitext(file_path)[0] + EXTENSIONS[fmt]
+
+def new_file_mode():
+    """
+    Permissions a newly created file gets under the process umask.
+    """
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+@contextmanager
+def atomic_output(file_path):
+    """
+    Yield a temporary path in file_path's directory, with the same extension,
+    and move it over file_path once the block completes, so readers never see
+    a partially written file. The file gets the permissions of a normally
+    created one (mkstemp files are private); on error it is removed.
+    """
+    directory = os.path.dirname(file_path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    name, extension = os.path.splitext(os.path.basename(file_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{name}.', suffix=f'.tmp{extension}')
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.chmod(tmp_path, new_file_mode())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _require_pyarrow():
+    """
+    Import pyarrow, which backs the Parquet and Feather formats.
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError("Parquet and Feather storage require pyarrow: pip install pyarrow") from e
+
+def frame_columns(file_path):
+    """
+    Return the column names stored in a file without reading its rows.
+    """
+    fmt = storage_format(file_path)
+    if fmt == 'csv':
+        return pd.read_csv(file_path, nrows=0).columns.tolist()
+
+    _require_pyarrow()
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_schema(file_path).names
+
+    import pyarrow.ipc as ipc
+    with ipc.open_file(file_path) as reader:
+        return reader.schema.names
+
+def read_frame(file_path, columns=None, memory_map=True, dtype=None):
+    """
+    Read a DataFrame from CSV, Parquet or Feather, optionally loading only some columns.
+
+    Binary formats are memory-mapped rather than read into a buffer first.
+    dtype maps column names to the dtype they are stored with in memory; CSV
+    columns are parsed straight into it.
+    """
+    fmt = storage_format(file_path)
+    if fmt == 'csv':
+        return pd.read_csv(file_path, usecols=columns, dtype=dtype)
+
+    _require_pyarrow()
+    if fmt == 'parquet':
+        df = pd.read_parquet(file_path, columns=columns, engine='pyarrow', memory_map=memory_map)
+    else:
+        import pyarrow.feather as feather
+        table = feather.read_table(file_path, columns=columns, memory_map=memory_map)
+        df = table.to_pandas()
+
+    if dtype:
+        df = df.astype(dtype)
+    return df
+
+def write_frame(df, file_path, compression=None):
+    """
+    Write a DataFrame to CSV, Parquet or Feather based on the file extension.
+
+    compression is passed to the writer, e.g. 'zstd' or 'snappy' for Parquet and
+    'zstd' or 'lz4' for Feather. Uncompressed Feather files can be read back
+    without copying.
+    """
+    fmt = storage_format(file_path)
+    if fmt == 'csv':
+        df.to_csv(file_path, index=False, compression=compression)
+        return
+
+    _require_pyarrow()
+    if fmt == 'parquet':
+        df.to_parquet(file_path, index=False, engine='pyarrow', compression=compression)
+    else:
+        df.reset_index(drop=True).to_feather(file_path, compression=compression or 'uncompressed')
+
+class ChunkWriter:
+    """
+    Write a DataFrame to CSV, Parquet or Feather one chunk at a time, so the
+    full table never has to be held in memory.
+    """
+    def __init__(self, file_path, compression=None):
+        self.file_path = file_path
+        self.compression = compression
+        self.fmt = storage_format(file_path)
+        self.rows_written = 0
+        self._handle = None
+        self._writer = None
+        if self.fmt == 'csv':
+            if compression is not None:
+                raise ValueError("Compressed CSV output cannot be written in chunks; use Parquet or Feather.")
+            self._handle = open(file_path, 'w', newline='')
+        else:
+            _require_pyarrow()
+
+    def write(self, df):
+        """
+        Append a chunk to the output file.
+        """
+        if self.fmt == 'csv':
+            df.to_csv(self._handle, index=False, header=self._handle.tell() == 0)
+        else:
+            import pyarrow as pa
+            # Categories differ between chunks, so store their values instead
+            categorical = {column: df[column].cat.categories.dtype for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)}
+            table = pa.Table.from_pandas(df.astype(categorical), preserve_index=False)
+            if self._writer is None:
+                self._writer = self._open_writer(table.schema)
+            self._writer.write_table(table)
+        self.rows_written += len(df)
+
+    def _open_writer(self, schema):
+        """
+        Open the Parquet or Feather (Arrow IPC) writer for the first chunk's schema.
+        """
+        if self.fmt == 'parquet':
+            import pyarrow.parquet as pq
+            return pq.ParquetWriter(self.file_path, schema, compression=self.compression or 'snappy')
+
+        import pyarrow.ipc as ipc
+        options = ipc.IpcWriteOptions(compression=self.compression)
+        return ipc.new_file(self.file_path, schema, options=options)
+
+    def close(self):
+        """
+        Flush and close the output file.
+        """
+        if self._handle is not None:
+            self._handle.close()
+        if self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -1,43 +1,129 @@
 import os
-import pandas as pd
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import mean_squared_error
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
+from src.cache import ArtifactCache, cache_key
+from src.cube import AggregateCube
+from src.instrumentation import instrumented
+from src.regression import regression_bands, regression_fit
+from src.schema import field
+from src.storage import atomic_output, read_frame
 
 # Define the path to the merged data
 merged_data_path = './data/processed/merged_data.csv'
 
-# Define the output directory
-output_dir = '/Users/Tasmin/Final-Project/figures'
-if not os.path.exists(output_dir):
-    os.makedirs(output_dir)
+# Define the output directory, relative to the repository root (created when figures are saved)
+output_dir = './figures'
 
-def load_merged_data(file_path):
+def pyplot():
     """
-    Load the merged dataset from the specified path.
+    Import matplotlib's pyplot on the non-interactive Agg backend. Plotting
+    libraries are only loaded once a figure is drawn, so importing this
+    module stays cheap.
     """
-    return pd.read_csv(file_path)
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
 
-def plot_scatter_with_regression(merged_df):
+def load_merged_data(file_path, columns=None):
+    """
+    Load the merged dataset from the specified path (CSV, Parquet or Feather),
+    optionally only the listed columns.
+    """
+    return read_frame(file_path, columns=columns)
+
+def save_figure(output_path, fig=None):
+    """
+    Save the current (or given) figure as a PDF atomically: it is written to a
+    temporary file in the same directory and then moved into place, so readers
+    never see a partially written file.
+    """
+    fig = fig or pyplot().gcf()
+    with atomic_output(output_path) as tmp_path:
+        fig.savefig(tmp_path, format='pdf')
+
+# Above this many points scatter layers are drawn as a binned density image
+DENSITY_THRESHOLD = 50_000
+
+# Number of bins along each axis of the density image
+DENSITY_BINS = 200
+
+def draw_points(x, y, ax=None, color='C0', label=None, density=None, bins=DENSITY_BINS, **scatter_kws):
+    """
+    Draw a scatter layer. With density=True (or density=None and more than
+    DENSITY_THRESHOLD points) the points are binned into a 2D histogram with
+    NumPy and drawn as a single rasterized image shaded in color, so render
+    time and PDF size no longer grow with the number of points; axes and text
+    stay vector graphics.
+    """
+    ax = ax or pyplot().gca()
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if density is None:
+        density = len(x) > DENSITY_THRESHOLD
+    if not density:
+        return ax.scatter(x, y, color=color, label=label, **scatter_kws)
+
+    from matplotlib.colors import LinearSegmentedColormap, LogNorm
+
+    present = np.isfinite(x) & np.isfinite(y)
+    counts, x_edges, y_edges = np.histogram2d(x[present], y[present], bins=bins)
+    cmap = LinearSegmentedColormap.from_list('density', ['white', color])
+    mesh = ax.pcolormesh(x_edges, y_edges, np.ma.masked_equal(counts.T, 0), cmap=cmap,
+                         norm=LogNorm(vmin=1, vmax=max(counts.max(), 1)), rasterized=True)
+
+    # The density image has no legend entry of its own, so add a marker for it
+    if label is not None:
+        ax.scatter([], [], color=color, label=label)
+    return mesh
+
+def draw_regression(x, y, data, ax=None, scatter=True, color=None, label=None, scatter_kws=None, line_kws=None,
+                    density=None):
+    """
+    Draw a scatter plot with its closed-form regression line and 95% confidence
+    band, in place of seaborn's bootstrapped regplot. The fit comes from the
+    shared regression cache, so the same data is only fitted once. density is
+    passed to draw_points for the scatter layer.
+    """
+    ax = ax or pyplot().gca()
+    color = color or 'C0'
+    scatter_kws = dict(scatter_kws or {})
+    line_kws = dict(line_kws or {})
+
+    if scatter:
+        draw_points(data[x], data[y], ax=ax, color=scatter_kws.pop('color', color), density=density, **scatter_kws)
+
+    fit = regression_fit(data, x, y)
+    x_grid = np.linspace(data[x].min(), data[x].max(), 100)
+    line, ci_low, ci_high, _, _ = regression_bands(fit, x_grid)
+    line_color = line_kws.pop('color', color)
+    ax.plot(x_grid, line, color=line_color, label=label, **line_kws)
+    ax.fill_between(x_grid, ci_low, ci_high, color=line_color, alpha=0.15, linewidth=0)
+    return fit
+
+@instrumented
+def plot_scatter_with_regression(merged_df, output_path=None, density=None):
     """
     Scatter Plot with Regression Line: Infant mortality vs. life expectancy.
+
+    density selects the aggregated rendering of the points (see draw_points).
     """
+    if output_path is None:
+        output_path = f'{output_dir}/plot_scatter_with_regression.pdf'
+    plt = pyplot()
+
     plt.figure(figsize=(12, 8))
 
     # Scatter plot
-    sns.scatterplot(
-        x='aggregated_infant_mortality', 
-        y='aggregated_life_expectancy', 
-        data=merged_df, 
-        color='blue', alpha=0.7, label='Data Points'
+    draw_points(
+        merged_df['aggregated_infant_mortality'], 
+        merged_df['aggregated_life_expectancy'], 
+        color='blue', alpha=0.7, edgecolors='white', label='Data Points',
+        density=density
     )
 
     # Fit and plot regression line
-    sns.regplot(
+    draw_regression(
         x='aggregated_infant_mortality', 
         y='aggregated_life_expectancy', 
         data=merged_df, 
@@ -56,36 +142,40 @@ def plot_scatter_with_regression(merged_df):
     plt.figtext(0.5, 0.01, 'Figure 1: This scatter plot illustrates the relationship between aggregated infant mortality rates and life expectancy. The red regression line highlights the overall negative trend, indicating that higher infant mortality is associated with lower life expectancy.', wrap=True, horizontalalignment='center', fontsize=12)
 
     # Save the plot as a PDF in the figures directory
-    plt.savefig(f'{output_dir}/plot_scatter_with_regression.pdf')
+    save_figure(output_path)
     plt.close()
 
-def plot_life_expectancy_vs_infant_mortality(merged_df):
+@instrumented
+def plot_life_expectancy_vs_infant_mortality(merged_df, output_path=None, cube=None):
     """
     Plot Life Expectancy vs Infant Mortality for Female and Male, and save it as a PDF.
+
+    The yearly means are read from cube (an AggregateCube with a 'year' level)
+    when one is given, rather than regrouping the merged data.
     """
-    df_grouped = merged_df.groupby('year')[
-        [
-            'period_life_expectancy_-_sex:_female_-_age:_0', 
-            'period_life_expectancy_-_sex:_male_-_age:_0',
-            'observation_value_-_indicator:_infant_mortality_rate_-_sex:_female_-_wealth_quintile:_total_-_unit_of_measure:_deaths_per_100_live_births',
-            'observation_value_-_indicator:_infant_mortality_rate_-_sex:_male_-_wealth_quintile:_total_-_unit_of_measure:_deaths_per_100_live_births'
-        ]
-    ].mean().reset_index()
+    if output_path is None:
+        output_path = f'{output_dir}/life_expectancy_and_infant_mortality_female_and_male.pdf'
+    plt = pyplot()
+
+    columns = ['life_expectancy_female', 'life_expectancy_male', 'infant_mortality_female', 'infant_mortality_male']
+    if cube is None:
+        cube = AggregateCube.from_frame(merged_df, columns=columns, levels=['year'])
+    df_grouped = cube.mean('year', columns=columns).reset_index()
 
     # Create the plot
     plt.figure(figsize=(14, 8))
     ax1 = plt.gca()
 
     # Plot life expectancy for females and males
-    ax1.plot(df_grouped['year'], df_grouped['period_life_expectancy_-_sex:_female_-_age:_0'], color='blue', label='Female Life Expectancy')
-    ax1.plot(df_grouped['year'], df_grouped['period_life_expectancy_-_sex:_male_-_age:_0'], color='green', label='Male Life Expectancy')
+    ax1.plot(df_grouped['year'], df_grouped['life_expectancy_female'], color='blue', label=field('life_expectancy_female').label)
+    ax1.plot(df_grouped['year'], df_grouped['life_expectancy_male'], color='green', label=field('life_expectancy_male').label)
     ax1.set_xlabel('Year', fontsize=14)
     ax1.set_ylabel('Life Expectancy', fontsize=14, color='blue')
 
     # Create a secondary y-axis for infant mortality
     ax2 = ax1.twinx()
-    ax2.plot(df_grouped['year'], df_grouped['observation_value_-_indicator:_infant_mortality_rate_-_sex:_female_-_wealth_quintile:_total_-_unit_of_measure:_deaths_per_100_live_births'], color='orange', linestyle='--', label='Female Infant Mortality')
-    ax2.plot(df_grouped['year'], df_grouped['observation_value_-_indicator:_infant_mortality_rate_-_sex:_male_-_wealth_quintile:_total_-_unit_of_measure:_deaths_per_100_live_births'], color='red', linestyle='--', label='Male Infant Mortality')
+    ax2.plot(df_grouped['year'], df_grouped['infant_mortality_female'], color='orange', linestyle='--', label=field('infant_mortality_female').label)
+    ax2.plot(df_grouped['year'], df_grouped['infant_mortality_male'], color='red', linestyle='--', label=field('infant_mortality_male').label)
     ax2.set_ylabel('Infant Mortality Rate (per 100 live births)', fontsize=14, color='red')
 
     plt.tight_layout(rect=[0, 0.1, 1, 1])
@@ -93,56 +183,163 @@ def plot_life_expectancy_vs_infant_mortality(merged_df):
     # Add detailed caption
     plt.figtext(0.5, 0.01, 'Figure 2: This plot compares life expectancy and infant mortality rates for males and females over the years. Solid lines indicate life expectancy, while dashed lines represent infant mortality rates, highlighting gender-based health disparities over time.', wrap=True, horizontalalignment='center', fontsize=12)
 
-    plt.savefig(f'{output_dir}/life_expectancy_and_infant_mortality_female_and_male.pdf')
+    save_figure(output_path)
     plt.close()
 
-def facet_scatter_graphs_with_regression(df):
+@instrumented
+def facet_scatter_graphs_with_regression(df, output_path=None, density=None):
+    """
+    Facet of four scatter plots with regression lines: life expectancy and
+    infant mortality against GDP and healthcare investment.
+
+    density selects the aggregated rendering of the points (see draw_points).
+    """
+    if output_path is None:
+        output_path = f'{output_dir}/facet_scatter_graphs_with_regression.pdf'
+    plt = pyplot()
+
     fig, axes = plt.subplots(2, 2, figsize=(16, 12))
 
-    sns.regplot(x='gdp_per_capita', y='aggregated_life_expectancy', data=df, ax=axes[0, 0], scatter_kws={'alpha': 0.7}, line_kws={'color': 'blue'})
+    draw_regression(x='gdp_per_capita', y='aggregated_life_expectancy', data=df, ax=axes[0, 0], scatter_kws={'alpha': 0.7}, line_kws={'color': 'blue'}, density=density)
     axes[0, 0].set_title('Life Expectancy vs GDP')
     axes[0, 0].set_xlabel('GDP per Capita (USD)')
     axes[0, 0].set_ylabel('Life Expectancy (Years)')
     axes[0, 0].text(0.5, -0.25, 'Figure 3: Higher GDP per capita correlates with longer life expectancy.', transform=axes[0, 0].transAxes, ha='center', fontsize=10, wrap=True)
 
-    sns.regplot(x='health_expenditure_per_capita_-_total', y='aggregated_life_expectancy', data=df, ax=axes[0, 1], scatter_kws={'alpha': 0.7}, line_kws={'color': 'blue'})
+    draw_regression(x='health_expenditure_per_capita', y='aggregated_life_expectancy', data=df, ax=axes[0, 1], scatter_kws={'alpha': 0.7}, line_kws={'color': 'blue'}, density=density)
     axes[0, 1].set_title('Life Expectancy vs Healthcare Investment')
     axes[0, 1].set_xlabel('Healthcare Investment (USD)')
     axes[0, 1].set_ylabel('Life Expectancy (Years)')
     axes[0, 1].text(0.5, -0.25, 'Figure 4: More healthcare spending leads to longer life expectancy.', transform=axes[0, 1].transAxes, ha='center', fontsize=10, wrap=True)
 
-    sns.regplot(x='gdp_per_capita', y='aggregated_infant_mortality', data=df, ax=axes[1, 0], scatter_kws={'alpha': 0.7, 'color': 'red'}, line_kws={'color': 'red'})
+    draw_regression(x='gdp_per_capita', y='aggregated_infant_mortality', data=df, ax=axes[1, 0], scatter_kws={'alpha': 0.7, 'color': 'red'}, line_kws={'color': 'red'}, density=density)
     axes[1, 0].set_title('Infant Mortality vs GDP')
     axes[1, 0].set_xlabel('GDP per Capita (USD)')
     axes[1, 0].set_ylabel('Infant Mortality (per 100 live births)')
     axes[1, 0].text(0.5, -0.25, 'Figure 5: Higher GDP per capita lowers infant mortality.', transform=axes[1, 0].transAxes, ha='center', fontsize=10, wrap=True)
 
-    sns.regplot(x='health_expenditure_per_capita_-_total', y='aggregated_infant_mortality', data=df, ax=axes[1, 1], scatter_kws={'alpha': 0.7, 'color': 'red'}, line_kws={'color': 'red'})
+    draw_regression(x='health_expenditure_per_capita', y='aggregated_infant_mortality', data=df, ax=axes[1, 1], scatter_kws={'alpha': 0.7, 'color': 'red'}, line_kws={'color': 'red'}, density=density)
     axes[1, 1].set_title('Infant Mortality vs Healthcare Investment')
     axes[1, 1].set_xlabel('Healthcare Investment (USD)')
     axes[1, 1].set_ylabel('Infant Mortality (per 100 live births)')
     axes[1, 1].text(0.5, -0.25, 'Figure 6: More healthcare spending reduces infant mortality.', transform=axes[1, 1].transAxes, ha='center', fontsize=10, wrap=True)
 
     plt.tight_layout(rect=[0, 0.1, 1, 1])
-    plt.savefig(f'{output_dir}/facet_scatter_graphs_with_regression.pdf')
+    save_figure(output_path, fig)
     plt.close()
 
-def main():
+# Figure jobs rendered by main: name, plotting function, output file and progress message
+FIGURES = [
+    ('scatter_with_regression', plot_scatter_with_regression, 'plot_scatter_with_regression.pdf',
+     "Generating Scatter Plot with Regression Line..."),
+    ('life_expectancy_vs_infant_mortality', plot_life_expectancy_vs_infant_mortality, 'life_expectancy_and_infant_mortality_female_and_male.pdf',
+     "Generating Life Expectancy and Infant Mortality Plot for Female and Male..."),
+    ('facet_scatter_graphs_with_regression', facet_scatter_graphs_with_regression, 'facet_scatter_graphs_with_regression.pdf',
+     "Generating Scatter Graphs with Regression Lines..."),
+]
+
+# Merged data columns each figure reads, which make up its cache key
+FIGURE_COLUMNS = {
+    'scatter_with_regression': ['aggregated_infant_mortality', 'aggregated_life_expectancy'],
+    'life_expectancy_vs_infant_mortality': [
+        'year',
+        'life_expectancy_female',
+        'life_expectancy_male',
+        'infant_mortality_female',
+        'infant_mortality_male'
+    ],
+    'facet_scatter_graphs_with_regression': [
+        'gdp_per_capita', 'health_expenditure_per_capita', 'aggregated_life_expectancy', 'aggregated_infant_mortality'
+    ],
+}
+
+# Figures that read their aggregates from the cube when render_figures is given one
+CUBE_FIGURES = {'life_expectancy_vs_infant_mortality'}
+
+# Merged data and aggregate cube held by each worker process, set once when the worker starts
+_worker_df = None
+_worker_cube = None
+
+def _init_worker(merged_df, cube=None):
+    global _worker_df, _worker_cube
+    _worker_df = merged_df
+    _worker_cube = cube
+
+def figure_kwargs(name, cube):
+    return {'cube': cube} if cube is not None and name in CUBE_FIGURES else {}
+
+def render_figure(name, output_path):
     """
-    Main function to load data and generate visualizations.
+    Render one figure job by name from the worker's copy of the merged data.
     """
-    # Load the merged data
-    merged_df = load_merged_data(merged_data_path)
+    plot_function = {job_name: function for job_name, function, _, _ in FIGURES}[name]
+    plot_function(_worker_df, output_path=output_path, **figure_kwargs(name, _worker_cube))
+    return output_path
+
+def render_figures(merged_df, figures_dir=None, workers=None, use_cache=True, cache_path=None, cube=None):
+    """
+    Render every figure in FIGURES from the merged data into figures_dir.
+
+    With workers > 1 the figures are rendered in a process pool; the merged
+    data is handed to each worker when it starts, not pickled again for
+    every figure.
+
+    With use_cache, a figure is only re-rendered when the columns it uses,
+    its output file or the plotting code changed since it was last rendered
+    (tracked in cache_path, by default .figure_cache.json in figures_dir).
+    Figures in CUBE_FIGURES read their aggregates from cube when one is given.
+    Returns the cache hits and misses.
+    """
+    if figures_dir is None:
+        figures_dir = output_dir
+    if cache_path is None:
+        cache_path = os.path.join(figures_dir, '.figure_cache.json')
+    os.makedirs(figures_dir, exist_ok=True)
+
+    # Work out which figures are out of date
+    cache = ArtifactCache(cache_path)
+    jobs = []
+    for name, plot_function, file_name, message in FIGURES:
+        output_path = os.path.join(figures_dir, file_name)
+        key = cache_key(merged_df, FIGURE_COLUMNS[name], {'output': file_name}, plot_function)
+        if use_cache and cache.is_fresh(name, key, output_path):
+            print(f"{file_name} is up to date, skipping.")
+            continue
+        jobs.append((name, plot_function, output_path, message, key))
 
     # Generate visualisations
-    print("Generating Scatter Plot with Regression Line...")
-    plot_scatter_with_regression(merged_df)
+    if workers is not None and workers > 1 and jobs:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(merged_df, cube)) as pool:
+            futures = []
+            for name, _, output_path, message, _ in jobs:
+                print(message)
+                futures.append(pool.submit(render_figure, name, output_path))
+            for future in futures:
+                future.result()
+    else:
+        for name, plot_function, output_path, message, _ in jobs:
+            print(message)
+            plot_function(merged_df, output_path=output_path, **figure_kwargs(name, cube))
+
+    for name, _, output_path, _, key in jobs:
+        cache.record(name, key, output_path)
+    cache.save()
+
+    report = cache.report()
+    print(f"Figure cache: {len(report['hits'])} hits, {len(report['misses'])} misses")
+    return report
 
-    print("Generating Life Expectancy and Infant Mortality Plot for Female and Male...")
-    plot_life_expectancy_vs_infant_mortality(merged_df)
+def main(workers=None, figures_dir=None, use_cache=True, cache_path=None):
+    """
+    Main function to load data and generate visualizations.
+
+    See render_figures for the parallel and cache options. Returns the cache
+    hits and misses.
+    """
+    # Load the merged data
+    merged_df = load_merged_data(merged_data_path)
 
-    print("Generating Scatter Graphs with Regression Lines...")
-    facet_scatter_graphs_with_regression(merged_df)
+    return render_figures(merged_df, figures_dir=figures_dir, workers=workers, use_cache=use_cache, cache_path=cache_path)
 
 if __name__ == '__main__':
     main()
@@ -1,7 +1,13 @@
 import unittest
+import numpy as np
 import pandas as pd
-from scipy.stats import pearsonr
-from src.analysis import summary_statistics, correlation_analysis_with_test
+from scipy.stats import pearsonr, spearmanr
+from statsmodels.stats.multitest import multipletests
+from src.analysis import (
+    SummaryAccumulator, summary_statistics, correlation_analysis_with_test, correlation_matrix_with_test, grouped_correlation,
+    bootstrap_correlation, permutation_test_correlation, grouped_trends, TREND_COLUMNS,
+)
+from src.regression import fit_linear_regression
 from src.data_processing import load_data
 
 # Define the path to the merged data
@@ -26,6 +32,40 @@ class TestAnalysisFunctions(unittest.TestCase):
         self.assertIn('variance', stats.columns)
         expected_mean = df['aggregated_infant_mortality'].mean()
         self.assertAlmostEqual(stats.at['aggregated_infant_mortality', 'mean'], expected_mean)
+
+    # test that chunked and partitioned inputs give the same summary table
+    def test_summary_statistics_streaming(self):
+        """
+        Test summary statistics from one frame, a chunked CSV stream and merged
+        partitions against describe() and var().
+        """
+        df = load_merged_data()
+        columns = ['aggregated_infant_mortality', 'aggregated_life_expectancy', 'gdp_per_capita']
+        expected = df[columns].describe().transpose()
+        expected['variance'] = df[columns].var()
+
+        from_frame = summary_statistics(df, columns)
+        from_stream = summary_statistics(pd.read_csv(merged_data, chunksize=128), columns)
+        partitions = [SummaryAccumulator(columns).update(df.iloc[i::4]) for i in range(4)]
+        from_partitions = partitions[0]
+        for partition in partitions[1:]:
+            from_partitions.merge(partition)
+
+        for stats in [from_frame, from_stream, from_partitions.result()]:
+            pd.testing.assert_frame_equal(stats, expected, check_exact=False, rtol=1e-9)
+
+    # test the approximate quantiles once the sketch has been compressed
+    def test_summary_statistics_quantile_sketch(self):
+        """
+        Test that quantiles stay close to the exact values on data larger than the sketch.
+        """
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({'value': rng.lognormal(size=200_000)})
+        stats = summary_statistics((df.iloc[i:i + 10_000] for i in range(0, len(df), 10_000)), ['value'], sketch_size=512)
+        self.assertEqual(stats.at['value', 'count'], len(df))
+        self.assertAlmostEqual(stats.at['value', 'variance'], df['value'].var())
+        for label, q in [('25%', 0.25), ('50%', 0.5), ('75%', 0.75)]:
+            self.assertLess(abs(stats.at['value', label] - df['value'].quantile(q)) / df['value'].quantile(q), 0.01)
     # test correlation analysis
     def test_correlation_analysis_with_test(self):
         """
@@ -55,6 +95,214 @@ class TestAnalysisFunctions(unittest.TestCase):
         self.assertAlmostEqual(correlation, expected_correlation)
         self.assertAlmostEqual(p_value, expected_p_value)
 
+    # test the all-pairs correlation matrix against one pearsonr call per pair
+    def test_correlation_matrix_with_test(self):
+        """
+        Test the correlation matrix with pairwise-complete missing values against scipy.
+        """
+        df = load_merged_data()
+        columns = ['aggregated_infant_mortality', 'aggregated_life_expectancy', 'gdp_per_capita', 'health_expenditure_per_capita']
+        rng = np.random.default_rng(0)
+        for column in columns:
+            df.loc[rng.random(len(df)) < 0.1, column] = np.nan
+
+        correlation, p_values, n_obs, reject = correlation_matrix_with_test(df, columns, correction='holm')
+        pairs = [(x, y) for i, x in enumerate(columns) for y in columns[i + 1:]]
+        raw_p = []
+        for x, y in pairs:
+            complete = df[[x, y]].dropna()
+            expected_correlation, expected_p_value = pearsonr(complete[x], complete[y])
+            self.assertAlmostEqual(correlation.at[x, y], expected_correlation)
+            self.assertAlmostEqual(correlation.at[y, x], expected_correlation)
+            self.assertEqual(n_obs.at[x, y], len(complete))
+            raw_p.append(expected_p_value)
+
+        expected_reject, expected_corrected, _, _ = multipletests(raw_p, alpha=0.05, method='holm')
+        for (x, y), expected_p_value, expected_decision in zip(pairs, expected_corrected, expected_reject):
+            self.assertTrue(np.isclose(p_values.at[x, y], expected_p_value, rtol=1e-6, atol=0))
+            self.assertEqual(reject.at[x, y], expected_decision)
+
+    # test the Spearman correlation matrix
+    def test_spearman_correlation_matrix(self):
+        """
+        Test the Spearman correlation matrix against scipy's spearmanr.
+        """
+        df = load_merged_data()
+        columns = ['aggregated_infant_mortality', 'aggregated_life_expectancy', 'gdp_per_capita']
+        correlation, _, _, _ = correlation_matrix_with_test(df, columns, method='spearman')
+        expected = spearmanr(df[columns]).statistic
+        np.testing.assert_allclose(correlation.to_numpy(), expected)
+
+        # Pairs missing different rows are ranked within their complete rows, like DataFrame.corr
+        rng = np.random.default_rng(0)
+        for column in columns[1:]:
+            df.loc[rng.random(len(df)) < 0.2, column] = np.nan
+        correlation, _, n_obs, _ = correlation_matrix_with_test(df, columns, method='spearman')
+        np.testing.assert_allclose(correlation.to_numpy(), df[columns].corr(method='spearman').to_numpy())
+        complete = df[columns[1:]].dropna()
+        self.assertEqual(n_obs.at[columns[1], columns[2]], len(complete))
+        self.assertAlmostEqual(correlation.at[columns[1], columns[2]], spearmanr(complete).statistic)
+        with self.assertRaises(ValueError):
+            correlation_matrix_with_test(df, columns, method='kendall')
+
+    # test the grouped correlation engine against one pearsonr call per group
+    def test_grouped_correlation(self):
+        """
+        Test per-entity and per-year correlations against pearsonr on each group.
+        """
+        df = load_merged_data()
+        for by in ['entity', 'year']:
+            grouped = grouped_correlation(df, 'aggregated_infant_mortality', 'aggregated_life_expectancy', by=by)
+            self.assertEqual(list(grouped.columns), ['n', 'correlation', 'p_value', 'reject'])
+            self.assertEqual(len(grouped), df[by].nunique())
+            for key, group in df.groupby(by):
+                self.assertEqual(grouped.at[key, 'n'], len(group))
+                if len(group) < 3:
+                    continue
+                expected_correlation, expected_p_value = pearsonr(group['aggregated_infant_mortality'], group['aggregated_life_expectancy'])
+                self.assertAlmostEqual(grouped.at[key, 'correlation'], expected_correlation)
+                self.assertTrue(np.isclose(grouped.at[key, 'p_value'], expected_p_value, rtol=1e-6, atol=1e-300))
+
+    # test that small and constant groups are reported without a correlation
+    def test_grouped_correlation_degenerate_groups(self):
+        """
+        Test that groups with too few rows or a constant column get NaN results.
+        """
+        df = pd.DataFrame({
+            'entity': ['A', 'A', 'B', 'B', 'B', 'C', 'C', 'C'],
+            'x': [1.0, 2.0, 1.0, 2.0, 3.0, 5.0, 5.0, 5.0],
+            'y': [2.0, 4.0, 3.0, 1.0, 2.0, 1.0, 2.0, 3.0],
+        })
+        grouped = grouped_correlation(df, 'x', 'y')
+        self.assertTrue(np.isnan(grouped.at['A', 'p_value']))
+        self.assertAlmostEqual(grouped.at['B', 'correlation'], -0.5)
+        self.assertTrue(np.isnan(grouped.at['C', 'correlation']))
+
+    # test the bootstrap confidence intervals
+    def test_bootstrap_correlation(self):
+        """
+        Test that bootstrap intervals contain the estimate, are reproducible for
+        any worker count and widen when resampling whole entities.
+        """
+        df = load_merged_data()
+        columns = ('aggregated_infant_mortality', 'aggregated_life_expectancy')
+        correlation, ci_low, ci_high = bootstrap_correlation(df, *columns, n_resamples=2000, seed=42)
+        self.assertAlmostEqual(correlation, pearsonr(df[columns[0]], df[columns[1]])[0])
+        self.assertLess(ci_low, correlation)
+        self.assertGreater(ci_high, correlation)
+
+        parallel = bootstrap_correlation(df, *columns, n_resamples=2000, seed=42, workers=2)
+        self.assertEqual(parallel, (correlation, ci_low, ci_high))
+
+        _, cluster_low, cluster_high = bootstrap_correlation(df, *columns, n_resamples=2000, cluster='entity', seed=42)
+        self.assertGreater(cluster_high - cluster_low, ci_high - ci_low)
+
+    # test the permutation p-values
+    def test_permutation_test_correlation(self):
+        """
+        Test permutation p-values on correlated and independent data, and through
+        correlation_analysis_with_test.
+        """
+        df = load_merged_data()
+        _, p_value = permutation_test_correlation(df, 'aggregated_infant_mortality', 'aggregated_life_expectancy', n_resamples=999, seed=0)
+        self.assertAlmostEqual(p_value, 1 / 1000)
+
+        rng = np.random.default_rng(0)
+        noise = pd.DataFrame({'x': rng.normal(size=500), 'y': rng.normal(size=500)})
+        _, p_value = permutation_test_correlation(noise, 'x', 'y', n_resamples=999, seed=0)
+        self.assertTrue(0 < p_value <= 1)
+        expected_p_value = pearsonr(noise['x'], noise['y'])[1]
+        self.assertLess(abs(p_value - expected_p_value), 0.05)
+
+        _, p_value, result = correlation_analysis_with_test(df, 'aggregated_infant_mortality', 'aggregated_life_expectancy',
+                                                            test='permutation', n_resamples=999, seed=0)
+        self.assertAlmostEqual(p_value, 1 / 1000)
+        self.assertTrue(result.startswith('Reject'))
+
+    # Test per-entity trends against a separate least squares fit of each entity
+    def test_grouped_trends(self):
+        df = load_merged_data()
+        columns = ['aggregated_life_expectancy', 'aggregated_infant_mortality']
+        trends = grouped_trends(df, columns)
+        self.assertEqual(len(trends), df['entity'].nunique() * len(columns))
+        for (entity, indicator), row in trends.set_index(['entity', 'indicator']).iterrows():
+            group = df[df['entity'] == entity]
+            fit = fit_linear_regression(group['year'], group[indicator])
+            self.assertEqual(row['n'], fit.n)
+            np.testing.assert_allclose(
+                [row['slope'], row['intercept'], row['slope_se'], row['intercept_se'], row['r_squared']],
+                [fit.slope, fit.intercept, fit.slope_se, fit.intercept_se, fit.r_squared], rtol=1e-6)
+            _, p_value = pearsonr(group['year'], group[indicator])
+            self.assertAlmostEqual(row['p_value'], p_value, delta=1e-9 + 1e-6 * p_value)
+
+    # Test rolling-window trends against a fit of the rows in each window, and undefined fits
+    def test_rolling_trends(self):
+        df = load_merged_data()
+        trends = grouped_trends(df, 'aggregated_life_expectancy', window=10)
+        self.assertEqual(len(trends), len(df))
+        for _, row in trends.sample(50, random_state=0).iterrows():
+            group = df[(df['entity'] == row['entity']) & (df['year'] > row['window_end'] - 10) & (df['year'] <= row['window_end'])]
+            self.assertEqual(row['n'], len(group))
+            if len(group) < 3:
+                self.assertTrue(np.isnan(row['slope']))
+                continue
+            fit = fit_linear_regression(group['year'], group['aggregated_life_expectancy'])
+            self.assertAlmostEqual(row['slope'], fit.slope, places=6)
+            self.assertAlmostEqual(row['slope_se'], fit.slope_se, places=6)
+
+        # A single year gives no trend
+        single = pd.DataFrame({'entity': ['A', 'A', 'A'], 'year': [2000, 2000, 2000], 'value': [1.0, 2.0, 3.0]})
+        self.assertTrue(grouped_trends(single, 'value')[['slope', 'slope_se', 'p_value']].isna().all(axis=None))
+
+    # Test that the hypothesis test runs in float64 on float32 storage
+    def test_correlation_with_float32_storage(self):
+        df = load_merged_data()
+        columns = ['aggregated_infant_mortality', 'aggregated_life_expectancy']
+        correlation, p_value, _ = correlation_analysis_with_test(df.astype({column: 'float32' for column in columns}), *columns)
+        self.assertIsInstance(correlation, np.float64)
+        self.assertIsInstance(p_value, np.float64)
+        expected_correlation, expected_p_value = pearsonr(df[columns[0]], df[columns[1]])
+        self.assertAlmostEqual(correlation, expected_correlation, places=6)
+        self.assertGreater(p_value, 0.0)
+        self.assertLess(abs(np.log(p_value) - np.log(expected_p_value)), 0.1)
+
+    # Test that sketched quartiles stay within the sketch's rank error bound however the data is split
+    def test_summary_quantile_error_bound(self):
+        sketch_size = 256
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({'normal': rng.standard_normal(100_000), 'exponential': rng.exponential(size=100_000)})
+        single = SummaryAccumulator(df.columns, sketch_size).update(df)
+        chunked = SummaryAccumulator(df.columns, sketch_size)
+        for start in range(0, len(df), 1000):
+            chunked.update(df.iloc[start:start + 1000])
+        merged = SummaryAccumulator(df.columns, sketch_size)
+        for i in range(8):
+            merged.merge(SummaryAccumulator(df.columns, sketch_size).update(df.iloc[i::8]))
+
+        for accumulator in [single, chunked, merged]:
+            summary = accumulator.result()
+            for column in df.columns:
+                values = np.sort(df[column].to_numpy())
+                for label, q in [('25%', 0.25), ('50%', 0.50), ('75%', 0.75)]:
+                    rank = np.searchsorted(values, summary.at[column, label]) / len(values)
+                    self.assertLessEqual(abs(rank - q), 1 / sketch_size, (column, label))
+        # The exact statistics do not depend on the split
+        for accumulator in [chunked, merged]:
+            pd.testing.assert_frame_equal(accumulator.result()[['count', 'mean', 'std', 'min', 'max']],
+                                          single.result()[['count', 'mean', 'std', 'min', 'max']])
+
+    # Test that an empty input or one without complete pairs gives an empty trends table
+    def test_trends_of_empty_input(self):
+        df = load_merged_data()
+        expected_columns = grouped_trends(df, 'gdp_per_capita', window=5).columns
+        for empty in [df.iloc[:0], df.assign(gdp_per_capita=np.nan)]:
+            trends = grouped_trends(empty, 'gdp_per_capita')
+            self.assertTrue(trends.empty)
+            self.assertEqual(list(trends.columns), ['entity', 'indicator'] + TREND_COLUMNS)
+            rolling = grouped_trends(empty, 'gdp_per_capita', window=5)
+            self.assertTrue(rolling.empty)
+            self.assertEqual(list(rolling.columns), list(expected_columns))
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,57 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from benchmarks.bench_pipeline import load_results, main
+
+class TestBenchmarks(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.results_path = os.path.join(self.tmp_dir, 'results.jsonl')
+        self.args = ['--entities', '5', '--years', '3', '--skip-figures', '--work-dir', self.tmp_dir,
+                     '--results', self.results_path, '--baseline', self.results_path]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def run_main(self):
+        """
+        Run the benchmark's command line and return what it printed.
+        """
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            main(self.args)
+        return output.getvalue()
+
+    def write_baseline(self, record, scale):
+        """
+        Replace the results file with a copy of record whose stages took scale
+        times as long and as much memory.
+        """
+        stages = [dict(stage, seconds=stage['seconds'] * scale, peak_rss_mb=stage['peak_rss_mb'] * scale)
+                  for stage in record['stages']]
+        with open(self.results_path, 'w') as f:
+            f.write(json.dumps(dict(record, stages=stages)) + '\n')
+
+    # Test that a run is compared with the earlier record in the results file, not with itself
+    def test_baseline_in_results_file(self):
+        self.assertIn("No baseline run with the same configuration.", self.run_main())
+        record = load_results(self.results_path)[0]
+
+        self.write_baseline(record, 1000)
+        output = self.run_main()
+        self.assertEqual(len(load_results(self.results_path)), 2)
+        ratios = [line.split('time ')[1].split()[0] for line in output.splitlines() if ' time x' in line]
+        self.assertEqual(len(ratios), len(record['stages']))
+        self.assertTrue(all(ratio == 'x0.00' for ratio in ratios), ratios)
+
+        self.write_baseline(record, 0.001)
+        with self.assertRaises(SystemExit) as raised, contextlib.redirect_stdout(io.StringIO()):
+            main(self.args)
+        self.assertEqual(raised.exception.code, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import types
+import unittest
+from unittest import mock
+from src.analysis import save_summary_to_pdf, summary_statistics
+from src.cache import ArtifactCache, cache_key, code_modules, code_version, module_name, module_source
+from src.data_processing import load_data
+from src.visulisations import plot_scatter_with_regression, plot_life_expectancy_vs_infant_mortality
+
+# Define the path to the merged data
+merged_data_path = './data/processed/merged_data.csv'
+
+class TestArtifactCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.merged_df = load_data(merged_data_path)
+        self.columns = ['aggregated_infant_mortality', 'aggregated_life_expectancy']
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    # Test that the key depends only on the columns used, the parameters and the code
+    def test_cache_key(self):
+        key = cache_key(self.merged_df, self.columns, {'output': 'a.pdf'}, plot_scatter_with_regression)
+        changed_other_column = self.merged_df.assign(gdp_per_capita=0.0)
+        self.assertEqual(cache_key(changed_other_column, self.columns, {'output': 'a.pdf'}, plot_scatter_with_regression), key)
+
+        changed_used_column = self.merged_df.copy()
+        changed_used_column.loc[0, 'aggregated_life_expectancy'] += 1
+        self.assertNotEqual(cache_key(changed_used_column, self.columns, {'output': 'a.pdf'}, plot_scatter_with_regression), key)
+        self.assertNotEqual(cache_key(self.merged_df, self.columns, {'output': 'b.pdf'}, plot_scatter_with_regression), key)
+
+    # Test hits, misses and persistence of the cache manifest
+    def test_hits_and_misses(self):
+        manifest_path = os.path.join(self.tmp_dir, 'cache.json')
+        output_path = os.path.join(self.tmp_dir, 'figure.pdf')
+        key = cache_key(self.merged_df, self.columns)
+
+        cache = ArtifactCache(manifest_path)
+        self.assertFalse(cache.is_fresh('figure', key, output_path))
+        plot_scatter_with_regression(self.merged_df, output_path=output_path)
+        cache.record('figure', key, output_path)
+        cache.save()
+
+        cache = ArtifactCache(manifest_path)
+        self.assertTrue(cache.is_fresh('figure', key, output_path))
+        self.assertFalse(cache.is_fresh('figure', 'another key', output_path))
+
+        # An output overwritten by something else is no longer trusted
+        plot_life_expectancy_vs_infant_mortality(self.merged_df, output_path=output_path)
+        self.assertFalse(cache.is_fresh('figure', key, output_path))
+        self.assertEqual(cache.report(), {'hits': ['figure'], 'misses': ['figure', 'figure']})
+
+    # Test that the summary PDF is only rewritten when its table or caption changes
+    def test_summary_pdf_cache(self):
+        cache = ArtifactCache(os.path.join(self.tmp_dir, 'report_cache.json'))
+        output_path = os.path.join(self.tmp_dir, 'summary_statistics.pdf')
+        summary = summary_statistics(self.merged_df, self.columns)
+        self.assertTrue(save_summary_to_pdf(summary, output_path, 'Table 1', cache=cache))
+        self.assertFalse(save_summary_to_pdf(summary, output_path, 'Table 1', cache=cache))
+        self.assertTrue(save_summary_to_pdf(summary, output_path, 'Table 2', cache=cache))
+        self.assertTrue(save_summary_to_pdf(summary.round(1), output_path, 'Table 2', cache=cache))
+
+    # Test that the code version covers the modules a figure depends on
+    def test_code_version_dependencies(self):
+        modules = code_modules(plot_scatter_with_regression.__module__)
+        for name in ['src.visulisations', 'src.regression', 'src.cube', 'src.schema']:
+            self.assertIn(name, modules)
+        self.assertNotIn('src.reports', modules)
+
+        version = code_version(plot_scatter_with_regression)
+        def edited_regression(name):
+            source = module_source(name)
+            return source + '\n# edited\n' if name == 'src.regression' else source
+        with mock.patch('src.cache.module_source', side_effect=edited_regression):
+            self.assertNotEqual(code_version(plot_scatter_with_regression), version)
+        self.assertEqual(code_version(plot_scatter_with_regression), version)
+
+        # Run as python -m src.visulisations, or as a script, the module is named __main__
+        def main_function():
+            pass
+        main_function.__module__ = '__main__'
+        as_module = types.ModuleType('__main__')
+        as_module.__spec__ = importlib.util.find_spec('src.visulisations')
+        with mock.patch.dict(sys.modules, {'__main__': as_module}):
+            self.assertEqual(code_version(main_function), version)
+        as_script = types.ModuleType('__main__')
+        as_script.__spec__ = None
+        as_script.__file__ = os.path.join('src', 'visulisations.py')
+        with mock.patch.dict(sys.modules, {'__main__': as_script}):
+            script_modules = code_modules(module_name(main_function))
+        self.assertEqual(script_modules[1:], modules[:-1])
+        self.assertTrue(script_modules[0].endswith('visulisations.py'))
+
+if __name__ == '__main__':
+    unittest.main()
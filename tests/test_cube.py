@@ -0,0 +1,70 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from src.cube import AggregateCube, build_cube
+from src.data_processing import MERGED_DATA_PATH, load_data, load_regions
+from src.schema import storage_dtypes
+from src.storage import frame_columns
+
+class TestAggregateCube(unittest.TestCase):
+    def setUp(self):
+        self.merged_df = load_data(MERGED_DATA_PATH, dtype=storage_dtypes(frame_columns(MERGED_DATA_PATH)))
+        self.regions = load_regions()
+        self.columns = ['life_expectancy_female', 'gdp_per_capita', 'health_expenditure_per_capita']
+
+    def assert_matches_groupby(self, cube, df, level, keys):
+        values = df[self.columns].astype('float64')
+        grouped = values.groupby([df[key] for key in keys], observed=True)
+        pd.testing.assert_frame_equal(cube.count(level, self.columns), grouped.count(), check_names=False, check_dtype=False)
+        pd.testing.assert_frame_equal(cube.mean(level, self.columns), grouped.mean(), check_names=False, rtol=1e-9)
+        pd.testing.assert_frame_equal(cube.variance(level, self.columns), grouped.var(), check_names=False, rtol=1e-7)
+
+    # Test that means, variances and counts per year, entity and (region, year) match a direct groupby
+    def test_queries_match_groupby(self):
+        cube = build_cube(self.merged_df, self.regions)
+        self.assertEqual(sorted(cube.tables), ['entity', 'region_year', 'year'])
+        self.assert_matches_groupby(cube, self.merged_df, 'year', ['year'])
+        self.assert_matches_groupby(cube, self.merged_df, 'entity', ['entity'])
+        with_region = self.merged_df.assign(region=self.merged_df['entity'].map(self.regions))
+        self.assert_matches_groupby(cube, with_region, 'region_year', ['region', 'year'])
+
+    # Test that year aggregates roll up further, e.g. into decades
+    def test_rollup_by_decade(self):
+        cube = build_cube(self.merged_df)
+        decade = self.merged_df['year'] // 10 * 10
+        expected = self.merged_df[self.columns].astype('float64').groupby(decade).mean()
+        pd.testing.assert_frame_equal(cube.mean('year', self.columns, by=lambda year: year // 10 * 10), expected,
+                                      check_names=False, rtol=1e-9)
+
+    # Test that adding new years incrementally gives the same cube as building it at once, and old years are rejected
+    def test_incremental_update(self):
+        old = self.merged_df[self.merged_df['year'] < 2015]
+        new = self.merged_df[self.merged_df['year'] >= 2015]
+        cube = build_cube(old, self.regions).update(new, self.regions)
+        full = build_cube(self.merged_df, self.regions)
+        for level in full.tables:
+            pd.testing.assert_frame_equal(cube.mean(level), full.mean(level), rtol=1e-9, check_index_type=False)
+            pd.testing.assert_frame_equal(cube.variance(level), full.variance(level), rtol=1e-7, check_index_type=False)
+        with self.assertRaises(ValueError):
+            cube.update(new, self.regions)
+
+    # Test that a saved cube loads back with the same statistics
+    def test_save_and_load(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            cube = build_cube(self.merged_df, self.regions)
+            for file_name in ['cube.csv', 'cube.parquet']:
+                path = os.path.join(tmp_dir, file_name)
+                cube.save(path)
+                loaded = AggregateCube.load(path)
+                for level in cube.tables:
+                    np.testing.assert_allclose(loaded.mean(level).to_numpy(), cube.mean(level).to_numpy(), rtol=1e-12)
+                    np.testing.assert_array_equal(loaded.count(level).to_numpy(), cube.count(level).to_numpy())
+        finally:
+            shutil.rmtree(tmp_dir)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,11 @@
+import importlib.util
+import os
+import shutil
+import tempfile
 import unittest
+import numpy as np
 import pandas as pd
-from src.data_processing import load_data, clean_data, merge_data, aggregated_values
+from src.data_processing import DATASETS, SeenKeys, load_columns, load_dtypes, load_data, clean_data, clean_data_streaming, merge_data, aggregated_values, process_data, load_manifest
 
 class TestDataProcessing(unittest.TestCase):
     # Test to check for missing values in GDP data after cleaning
@@ -16,7 +21,7 @@ class TestDataProcessing(unittest.TestCase):
     def test_no_missing_values_in_healthcare_data(self):
         healthcare_df = load_data('./data/processed/life-expectancy-vs-health-expenditure-cleaned.csv')
         columns_to_check = [
-            'entity', 'year', 'health_expenditure_per_capita_-_total'
+            'entity', 'year', 'health_expenditure_per_capita'
         ]
         cleaned_data = clean_data(healthcare_df, columns_to_check)
         self.assertEqual(cleaned_data[columns_to_check].isnull().sum().sum(), 0, "Missing values found in critical columns for healthcare data.")
@@ -35,10 +40,10 @@ class TestDataProcessing(unittest.TestCase):
     def test_column_consistency_in_healthcare_data(self):
         healthcare_df = load_data('./data/processed/life-expectancy-vs-health-expenditure-cleaned.csv')
         columns_to_check = [
-            'entity', 'year', 'health_expenditure_per_capita_-_total'
+            'entity', 'year', 'health_expenditure_per_capita'
         ]
         cleaned_data = clean_data(healthcare_df, columns_to_check)
-        expected_columns = ['entity', 'year', 'health_expenditure_per_capita_-_total']
+        expected_columns = ['entity', 'year', 'health_expenditure_per_capita']
         self.assertEqual(list(cleaned_data.columns), expected_columns, f"Columns do not match for healthcare data. Found: {cleaned_data.columns}, Expected: {expected_columns}")
 
     # Test to verify correct merging of GDP, healthcare, life expectancy, and infant mortality datasets
@@ -50,16 +55,16 @@ class TestDataProcessing(unittest.TestCase):
 
         columns_to_check_infant_mortality = [
             'entity', 'year',
-            'observation_value_-_indicator:_infant_mortality_rate_-_sex:_female_-_wealth_quintile:_total_-_unit_of_measure:_deaths_per_100_live_births',
-            'observation_value_-_indicator:_infant_mortality_rate_-_sex:_male_-_wealth_quintile:_total_-_unit_of_measure:_deaths_per_100_live_births'
+            'infant_mortality_female',
+            'infant_mortality_male'
         ]
         columns_to_check_life_expectancy = [
             'entity', 'year',
-            'period_life_expectancy_-_sex:_female_-_age:_0',
-            'period_life_expectancy_-_sex:_male_-_age:_0'
+            'life_expectancy_female',
+            'life_expectancy_male'
         ]
         columns_to_check_gdp = ['entity', 'year', 'gdp_per_capita']
-        columns_to_check_healthcare = ['entity', 'year', 'health_expenditure_per_capita_-_total']
+        columns_to_check_healthcare = ['entity', 'year', 'health_expenditure_per_capita']
 
         cleaned_infant_mortality_data = clean_data(infant_mortality_df, columns_to_check_infant_mortality)
         cleaned_life_expectancy_data = clean_data(life_expectancy_df, columns_to_check_life_expectancy)
@@ -71,9 +76,186 @@ class TestDataProcessing(unittest.TestCase):
         self.assertIn('entity', merged_data.columns, "'entity' column not found in merged data.")
         self.assertIn('year', merged_data.columns, "'year' column not found in merged data.")
         self.assertIn('gdp_per_capita', merged_data.columns, "'gdp_per_capita' column not found in merged data.")
-        self.assertIn('health_expenditure_per_capita_-_total', merged_data.columns, "'health_expenditure_per_capita_-_total' column not found in merged data.")
+        self.assertIn('health_expenditure_per_capita', merged_data.columns, "'health_expenditure_per_capita' column not found in merged data.")
         self.assertGreater(len(merged_data), 0, "Merged data is empty.")
 
+    # Test that the single-pass join matches chained pd.merge calls for any number of datasets
+    def test_merge_data_matches_chained_merge(self):
+        cleaned = [load_data(spec['cleaned_path']) for spec in DATASETS]
+        population_df = cleaned[2][['entity', 'year']].iloc[::2].assign(population=1.0)
+        for datasets in [cleaned[:2], cleaned, cleaned + [population_df]]:
+            expected = datasets[0]
+            for df in datasets[1:]:
+                expected = pd.merge(expected, df, on=['year', 'entity'], how='inner')
+            pd.testing.assert_frame_equal(merge_data(*datasets), expected)
+
+    # Test that repeated keys still produce every matching row pair
+    def test_merge_data_with_duplicate_keys(self):
+        left = pd.DataFrame({'entity': ['A', 'A', 'B'], 'year': [2000, 2000, 2000], 'gdp_per_capita': [1.0, 2.0, 3.0]})
+        right = pd.DataFrame({'entity': ['A', 'B'], 'year': [2000, 2000], 'health_expenditure_per_capita': [4.0, 5.0]})
+        merged_data = merge_data(left, right)
+        self.assertEqual(len(merged_data), 3)
+        self.assertEqual(merged_data['health_expenditure_per_capita'].tolist(), [4.0, 4.0, 5.0])
+
+    # Test that a missing key only matches another missing key, as in pd.merge
+    def test_merge_data_with_missing_keys(self):
+        left = pd.DataFrame({'entity': ['Chile', 'Peru', None], 'year': [2000, 2000, 2001], 'gdp_per_capita': [1.0, 2.0, 3.0]})
+        for right in [pd.DataFrame({'entity': ['Peru'], 'year': [2001], 'health_expenditure_per_capita': [4.0]}),
+                      pd.DataFrame({'entity': ['Chile', None], 'year': [2000, 2001], 'health_expenditure_per_capita': [4.0, 5.0]})]:
+            expected = pd.merge(left, right, on=['year', 'entity'], how='inner')
+            pd.testing.assert_frame_equal(merge_data(left, right), expected)
+            pd.testing.assert_frame_equal(merge_data(left.astype({'entity': 'category'}), right.astype({'entity': 'category'})).astype({'entity': 'str'}),
+                                          expected)
+
+    # Test that load_data only parses the requested raw columns, in their storage dtypes
+    def test_load_data_projection_and_dtypes(self):
+        gdp_spec = DATASETS[2]
+        gdp_life_df = load_data(gdp_spec['raw_path'], columns=load_columns(gdp_spec), dtype=load_dtypes(gdp_spec, 'float32'))
+        self.assertEqual(list(gdp_life_df.columns), ['Entity', 'Year', 'GDP per capita'])
+        self.assertIsInstance(gdp_life_df['Entity'].dtype, pd.CategoricalDtype)
+        self.assertEqual(gdp_life_df['Year'].dtype, 'int16')
+        self.assertEqual(gdp_life_df['GDP per capita'].dtype, 'float32')
+
+        cleaned_data = clean_data(gdp_life_df, gdp_spec['columns_to_check'], essential_columns=gdp_spec['essential_columns'])
+        expected = load_data('./data/processed/life-expectancy-vs-gdp-per-capita-cleaned.csv')
+        self.assertEqual(len(cleaned_data), len(expected))
+
+        # Columns outside the schema take their dtype from the spec
+        extra_spec = dict(gdp_spec, essential_columns=gdp_spec['essential_columns'] + ['population_(historical)'],
+                          dtypes={'population_(historical)': 'float32', 'gdp_per_capita': 'float64'})
+        self.assertEqual(load_dtypes(extra_spec), {'entity': 'category', 'year': 'int16', 'gdp_per_capita': 'float32',
+                                                   'population_(historical)': 'float32'})
+        self.assertEqual(load_dtypes(extra_spec, 'float64')['population_(historical)'], 'float64')
+        population = load_data(gdp_spec['raw_path'], columns=load_columns(extra_spec), dtype=load_dtypes(extra_spec))
+        self.assertEqual(population['Population (historical)'].dtype, 'float32')
+
+class TestIncrementalProcessing(unittest.TestCase):
+    # Copy the first rows of each raw file into a temporary workspace
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.datasets = []
+        for spec in DATASETS:
+            raw_path = os.path.join(self.tmp_dir, os.path.basename(spec['raw_path']))
+            pd.read_csv(spec['raw_path'], nrows=3000).to_csv(raw_path, index=False)
+            self.datasets.append(dict(spec, raw_path=raw_path, cleaned_path=os.path.join(self.tmp_dir, os.path.basename(spec['cleaned_path']))))
+        self.merged_path = os.path.join(self.tmp_dir, 'merged_data.csv')
+        self.manifest_path = os.path.join(self.tmp_dir, 'manifest.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def run_pipeline(self, **kwargs):
+        return process_data(self.datasets, merged_data_path=self.merged_path, manifest_path=self.manifest_path, **kwargs)
+
+    # Test that a second run with unchanged inputs rebuilds nothing
+    def test_unchanged_inputs_are_skipped(self):
+        first = self.run_pipeline()
+        mtimes = {spec['name']: os.path.getmtime(spec['cleaned_path']) for spec in self.datasets}
+        merged_mtime = os.path.getmtime(self.merged_path)
+
+        second = self.run_pipeline()
+        for spec in self.datasets:
+            self.assertEqual(os.path.getmtime(spec['cleaned_path']), mtimes[spec['name']], f"{spec['name']} was rebuilt.")
+        self.assertEqual(os.path.getmtime(self.merged_path), merged_mtime, "Merged data was rebuilt.")
+        pd.testing.assert_frame_equal(first, second)
+
+    # Test that changing one raw file only rebuilds that dataset and the merge
+    def test_changed_input_rebuilds_dataset_and_merge(self):
+        self.run_pipeline()
+        manifest = load_manifest(self.manifest_path)
+        gdp_spec = self.datasets[2]
+        raw_df = pd.read_csv(gdp_spec['raw_path'])
+        raw_df.loc[raw_df['GDP per capita'].first_valid_index(), 'GDP per capita'] += 1
+        raw_df.to_csv(gdp_spec['raw_path'], index=False)
+
+        self.run_pipeline()
+        updated = load_manifest(self.manifest_path)
+        self.assertNotEqual(updated['datasets']['gdp']['raw_hash'], manifest['datasets']['gdp']['raw_hash'])
+        self.assertEqual(updated['datasets']['healthcare'], manifest['datasets']['healthcare'])
+        self.assertNotEqual(updated['merged']['inputs'], manifest['merged']['inputs'])
+
+    # Test that changing the cleaning parameters invalidates the cached output
+    def test_changed_params_rebuild_dataset(self):
+        self.run_pipeline()
+        self.datasets[3] = dict(self.datasets[3], columns_to_check=['entity', 'year', 'health_expenditure_per_capita'])
+        self.run_pipeline()
+        manifest = load_manifest(self.manifest_path)
+        self.assertEqual(manifest['datasets']['healthcare']['params']['columns_to_check'], self.datasets[3]['columns_to_check'])
+
+    # Test that processed artifacts can be written in a columnar format
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), "pyarrow is not installed")
+    def test_columnar_storage_format(self):
+        csv_df = self.run_pipeline()
+        parquet_df = self.run_pipeline(storage_format='parquet', compression='zstd')
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir, 'merged_data.parquet')))
+        pd.testing.assert_frame_equal(parquet_df, csv_df)
+        pd.testing.assert_frame_equal(load_data(os.path.join(self.tmp_dir, 'merged_data.parquet')), csv_df)
+
+    # Test that the parallel modes produce the same merged data as serial mode
+    def test_parallel_matches_serial(self):
+        serial_df = self.run_pipeline(force=True)
+        for executor in ['thread', 'process']:
+            parallel_df = self.run_pipeline(force=True, workers=4, executor=executor)
+            pd.testing.assert_frame_equal(parallel_df, serial_df)
+        with self.assertRaises(ValueError):
+            self.run_pipeline(force=True, workers=2, executor='cluster')
+
+    # Test that streaming mode cleans each raw file exactly like the in-memory path
+    def test_streaming_matches_in_memory(self):
+        for spec in self.datasets:
+            dtypes = load_dtypes(spec)
+            expected = clean_data(load_data(spec['raw_path'], columns=load_columns(spec), dtype=dtypes),
+                                  spec['columns_to_check'], essential_columns=spec['essential_columns'])
+            output_path = os.path.join(self.tmp_dir, f"{spec['name']}-streamed.csv")
+            rows = clean_data_streaming(spec['raw_path'], output_path, spec['columns_to_check'],
+                                        essential_columns=spec['essential_columns'], chunksize=700, dtype=dtypes)
+            streamed = load_data(output_path, dtype=dtypes)
+            self.assertEqual(rows, len(expected))
+            pd.testing.assert_frame_equal(streamed, expected.reset_index(drop=True), check_categorical=False)
+
+    # Test that duplicate keys spread across chunks are removed
+    def test_streaming_removes_duplicates_across_chunks(self):
+        spec = self.datasets[1]
+        raw_df = pd.read_csv(spec['raw_path'])
+        pd.concat([raw_df, raw_df.iloc[::-1]]).to_csv(spec['raw_path'], index=False)
+        output_path = os.path.join(self.tmp_dir, 'life-expectancy-streamed.csv')
+        clean_data_streaming(spec['raw_path'], output_path, spec['columns_to_check'],
+                             essential_columns=spec['essential_columns'], chunksize=500)
+        streamed = load_data(output_path)
+        self.assertFalse(streamed.duplicated(['entity', 'year']).any(), "Duplicate keys remain after streaming.")
+        self.assertEqual(len(streamed), len(raw_df.dropna(subset=raw_df.columns[3:])))
+
+    # Test that process_data in streaming mode produces the same merged data
+    def test_streaming_process_data(self):
+        in_memory_df = self.run_pipeline(force=True)
+        streamed_df = self.run_pipeline(chunksize=1000)
+        pd.testing.assert_frame_equal(streamed_df, in_memory_df)
+
+    # Test that process_data without persist writes nothing, in every mode
+    def test_no_persist_writes_nothing(self):
+        expected = self.run_pipeline(force=True, persist=False)
+        modes = [{'chunksize': 1000}, {'workers': 2, 'executor': 'thread'}]
+        modes += [{'engine': name} for name in ['polars', 'duckdb'] if importlib.util.find_spec(name) is not None]
+        for kwargs in modes:
+            with self.subTest(**kwargs):
+                merged_df = self.run_pipeline(force=True, persist=False, **kwargs)
+                pd.testing.assert_frame_equal(merged_df, expected)
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)), sorted(os.path.basename(spec['raw_path']) for spec in self.datasets))
+
+    # Test that the streaming key set finds every added key and keeps few sorted runs
+    def test_seen_keys(self):
+        seen_keys = SeenKeys()
+        keys = np.random.default_rng(0).permutation(np.arange(100_000, dtype=np.uint64) * 7)
+        for chunk in np.array_split(keys, 100):
+            self.assertFalse(seen_keys.contains(chunk).any())
+            seen_keys.add(chunk)
+            self.assertLessEqual(len(seen_keys.runs), 8)
+        self.assertEqual(len(seen_keys), len(keys))
+        self.assertTrue(seen_keys.contains(keys).all())
+        self.assertFalse(seen_keys.contains(keys + 1).any())
+        for run in seen_keys.runs:
+            self.assertTrue((np.diff(run.astype(np.int64)) > 0).all())
+
 if __name__ == '__main__':
     unittest.main()
 
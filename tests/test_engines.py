@@ -0,0 +1,134 @@
+import unittest
+import importlib.util
+import os
+import shutil
+import tempfile
+import pandas as pd
+from src.data_processing import DATASETS, file_hash, process_data
+from src.engines import ENGINES, get_engine, run_engine
+
+# Engines whose optional library is installed
+AVAILABLE_ENGINES = [name for name in ENGINES if name == 'pandas' or importlib.util.find_spec(name) is not None]
+
+# Engines compared with pandas
+OTHER_ENGINES = [name for name in ENGINES if name != 'pandas']
+
+MESSY_ROWS = {
+    'first': [
+        'Entity,Code,Year,Infant Mortality Female,Infant Mortality Male',
+        'Chile,CHL,2000,1.1,2.2',
+        'Chile,CHL,2000,1.1,2.2',
+        'Chile,CHL,2001,NA,2.3',
+        'Japan,JPN,2000,0.30000001,0.7',
+        'Japan,JPN,2001,1e-3,n/a',
+        'Peru,PER,2000,5,6',
+        ',,2000,7,8',
+    ],
+    'second': [
+        'Entity,Year,Life Expectancy Female,Life Expectancy Male',
+        'Peru,2000,9.5,9.25',
+        'Japan,2000,3.14159265,2.7182818',
+        'Chile,2000,-0.0,-0.0',
+        'Japan,2001,null,80',
+        'Chile,2001,12,',
+        'Chile,2001,12,13',
+        ',2000,70,71',
+    ],
+}
+
+class TestEngines(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def assert_cleaned_equal(self, frames, expected):
+        # Cleaned pandas frames keep the raw file's index and every raw entity as a category
+        for frame, expected_frame in zip(frames, expected):
+            pd.testing.assert_frame_equal(frame.reset_index(drop=True).astype({'entity': 'str'}),
+                                          expected_frame.reset_index(drop=True).astype({'entity': 'str'}),
+                                          check_exact=True)
+
+    def engine_subtests(self):
+        """
+        Yield each engine other than pandas in its own subtest, skipping (visibly)
+        those whose library is not installed.
+        """
+        for name in OTHER_ENGINES:
+            with self.subTest(engine=name):
+                if name not in AVAILABLE_ENGINES:
+                    self.skipTest(f"{name} is not installed")
+                yield name
+
+    def messy_datasets(self):
+        datasets = []
+        for name, lines in MESSY_ROWS.items():
+            raw_path = os.path.join(self.temp_dir, f'{name}.csv')
+            with open(raw_path, 'w') as f:
+                f.write('\n'.join(lines) + '\n')
+            indicator = 'infant_mortality' if name == 'first' else 'life_expectancy'
+            columns = ['entity', 'year', f'{indicator}_female', f'{indicator}_male']
+            datasets.append({'name': name, 'label': name, 'raw_path': raw_path,
+                             'cleaned_path': os.path.join(self.temp_dir, f'{name}-cleaned.csv'),
+                             'columns_to_check': columns[1:], 'essential_columns': columns})
+        return datasets
+
+    # Test that every installed engine cleans and merges the raw data exactly like pandas
+    def test_engines_match_pandas(self):
+        expected_cleaned, expected_merged = run_engine('pandas', DATASETS)
+        for name in self.engine_subtests():
+            cleaned, merged = run_engine(name, DATASETS)
+            pd.testing.assert_frame_equal(merged, expected_merged, check_exact=True)
+            self.assert_cleaned_equal(cleaned, expected_cleaned)
+
+    # Test that missing value markers, duplicate rows and unmatched keys are handled like pandas
+    def test_engines_match_pandas_on_messy_data(self):
+        datasets = self.messy_datasets()
+        expected_cleaned, expected_merged = run_engine('pandas', datasets, float_dtype='float64')
+        # The rows missing their entity match each other, as in pandas.merge
+        self.assertEqual(expected_merged['entity'].tolist()[:3], ['Chile', 'Japan', 'Peru'])
+        self.assertTrue(pd.isna(expected_merged['entity'].iloc[3]))
+        for name in self.engine_subtests():
+            cleaned, merged = run_engine(name, datasets, float_dtype='float64')
+            pd.testing.assert_frame_equal(merged, expected_merged, check_exact=True)
+            self.assert_cleaned_equal(cleaned, expected_cleaned)
+
+    # Test that process_data writes byte-identical outputs with every engine
+    def test_process_data_engines(self):
+        hashes = {}
+        for name in AVAILABLE_ENGINES:
+            output_dir = os.path.join(self.temp_dir, name)
+            os.makedirs(output_dir)
+            datasets = [dict(spec, cleaned_path=os.path.join(output_dir, os.path.basename(spec['cleaned_path'])))
+                        for spec in DATASETS]
+            merged_data_path = os.path.join(output_dir, 'merged_data.csv')
+            process_data(datasets, merged_data_path=merged_data_path,
+                         manifest_path=os.path.join(output_dir, 'manifest.json'), engine=name)
+            hashes[name] = [file_hash(spec['cleaned_path']) for spec in datasets] + [file_hash(merged_data_path)]
+        for name in self.engine_subtests():
+            self.assertEqual(hashes[name], hashes['pandas'])
+
+    # Test that unknown engines and unsupported options are rejected
+    def test_engine_errors(self):
+        with self.assertRaises(ValueError):
+            get_engine('spreadsheet')
+        with self.assertRaises(ValueError):
+            process_data(self.messy_datasets(), merged_data_path=os.path.join(self.temp_dir, 'merged.csv'),
+                         manifest_path=os.path.join(self.temp_dir, 'manifest.json'), engine='polars', chunksize=10)
+        with self.assertRaises(ValueError):
+            process_data(self.messy_datasets(), merged_data_path=os.path.join(self.temp_dir, 'merged.csv'),
+                         manifest_path=os.path.join(self.temp_dir, 'manifest.json'), engine='duckdb', workers=2)
+
+    # Test that DuckDB drops rows with missing values while scanning the raw file
+    @unittest.skipUnless('duckdb' in AVAILABLE_ENGINES, "duckdb is not installed")
+    def test_duckdb_scan_filters_rows(self):
+        engine = get_engine('duckdb')
+        spec = self.messy_datasets()[0]
+        scanned = engine.scan(spec, 'float64')
+        rows = engine.connection.execute(f'SELECT count(*) FROM ({scanned.sql})').fetchone()[0]
+        # The scanned table already lacks the two rows with a missing indicator
+        self.assertEqual(rows, len(MESSY_ROWS['first']) - 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from src import instrumentation
+from src.analysis import summary_statistics
+from src.data_processing import clean_data, merge_data
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.df = pd.DataFrame({
+            'Entity': ['A', 'A', 'B', 'B', 'C'],
+            'Year': [2000, 2000, 2000, 2001, 2001],
+            'Value': [1.0, 1.0, np.nan, 2.0, 3.0],
+        })
+
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.clear()
+        shutil.rmtree(self.tmp_dir)
+
+    # Test that nothing is recorded while instrumentation is disabled
+    def test_disabled_records_nothing(self):
+        clean_data(self.df, ['value'])
+        self.assertEqual(instrumentation.records(), [])
+
+    # Test that a stage records its rows in and out and the rows each cleaning step dropped
+    def test_clean_data_record(self):
+        instrumentation.enable()
+        clean_data(self.df, ['value'])
+        record, = instrumentation.records()
+        self.assertEqual(record['stage'], 'clean_data')
+        self.assertEqual(record['rows_in'], 5)
+        self.assertEqual(record['rows_out'], 3)
+        self.assertEqual(record['dropped'], {'dropna': 1, 'drop_duplicates': 1})
+        self.assertGreaterEqual(record['seconds'], 0)
+        self.assertIn('memory_delta_mb', record)
+
+    # Test that JSON records are appended to the output file as each stage finishes
+    def test_json_output(self):
+        output_path = os.path.join(self.tmp_dir, 'trace.jsonl')
+        instrumentation.enable(output_path)
+        left = self.df.iloc[:2].rename(columns=str.lower)
+        right = self.df.iloc[3:].rename(columns=str.lower)[['entity', 'year']]
+        merge_data(left, right)
+        summary_statistics(left, ['value'])
+        with open(output_path) as f:
+            stages = [json.loads(line) for line in f]
+        self.assertEqual([record['stage'] for record in stages], ['merge_data', 'summary_statistics'])
+        self.assertEqual(stages[0]['rows_in'], 4)
+
+    # Test that the trace format writes Chrome trace events
+    def test_trace_output(self):
+        output_path = os.path.join(self.tmp_dir, 'trace.json')
+        instrumentation.enable(output_path, trace_format='trace')
+        clean_data(self.df, ['value'])
+        with open(output_path) as f:
+            events = json.loads(f.read().rstrip().rstrip(',') + ']')
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['name'], 'clean_data')
+        self.assertEqual(events[0]['ph'], 'X')
+        self.assertEqual(events[0]['args']['dropped'], {'dropna': 1, 'drop_duplicates': 1})
+        with self.assertRaises(ValueError):
+            instrumentation.enable(output_path, trace_format='xml')
+
+if __name__ == '__main__':
+    unittest.main()
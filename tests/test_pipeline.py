@@ -0,0 +1,92 @@
+import unittest
+import os
+import shutil
+import tempfile
+import pandas as pd
+from src.analysis import correlation_analysis_with_test, summary_statistics
+from src.data_processing import DATASETS, process_data
+from src.pipeline import ANALYSIS_COLUMNS, DEFAULT_OPTIONS, PIPELINE, Stage, check_graph, run_pipeline
+from src.visulisations import FIGURES, output_dir
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.datasets = []
+        for spec in DATASETS:
+            raw_path = os.path.join(self.tmp_dir, os.path.basename(spec['raw_path']))
+            pd.read_csv(spec['raw_path'], nrows=3000).to_csv(raw_path, index=False)
+            self.datasets.append(dict(spec, raw_path=raw_path, cleaned_path=os.path.join(self.tmp_dir, os.path.basename(spec['cleaned_path']))))
+        self.options = {
+            'datasets': self.datasets,
+            'merged_data_path': os.path.join(self.tmp_dir, 'merged_data.csv'),
+            'manifest_path': os.path.join(self.tmp_dir, 'manifest.json'),
+            'processed_dir': self.tmp_dir,
+            'figures_dir': os.path.join(self.tmp_dir, 'figures'),
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    # Test that the pipeline hands the merged data to the later stages in memory and writes no intermediates
+    def test_in_memory_run_matches_stages(self):
+        results = run_pipeline(**self.options)
+        self.assertEqual(set(results), {stage.name for stage in PIPELINE})
+        self.assertFalse(os.path.exists(self.options['merged_data_path']), "Merged data was written without persist.")
+        self.assertFalse(os.path.exists(self.options['manifest_path']), "Manifest was written without persist.")
+        for spec in self.datasets:
+            self.assertFalse(os.path.exists(spec['cleaned_path']), "Cleaned data was written without persist.")
+
+        merged_df = process_data(self.datasets, merged_data_path=os.path.join(self.tmp_dir, 'serial.csv'),
+                                 manifest_path=os.path.join(self.tmp_dir, 'serial.json'))
+        pd.testing.assert_frame_equal(results['process'], merged_df)
+        pd.testing.assert_frame_equal(results['summary'], summary_statistics(merged_df, ANALYSIS_COLUMNS))
+        self.assertEqual(results['correlation'], correlation_analysis_with_test(merged_df, *ANALYSIS_COLUMNS))
+        for _, _, file_name, _ in FIGURES:
+            self.assertTrue(os.path.exists(os.path.join(self.options['figures_dir'], file_name)), f"{file_name} was not rendered.")
+
+    # Test that persist=True also writes the merged data and the summary table
+    def test_persist_writes_intermediates(self):
+        results = run_pipeline(persist=True, **self.options)
+        saved = pd.read_csv(self.options['merged_data_path'])
+        self.assertEqual(len(saved), len(results['process']))
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir, 'summary_statistics.pdf')))
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir, 'summary_statistics.csv')))
+
+    # Test that independent stages run concurrently once their dependencies finish
+    def test_independent_stages_run_concurrently(self):
+        import threading
+        barrier = threading.Barrier(2, timeout=5)
+
+        def wait_for_sibling(results, options):
+            barrier.wait()
+            return results['source'] + 1
+
+        stages = [
+            Stage('source', lambda results, options: 1, [], False),
+            Stage('left', wait_for_sibling, ['source'], False),
+            Stage('right', wait_for_sibling, ['source'], False),
+        ]
+        self.assertEqual(run_pipeline(stages), {'source': 1, 'left': 2, 'right': 2})
+
+    # Test that invalid graphs and unknown options are rejected
+    def test_invalid_graph(self):
+        with self.assertRaises(ValueError):
+            check_graph([Stage('a', None, ['b'], False), Stage('b', None, [], False)])
+        with self.assertRaises(ValueError):
+            check_graph([Stage('a', None, [], False), Stage('a', None, [], False)])
+        with self.assertRaises(TypeError):
+            run_pipeline(figure_dir='figures')
+
+    # Test that processed_dir holds every processed output and figures default to the repository's figures/
+    def test_processed_dir_holds_outputs(self):
+        processed_dir = os.path.join(self.tmp_dir, 'processed')
+        results = run_pipeline(stages=[stage for stage in PIPELINE if stage.name == 'process'], persist=True,
+                               processed_dir=processed_dir)
+        expected = [os.path.basename(spec['cleaned_path']) for spec in DATASETS] + ['manifest.json', 'merged_data.csv']
+        self.assertEqual(sorted(os.listdir(processed_dir)), sorted(expected))
+        self.assertEqual(len(pd.read_csv(os.path.join(processed_dir, 'merged_data.csv'))), len(results['process']))
+        self.assertEqual(DEFAULT_OPTIONS['figures_dir'], './figures')
+        self.assertFalse(os.path.isabs(output_dir))
+
+if __name__ == '__main__':
+    unittest.main()
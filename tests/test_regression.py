@@ -0,0 +1,66 @@
+import unittest
+import numpy as np
+import pandas as pd
+import statsmodels.api as sm
+from scipy.stats import linregress
+from src.data_processing import load_data
+from src.regression import fit_linear_regression, regression_bands, regression_fit, clear_regression_cache, _fit_cache
+from src.analysis import regression_analysis
+
+# Define the path to the merged data
+merged_data_path = './data/processed/merged_data.csv'
+
+class TestRegression(unittest.TestCase):
+    def setUp(self):
+        clear_regression_cache()
+        self.merged_df = load_data(merged_data_path)
+
+    # Test the closed-form fit against scipy's linregress
+    def test_fit_matches_linregress(self):
+        x = self.merged_df['aggregated_infant_mortality']
+        y = self.merged_df['aggregated_life_expectancy']
+        fit = fit_linear_regression(x, y)
+        expected = linregress(x, y)
+        self.assertAlmostEqual(fit.slope, expected.slope)
+        self.assertAlmostEqual(fit.intercept, expected.intercept)
+        self.assertAlmostEqual(fit.slope_se, expected.stderr)
+        self.assertAlmostEqual(fit.intercept_se, expected.intercept_stderr)
+        self.assertAlmostEqual(fit.r_squared, expected.rvalue ** 2)
+
+    # Test the analytic confidence and prediction bands against statsmodels OLS
+    def test_bands_match_statsmodels(self):
+        x = self.merged_df['gdp_per_capita'].to_numpy()
+        y = self.merged_df['aggregated_life_expectancy'].to_numpy()
+        fit = fit_linear_regression(x, y)
+        x_grid = np.linspace(x.min(), x.max(), 25)
+        line, ci_low, ci_high, pi_low, pi_high = regression_bands(fit, x_grid)
+
+        model = sm.OLS(y, sm.add_constant(x)).fit()
+        frame = model.get_prediction(sm.add_constant(x_grid)).summary_frame(alpha=0.05)
+        np.testing.assert_allclose(line, frame['mean'])
+        np.testing.assert_allclose(ci_low, frame['mean_ci_lower'])
+        np.testing.assert_allclose(ci_high, frame['mean_ci_upper'])
+        np.testing.assert_allclose(pi_low, frame['obs_ci_lower'])
+        np.testing.assert_allclose(pi_high, frame['obs_ci_upper'])
+
+    # Test that missing values are ignored and too few pairs are rejected
+    def test_missing_values_and_small_inputs(self):
+        x = np.array([1.0, 2.0, np.nan, 4.0, 5.0])
+        y = np.array([2.0, 4.1, 6.0, np.nan, 9.8])
+        fit = fit_linear_regression(x, y)
+        self.assertEqual(fit.n, 3)
+        with self.assertRaises(ValueError):
+            fit_linear_regression([1.0, 2.0], [1.0, 2.0])
+
+    # Test that the same data is fitted once and shared with the analysis
+    def test_fits_are_cached(self):
+        fit = regression_fit(self.merged_df, 'gdp_per_capita', 'aggregated_life_expectancy')
+        self.assertIs(regression_fit(self.merged_df.copy(), 'gdp_per_capita', 'aggregated_life_expectancy'), fit)
+        self.assertEqual(len(_fit_cache), 1)
+
+        summary = regression_analysis(self.merged_df, [('gdp_per_capita', 'aggregated_life_expectancy')])
+        self.assertEqual(len(_fit_cache), 1)
+        self.assertAlmostEqual(summary.at[('gdp_per_capita', 'aggregated_life_expectancy'), 'slope'], fit.slope)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import os
+import re
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from src.analysis import grouped_trends
+from src.reports import REPORT_COLUMNS, ReportTemplate, render_country_reports
+from src.visulisations import load_merged_data, merged_data_path
+
+def page_count(pdf_path):
+    """
+    Number of pages in a PDF written by matplotlib.
+    """
+    with open(pdf_path, 'rb') as f:
+        return len(re.findall(rb'/Type /Page\b', f.read()))
+
+class TestReports(unittest.TestCase):
+    def setUp(self):
+        self.merged_df = load_merged_data(merged_data_path)
+        self.entities = sorted(self.merged_df['entity'].astype(str).unique())[:5]
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    # Test that entities are split into multi-page PDFs and indexed by file and page
+    def test_render_country_reports(self):
+        index = render_country_reports(self.merged_df, self.temp_dir, entities=self.entities, pages_per_file=2)
+        self.assertEqual(index['entity'].tolist(), self.entities)
+        self.assertEqual(index['file'].tolist(), ['country_reports_001.pdf'] * 2 + ['country_reports_002.pdf'] * 2
+                         + ['country_reports_003.pdf'])
+        self.assertEqual(index['page'].tolist(), [1, 2, 1, 2, 1])
+        for file_name, pages in index.groupby('file').size().items():
+            self.assertEqual(page_count(os.path.join(self.temp_dir, file_name)), pages)
+        saved = pd.read_csv(os.path.join(self.temp_dir, 'report_index.csv'))
+        pd.testing.assert_frame_equal(saved, index)
+        self.assertFalse([name for name in os.listdir(self.temp_dir) if '.tmp' in name])
+        mode = os.stat(os.path.join(self.temp_dir, 'country_reports_001.pdf')).st_mode & 0o777
+        self.assertEqual(mode, os.stat(os.path.join(self.temp_dir, 'report_index.csv')).st_mode & 0o777)
+
+    # Test that the page template is updated in place with each entity's data
+    def test_template_updates_artists(self):
+        template = ReportTemplate(self.merged_df)
+        trends = grouped_trends(self.merged_df, REPORT_COLUMNS).set_index(['entity', 'indicator'])
+        artists = (template.fig, template.table, template.values_lines[0], template.highlight)
+        for entity in self.entities[:2]:
+            rows = self.merged_df[self.merged_df['entity'] == entity].sort_values('year')
+            template.update(entity, rows, trends.loc[entity])
+            self.assertEqual(template.title.get_text(), f"Country Report: {entity}")
+            np.testing.assert_allclose(template.values_lines[0].get_ydata(), rows[REPORT_COLUMNS[0]].to_numpy(dtype=float))
+            self.assertEqual(len(template.highlight.get_offsets()), len(rows))
+            mean = rows[REPORT_COLUMNS[0]].astype(float).mean()
+            self.assertEqual(template.table[1, 1].get_text().get_text(), f"{mean:.2f}")
+        self.assertEqual((template.fig, template.table, template.values_lines[0], template.highlight), artists)
+
+    # Test that an entity without enough years for a trend still gets a page
+    def test_short_history(self):
+        short = self.merged_df[self.merged_df['entity'] == self.entities[0]].sort_values('year').head(2)
+        template = ReportTemplate(self.merged_df)
+        trends = grouped_trends(short, REPORT_COLUMNS).set_index(['entity', 'indicator'])
+        template.update(self.entities[0], short, trends.loc[self.entities[0]])
+        self.assertEqual(template.table[1, 5].get_text().get_text(), '-')
+        index = render_country_reports(short, self.temp_dir)
+        self.assertEqual(index['entity'].tolist(), [self.entities[0]])
+
+    # Test that rendering in worker processes writes the same reports
+    def test_parallel_matches_serial(self):
+        serial = render_country_reports(self.merged_df, os.path.join(self.temp_dir, 'serial'), entities=self.entities,
+                                        pages_per_file=2)
+        parallel = render_country_reports(self.merged_df, os.path.join(self.temp_dir, 'parallel'),
+                                          entities=self.entities, workers=2, pages_per_file=2)
+        pd.testing.assert_frame_equal(serial, parallel)
+        for file_name in parallel['file'].unique():
+            self.assertTrue(os.path.exists(os.path.join(self.temp_dir, 'parallel', file_name)))
+
+    # Test that a re-run for fewer entities removes the reports no entity is in any more
+    def test_stale_reports_removed(self):
+        render_country_reports(self.merged_df, self.temp_dir, entities=self.entities, pages_per_file=2)
+        index = render_country_reports(self.merged_df, self.temp_dir, entities=self.entities[:2], pages_per_file=2)
+        self.assertEqual(index['file'].tolist(), ['country_reports_001.pdf'] * 2)
+        self.assertEqual(sorted(os.listdir(self.temp_dir)), ['country_reports_001.pdf', 'report_index.csv'])
+        self.assertEqual(page_count(os.path.join(self.temp_dir, 'country_reports_001.pdf')), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+import numpy as np
+from src.data_processing import aggregated_values, clean_data, load_data
+from src.schema import DERIVED_FIELDS, FIELDS, canonical_name, field, published_values, storage_dtypes
+
+class TestSchema(unittest.TestCase):
+    # Test that registered source columns map to compact field names and others are left alone
+    def test_canonical_name(self):
+        self.assertEqual(canonical_name('period_life_expectancy_-_sex:_female_-_age:_0'), 'life_expectancy_female')
+        self.assertEqual(canonical_name('health_expenditure_per_capita_-_total'), 'health_expenditure_per_capita')
+        self.assertEqual(canonical_name('code'), 'code')
+        self.assertEqual(field('aggregated_life_expectancy').components, ['life_expectancy_female', 'life_expectancy_male'])
+        with self.assertRaises(KeyError):
+            field('code')
+
+    # Test the declared storage dtypes and the float override
+    def test_storage_dtypes(self):
+        dtypes = storage_dtypes(['entity', 'year', 'gdp_per_capita', 'code'])
+        self.assertEqual(dtypes, {'entity': 'category', 'year': 'int16', 'gdp_per_capita': 'float32'})
+        self.assertEqual(storage_dtypes(['year', 'gdp_per_capita'], 'float64'), {'year': 'int16', 'gdp_per_capita': 'float64'})
+        self.assertEqual(storage_dtypes(['aggregated_life_expectancy']), {'aggregated_life_expectancy': 'float64'})
+
+    # Test that cleaning renames raw columns to their compact fields
+    def test_clean_data_uses_field_names(self):
+        raw_df = load_data('./data/raw/life-expectation-at-birth-by-sex.csv')
+        cleaned_df = clean_data(raw_df, ['life_expectancy_female'], ['entity', 'year', 'life_expectancy_female'])
+        self.assertEqual(cleaned_df.columns.tolist(), ['entity', 'year', 'life_expectancy_female'])
+
+    # Test that the merged data holds every field with its declared storage dtype
+    def test_merged_data_matches_schema(self):
+        # region is an entity attribute loaded separately, not a merged column
+        names = [schema_field.name for schema_field in FIELDS + DERIVED_FIELDS if schema_field.name != 'region']
+        merged_df = load_data('./data/processed/merged_data.csv', dtype=storage_dtypes(names))
+        self.assertEqual(merged_df.columns.tolist(), names)
+        for name in names:
+            self.assertEqual(str(merged_df[name].dtype), field(name).dtype)
+        self.assertTrue(all(len(column) <= 32 for column in merged_df.columns))
+
+    # Test that float32 values are read back as published and derived means keep full precision
+    def test_published_values(self):
+        values = np.array([75.521, 1.3876945, -0.0, 1e-30, 3.4e38, np.nan], dtype=np.float32)
+        np.testing.assert_array_equal(published_values(values), [75.521, 1.3876945, -0.0, 1e-30, 3.4e38, np.nan])
+        random_values = np.random.default_rng(0).standard_normal(10_000).astype(np.float32)
+        np.testing.assert_array_equal(published_values(random_values), random_values.astype(str).astype(np.float64))
+
+        components = [component for derived in DERIVED_FIELDS for component in derived.components]
+        raw_df = load_data('./data/processed/merged_data.csv', columns=components)
+        merged_df = aggregated_values(raw_df.astype(storage_dtypes(components)))
+        self.assertEqual(merged_df['aggregated_infant_mortality'].dtype, np.float64)
+        expected = (raw_df['infant_mortality_female'] + raw_df['infant_mortality_male']) / 2
+        np.testing.assert_array_equal(merged_df['aggregated_infant_mortality'], expected)
+
+if __name__ == '__main__':
+    unittest.main()
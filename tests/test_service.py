@@ -0,0 +1,126 @@
+import unittest
+import http.client
+import json
+import os
+import shutil
+import tempfile
+import threading
+import pandas as pd
+from src.analysis import summary_statistics
+from src.data_processing import MERGED_DATA_PATH, REGIONS_PATH, load_data, save_cleaned_data
+from src.service import LRUCache, QueryStore, make_server
+
+class TestQueryService(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.merged_data_path = os.path.join(self.temp_dir, 'merged_data.csv')
+        shutil.copy(MERGED_DATA_PATH, self.merged_data_path)
+        self.store = QueryStore(self.merged_data_path, REGIONS_PATH, cache_size=8)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def query(self, path, **params):
+        return json.loads(self.store.query(path, {name: [value] for name, value in params.items()}))
+
+    # Test that the cache keeps at most maxsize results and evicts the least recently used
+    def test_lru_cache_eviction(self):
+        cache = LRUCache(maxsize=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+        self.assertEqual(cache.stats(), {'size': 2, 'maxsize': 2, 'hits': 3, 'misses': 1})
+
+    # Test that filtered rows and summaries match the same queries run directly on the merged data
+    def test_queries_match_pandas(self):
+        merged_df = load_data(self.merged_data_path)
+        expected = merged_df[(merged_df['entity'].isin(['Japan', 'Chile'])) & merged_df['year'].between(2000, 2005)]
+        rows = pd.DataFrame(self.query('/rows', entity='Chile,Japan', start='2000', end='2005',
+                                       columns='gdp_per_capita')['rows'])
+        pd.testing.assert_frame_equal(rows, expected[['entity', 'year', 'gdp_per_capita']].reset_index(drop=True),
+                                      check_dtype=False, rtol=1e-6)
+
+        summary = self.query('/summary', entity='Chile,Japan', start='2000', end='2005',
+                             columns='aggregated_life_expectancy')['summary']
+        direct = summary_statistics(expected, ['aggregated_life_expectancy']).loc['aggregated_life_expectancy']
+        for statistic, value in summary['aggregated_life_expectancy'].items():
+            self.assertAlmostEqual(value, direct[statistic], places=4)
+
+        correlation = self.query('/correlation', x='aggregated_infant_mortality', y='aggregated_life_expectancy')
+        self.assertLess(correlation['correlation'], 0)
+        self.assertEqual(correlation['n'], len(merged_df))
+
+    # Test that repeated queries are cached and a rebuilt data file is reloaded with an empty cache
+    def test_cache_invalidated_on_rebuild(self):
+        before = self.query('/rows', entity='Japan', start='2000', end='2000')['rows'][0]
+        self.query('/rows', entity='Japan', start='2000', end='2000')
+        self.assertEqual(self.store.cache.stats()['hits'], 1)
+
+        merged_df = load_data(self.merged_data_path)
+        merged_df['gdp_per_capita'] = merged_df['gdp_per_capita'] * 2
+        inode = os.stat(self.merged_data_path).st_ino
+        save_cleaned_data(merged_df, self.merged_data_path)
+        # The file was replaced by a complete new one, not rewritten in place
+        self.assertNotEqual(os.stat(self.merged_data_path).st_ino, inode)
+        self.assertEqual(os.listdir(self.temp_dir), ['merged_data.csv'])
+        after = self.query('/rows', entity='Japan', start='2000', end='2000')['rows'][0]
+        self.assertAlmostEqual(after['gdp_per_capita'], 2 * before['gdp_per_capita'], places=2)
+        self.assertEqual(self.store.reloads, 2)
+        self.assertEqual(self.store.cache.stats()['size'], 1)
+
+    def get(self, paths):
+        """
+        Request each path from a server on the store and return their statuses and JSON bodies.
+        """
+        server = make_server(self.store, port=0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            connection = http.client.HTTPConnection(*server.server_address)
+            responses = {}
+            for path in paths:
+                connection.request('GET', path)
+                response = connection.getresponse()
+                responses[path] = (response.status, json.loads(response.read()))
+            connection.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+        return responses
+
+    # Test the HTTP server's responses to good queries, bad parameters and unknown paths
+    def test_http_queries(self):
+        responses = self.get(['/rows?entity=Japan&start=2000&end=2001', '/summary?region=Europe', '/entities',
+                              '/rows?entity=Nowhere', '/rows?columns=nothing', '/rows?start=soon', '/nothing', '/health'])
+
+        self.assertEqual(responses['/rows?entity=Japan&start=2000&end=2001'][0], 200)
+        self.assertEqual([row['year'] for row in responses['/rows?entity=Japan&start=2000&end=2001'][1]['rows']],
+                         [2000, 2001])
+        self.assertEqual(responses['/summary?region=Europe'][0], 200)
+        self.assertIn('Japan', responses['/entities'][1]['entities'])
+        for path in ['/rows?entity=Nowhere', '/rows?columns=nothing', '/rows?start=soon']:
+            self.assertEqual(responses[path][0], 400, path)
+            self.assertIn('error', responses[path][1])
+        self.assertEqual(responses['/nothing'][0], 404)
+        self.assertEqual(responses['/health'][1]['rows'], self.store.health({})['rows'])
+
+    # Test that malformed correlation queries are rejected and unexpected failures answered with a 500
+    def test_http_errors(self):
+        def fail(params):
+            raise RuntimeError("disk on fire")
+        self.store.entities = fail
+        paths = ['/correlation?x=gdp_per_capita', '/correlation?x=gdp_per_capita,year&y=gdp_per_capita',
+                 '/correlation?x=gdp_per_capita&y=aggregated_life_expectancy&y=aggregated_infant_mortality',
+                 '/entities', '/correlation?x=gdp_per_capita&y=aggregated_life_expectancy']
+        responses = self.get(paths)
+        for path in paths[:3]:
+            self.assertEqual(responses[path][0], 400, path)
+            self.assertIn('exactly one x and one y', responses[path][1]['error'])
+        self.assertEqual(responses['/entities'], (500, {'error': 'RuntimeError: disk on fire'}))
+        self.assertEqual(responses[paths[-1]][0], 200)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import subprocess
+import sys
+import unittest
+from benchmarks.bench_startup import HEAVY_LIBRARIES, MODULES
+
+def heavy_imports(module):
+    """
+    Import module in a fresh interpreter and return the heavy libraries it loaded.
+    """
+    code = f"import sys, {module}; print(' '.join(sorted({{name.split('.')[0] for name in sys.modules}} & set({HEAVY_LIBRARIES!r}))))"
+    output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+    return output.split()
+
+class TestStartup(unittest.TestCase):
+    # Test that importing the pipeline modules does not load plotting or statistics libraries
+    def test_imports_are_lazy(self):
+        for module in MODULES:
+            self.assertEqual(heavy_imports(module), [], f"Importing {module} loaded heavy libraries.")
+
+    # Test that importing the visualisations module has no side effects on the filesystem
+    def test_import_creates_no_directories(self):
+        code = (
+            "import os, unittest.mock as mock\n"
+            "with mock.patch('os.makedirs') as makedirs:\n"
+            "    import src.visulisations\n"
+            "print(makedirs.call_count)"
+        )
+        output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+        self.assertEqual(output.strip(), '0')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import unittest
+import importlib.util
+import pandas as pd
+from src.storage import ChunkWriter, atomic_output, new_file_mode, read_frame, write_frame, with_format, storage_format
+from src.data_processing import load_data, save_cleaned_data
+
+# Parquet and Feather need pyarrow, which is an optional dependency
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+merged_data_path = './data/processed/merged_data.csv'
+
+class TestStorage(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.merged_df = load_data(merged_data_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    # Test that the file extension selects the storage format
+    def test_storage_format_from_extension(self):
+        self.assertEqual(storage_format('merged_data.csv'), 'csv')
+        self.assertEqual(storage_format('merged_data.parquet'), 'parquet')
+        self.assertEqual(storage_format('merged_data.feather'), 'feather')
+        self.assertEqual(with_format('./data/processed/merged_data.csv', 'parquet'), './data/processed/merged_data.parquet')
+        with self.assertRaises(ValueError):
+            storage_format('merged_data.xlsx')
+
+    # Test that the columnar formats round-trip the merged data with its dtypes
+    @unittest.skipUnless(HAS_PYARROW, "pyarrow is not installed")
+    def test_round_trip_binary_formats(self):
+        for extension, compression in [('parquet', 'zstd'), ('feather', None), ('feather', 'lz4')]:
+            output_path = os.path.join(self.tmp_dir, f'merged_data.{extension}')
+            save_cleaned_data(self.merged_df, output_path, compression=compression)
+            loaded_df = load_data(output_path)
+            pd.testing.assert_frame_equal(loaded_df, self.merged_df)
+
+    # Test that only the requested columns are loaded
+    @unittest.skipUnless(HAS_PYARROW, "pyarrow is not installed")
+    def test_column_projection(self):
+        columns = ['entity', 'aggregated_life_expectancy']
+        for extension in ['csv', 'parquet', 'feather']:
+            output_path = os.path.join(self.tmp_dir, f'merged_data.{extension}')
+            write_frame(self.merged_df, output_path)
+            loaded_df = read_frame(output_path, columns=columns)
+            self.assertEqual(list(loaded_df.columns), columns)
+            pd.testing.assert_frame_equal(loaded_df, self.merged_df[columns])
+
+    # Test that chunks with differing categories are appended into one file
+    def test_chunk_writer(self):
+        df = self.merged_df.astype({'entity': 'category'})
+        chunks = [df.iloc[:500].copy(), df.iloc[500:].copy()]
+        for chunk in chunks:
+            chunk['entity'] = chunk['entity'].cat.remove_unused_categories()
+        extensions = ['csv', 'parquet', 'feather'] if HAS_PYARROW else ['csv']
+        for extension in extensions:
+            output_path = os.path.join(self.tmp_dir, f'merged_data.{extension}')
+            with ChunkWriter(output_path) as writer:
+                for chunk in chunks:
+                    writer.write(chunk)
+            self.assertEqual(writer.rows_written, len(df))
+            pd.testing.assert_frame_equal(read_frame(output_path), self.merged_df)
+
+    # Test that atomic outputs get normal file permissions and leave nothing behind on error
+    def test_atomic_output(self):
+        output_path = os.path.join(self.tmp_dir, 'figures', 'figure.pdf')
+        umask = os.umask(0o022)
+        try:
+            with atomic_output(output_path) as tmp_path:
+                self.assertTrue(tmp_path.endswith('.pdf'))
+                with open(tmp_path, 'w') as f:
+                    f.write('new')
+                self.assertFalse(os.path.exists(output_path))
+            self.assertEqual(new_file_mode(), 0o644)
+        finally:
+            os.umask(umask)
+        self.assertEqual(os.stat(output_path).st_mode & 0o777, 0o644)
+
+        with self.assertRaises(RuntimeError):
+            with atomic_output(output_path) as tmp_path:
+                with open(tmp_path, 'w') as f:
+                    f.write('partial')
+                raise RuntimeError
+        with open(output_path) as f:
+            self.assertEqual(f.read(), 'new')
+        self.assertEqual(os.listdir(os.path.dirname(output_path)), ['figure.pdf'])
+
+if __name__ == '__main__':
+    unittest.main()
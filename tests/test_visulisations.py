@@ -1,13 +1,23 @@
 import unittest
 import os
+import shutil
+import tempfile
+import numpy as np
 import pandas as pd
+import matplotlib.pyplot as plt
+from matplotlib.collections import PathCollection, QuadMesh
 from sklearn.linear_model import LinearRegression  
 from sklearn.metrics import mean_squared_error  
+from src.cube import build_cube
 from src.visulisations import (
     load_merged_data,
     plot_scatter_with_regression,
     plot_life_expectancy_vs_infant_mortality,
     facet_scatter_graphs_with_regression,
+    FIGURES,
+    DENSITY_THRESHOLD,
+    draw_points,
+    main,
     output_dir,
     merged_data_path,
 )
@@ -66,12 +76,88 @@ class TestVisualisations(unittest.TestCase):
         mse_gdp = mean_squared_error(y_life, model_gdp.predict(X_gdp))
         self.assertLess(mse_gdp, 50, f"Mean squared error for Life Expectancy vs GDP is too high: {mse_gdp}")
 
-        X_healthcare = merged_df[['health_expenditure_per_capita_-_total']]
+        X_healthcare = merged_df[['health_expenditure_per_capita']]
         y_mortality = merged_df['aggregated_infant_mortality']
         model_healthcare = LinearRegression()
         model_healthcare.fit(X_healthcare, y_mortality)
         mse_healthcare = mean_squared_error(y_mortality, model_healthcare.predict(X_healthcare))
         self.assertLess(mse_healthcare, 50, f"Mean squared error for Infant Mortality vs Healthcare is too high: {mse_healthcare}")
 
+    # Test that serial and parallel rendering both write every figure, with no temporary files left behind
+    def test_main_parallel_rendering(self):
+        for workers in [None, 2]:
+            figures_dir = tempfile.mkdtemp()
+            try:
+                main(workers=workers, figures_dir=figures_dir)
+                expected_files = sorted(file_name for _, _, file_name, _ in FIGURES)
+                self.assertEqual(sorted(os.listdir(figures_dir)), sorted(expected_files + ['.figure_cache.json']))
+                for file_name in expected_files:
+                    with open(os.path.join(figures_dir, file_name), 'rb') as f:
+                        self.assertEqual(f.read(5), b'%PDF-', f"{file_name} is not a PDF.")
+            finally:
+                shutil.rmtree(figures_dir)
+
+    # Test that unchanged figures are served from the cache on the next run
+    def test_main_figure_cache(self):
+        figures_dir = tempfile.mkdtemp()
+        try:
+            first = main(figures_dir=figures_dir)
+            self.assertEqual(len(first['misses']), len(FIGURES))
+            second = main(figures_dir=figures_dir)
+            self.assertEqual(len(second['hits']), len(FIGURES))
+            self.assertEqual(second['misses'], [])
+
+            # A missing output is re-rendered even though its key is unchanged
+            os.remove(os.path.join(figures_dir, 'plot_scatter_with_regression.pdf'))
+            third = main(figures_dir=figures_dir)
+            self.assertEqual(third['misses'], ['scatter_with_regression'])
+            self.assertTrue(os.path.exists(os.path.join(figures_dir, 'plot_scatter_with_regression.pdf')))
+        finally:
+            shutil.rmtree(figures_dir)
+
+    # Test that large inputs switch to a rasterized density image automatically
+    def test_draw_points_switches_to_density(self):
+        rng = np.random.default_rng(0)
+        fig, ax = plt.subplots()
+        small = draw_points(rng.normal(size=100), rng.normal(size=100), ax=ax)
+        large = draw_points(rng.normal(size=DENSITY_THRESHOLD + 1), rng.normal(size=DENSITY_THRESHOLD + 1), ax=ax, label='Data Points')
+        forced = draw_points(rng.normal(size=100), rng.normal(size=100), ax=ax, density=True)
+        plt.close(fig)
+        self.assertIsInstance(small, PathCollection)
+        self.assertIsInstance(large, QuadMesh)
+        self.assertTrue(large.get_rasterized())
+        self.assertEqual(large.get_array().sum(), DENSITY_THRESHOLD + 1)
+        self.assertIsInstance(forced, QuadMesh)
+
+    # Test that the density rendering keeps the PDF small for large inputs
+    def test_density_scatter_pdf_size(self):
+        rng = np.random.default_rng(0)
+        size = 200_000
+        mortality = rng.gamma(2, 2, size)
+        merged_df = pd.DataFrame({
+            'aggregated_infant_mortality': mortality,
+            'aggregated_life_expectancy': 80 - mortality + rng.normal(0, 3, size),
+        })
+        figures_dir = tempfile.mkdtemp()
+        try:
+            output_file = os.path.join(figures_dir, 'plot_scatter_with_regression.pdf')
+            plot_scatter_with_regression(merged_df, output_path=output_file)
+            self.assertLess(os.path.getsize(output_file), 200_000, "Density scatter PDF is too large.")
+        finally:
+            shutil.rmtree(figures_dir)
+
+    # Test that the life expectancy plot draws its yearly means from an aggregate cube
+    def test_plot_life_expectancy_from_cube(self):
+        merged_df = load_merged_data(merged_data_path)
+        cube = build_cube(merged_df)
+        figures_dir = tempfile.mkdtemp()
+        try:
+            output_file = os.path.join(figures_dir, 'life_expectancy.pdf')
+            plot_life_expectancy_vs_infant_mortality(merged_df, output_path=output_file, cube=cube)
+            with open(output_file, 'rb') as f:
+                self.assertEqual(f.read(5), b'%PDF-')
+        finally:
+            shutil.rmtree(figures_dir)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file